@@ -1,13 +1,31 @@
+import os
+
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import Config
+from app.replica import RoutingSQLAlchemy
 
 # sqlalchemy is used to interact with the database by creating tables and inserting data.
-db = SQLAlchemy()
+# Its sessions send reads inside replica_reads() to the optional read replica.
+db = RoutingSQLAlchemy()
 # login_manager is used to manage user sessions and authentication by flask-login. 
 login_manager = LoginManager()
 
+# Alembic migration scripts, applied by init_db.py and the `flask db` commands
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def init_migrations(app):
+    """
+    Registers Flask-Migrate, which provides the `flask db` commands.
+
+    Alembic takes a noticeable share of the startup time to import and is only needed to change
+    the schema, so web workers never call this; the Flask CLI and init_db.py do.
+    """
+    from flask_migrate import Migrate
+    Migrate(app, db, directory=MIGRATIONS_DIR, compare_type=True)
+
+
 def create_app():
     """
     Creates a Flask application instance with the necessary configurations and initializations.
@@ -19,9 +37,6 @@ def create_app():
     """
     app = Flask(__name__)
     app.config.from_object(Config)
-    
-    print(f"S3_BUCKET in app config: {app.config['S3_BUCKET']}")
-    print(f"S3_REGION in app config: {app.config['S3_REGION']}")
 
     # Initialize the database and login manager
     db.init_app(app)
@@ -32,12 +47,38 @@ def create_app():
     from app.routes import main
     app.register_blueprint(main)
 
+    # Register the versioned JSON API
+    from app.api import api
+    app.register_blueprint(api)
+
     # Register the auth blueprint
     from app.models import User
 
-    # Load user from database based on user_id
+    # Keep the dashboard counters current on every Employee, Ticket and TrainingRecord write
+    from app import rollups  # noqa: F401
+
+    # Record a notification for every new message, unread count change and ticket response
+    from app import notifications  # noqa: F401
+
+    # Record per-request SQL statistics and serve them at /metrics
+    from app.instrumentation import init_instrumentation
+    init_instrumentation(app)
+
+    # Enable the {% cache %} template tag
+    from app.fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
+
+    # Register the maintenance CLI commands, and the migration commands when running under the Flask CLI
+    from app.commands import register_commands
+    register_commands(app)
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        init_migrations(app)
+
+    # Load user and their employee from database based on user_id, through the identity cache
+    from app.identity_cache import load_user_identity
+
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_user_identity(int(user_id))
 
     return app
\ No newline at end of file
@@ -0,0 +1,397 @@
+from collections import namedtuple
+from datetime import date, datetime
+
+from email_validator import EmailNotValidError, validate_email
+from flask import Blueprint, current_app, jsonify, request
+from flask_login import current_user
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import DataError, IntegrityError
+from werkzeug.exceptions import HTTPException
+
+from app import db
+from app.forms import TicketForm, TicketResponseForm, TrainingRecordForm
+from app.models import Document, Employee, Ticket, TrainingRecord
+from app.pagination import get_per_page, keyset_paginate
+from app.replica import replica_reads
+
+# Version 1 of the JSON API; a breaking change gets a new blueprint under /api/v2
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# fields: readable columns, in response order; writable: columns a client may set;
+# filters: columns usable as equality filters on the list endpoint
+ApiResource = namedtuple('ApiResource', ['model', 'fields', 'writable', 'filters'])
+
+RESOURCES = {
+    'employees': ApiResource(
+        Employee,
+        fields=('id', 'full_name', 'age', 'phone_number', 'email', 'role', 'picture_url', 'picture_status',
+                'user_id', 'updated_at', 'version'),
+        writable=('full_name', 'age', 'phone_number', 'email', 'role'),
+        filters=('role', 'user_id')),
+    'tickets': ApiResource(
+        Ticket,
+        fields=('id', 'title', 'description', 'status', 'ticket_type', 'employee_id', 'admin_response',
+                'is_approved', 'created_at', 'updated_at', 'version'),
+        writable=('title', 'description', 'status', 'ticket_type', 'employee_id', 'admin_response', 'is_approved'),
+        filters=('employee_id', 'status', 'ticket_type')),
+    'training_records': ApiResource(
+        TrainingRecord,
+        fields=('id', 'employee_id', 'course_name', 'course_type', 'start_date', 'end_date', 'status',
+                'certification_name', 'certification_expiry', 'created_at', 'updated_at', 'version'),
+        writable=('employee_id', 'course_name', 'course_type', 'start_date', 'end_date', 'status',
+                  'certification_name', 'certification_expiry'),
+        filters=('employee_id', 'course_name', 'status')),
+    # Documents are created by uploading a file, so the API only reads them
+    'documents': ApiResource(
+        Document,
+        fields=('id', 'employee_id', 'filename', 'file_type', 'status', 'upload_date', 'updated_at', 'version'),
+        writable=(),
+        filters=('employee_id', 'status')),
+}
+
+
+def _form_choices(form_class, field):
+    return tuple(value for value, _ in getattr(form_class, field).kwargs['choices'])
+
+
+# The values the HTML forms offer for these columns are the only ones the API accepts
+CHOICES = {
+    (Ticket, 'ticket_type'): _form_choices(TicketForm, 'ticket_type'),
+    (Ticket, 'status'): _form_choices(TicketResponseForm, 'status'),
+    (TrainingRecord, 'course_type'): _form_choices(TrainingRecordForm, 'course_type'),
+    (TrainingRecord, 'status'): _form_choices(TrainingRecordForm, 'status'),
+}
+
+
+class ApiError(Exception):
+    """
+    An error returned to the client as {'error': message, 'errors': [...]} with an HTTP status code.
+    """
+
+    def __init__(self, message, status=400, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.errors = errors
+
+
+@api.errorhandler(ApiError)
+def _api_error(e):
+    body = {'error': e.message}
+    if e.errors:
+        body['errors'] = e.errors
+    return jsonify(body), e.status
+
+
+@api.errorhandler(HTTPException)
+def _http_error(e):
+    return jsonify({'error': e.description}), e.code
+
+
+@api.before_request
+def _require_admin():
+    if not current_user.is_authenticated:
+        return jsonify({'error': 'Authentication required'}), 401
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+
+def _get_resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        raise ApiError(f"Unknown resource '{name}'", 404)
+    return resource
+
+
+def _requested_fields(resource):
+    """
+    Returns the fields named by the 'fields' query argument, always including id, or all readable fields.
+    """
+    requested = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+    if not requested:
+        return resource.fields
+    unknown = [field for field in requested if field not in resource.fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return ('id',) + tuple(field for field in resource.fields if field in requested and field != 'id')
+
+
+def _select(resource, fields):
+    # Only the requested columns are selected, so a sparse request reads less and builds no ORM objects
+    return db.session.query(*[getattr(resource.model, field) for field in fields])
+
+
+def _dump(row, fields):
+    item = {}
+    for field, value in zip(fields, row):
+        item[field] = value.isoformat() if isinstance(value, (datetime, date)) else value
+    return item
+
+
+def _parse_ids(value):
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise ApiError("Expected 'ids' to be a comma-separated list of integers")
+    if len(ids) > current_app.config['API_MAX_BATCH_SIZE']:
+        raise ApiError(f"At most {current_app.config['API_MAX_BATCH_SIZE']} ids may be requested at once")
+    return ids
+
+
+def _fetch_by_ids(resource, fields, ids):
+    rows = _select(resource, fields).filter(resource.model.id.in_(ids)).all() if ids else []
+    by_id = {row.id: row for row in rows}
+    return [_dump(by_id[row_id], fields) for row_id in dict.fromkeys(ids) if row_id in by_id]
+
+
+@api.route('/<resource_name>')
+@replica_reads()
+def list_items(resource_name):
+    """
+    Returns items of a resource as JSON.
+
+    With 'ids' (comma-separated) the items with those ids are returned in one query, and the ids
+    that do not exist are listed under 'missing'. Otherwise the items are returned a page at a
+    time in id order; pass the 'next_cursor' of a page as 'cursor' to get the next one. Either
+    way 'fields' limits the columns read and returned, and on the paged form the resource's filter
+    columns can be given as query arguments, e.g. /api/v1/tickets?status=Open.
+    """
+    resource = _get_resource(resource_name)
+    fields = _requested_fields(resource)
+    if 'ids' in request.args:
+        ids = _parse_ids(request.args['ids'])
+        items = _fetch_by_ids(resource, fields, ids)
+        found = {item['id'] for item in items}
+        return jsonify({'items': items, 'missing': [row_id for row_id in dict.fromkeys(ids) if row_id not in found]})
+
+    query = _select(resource, fields)
+    for field in resource.filters:
+        if field in request.args:
+            try:
+                value = _coerce(resource.model, field, request.args[field], from_query=True)
+            except ValueError as e:
+                raise ApiError(f'{field} {e}')
+            query = query.filter(getattr(resource.model, field) == value)
+    per_page = get_per_page(request.args, current_app.config['API_PER_PAGE'], current_app.config['API_MAX_PER_PAGE'])
+    page = keyset_paginate(query, [resource.model.id], cursor=request.args.get('cursor'), per_page=per_page)
+    return jsonify({'items': [_dump(row, fields) for row in page.items], 'next_cursor': page.next_cursor})
+
+
+@api.route('/<resource_name>/<int:item_id>')
+@replica_reads()
+def get_item(resource_name, item_id):
+    """
+    Returns one item of a resource as JSON, limited to the columns in 'fields' if given.
+    """
+    resource = _get_resource(resource_name)
+    fields = _requested_fields(resource)
+    row = _select(resource, fields).filter(resource.model.id == item_id).first()
+    if row is None:
+        raise ApiError(f'{resource_name} {item_id} not found', 404)
+    return jsonify(_dump(row, fields))
+
+
+def _coerce(model, field, value, from_query=False):
+    """
+    Checks a value sent for a column against the column's type, length and allowed choices.
+
+    Returns the value converted for the column, or raises ValueError with a message for the client.
+    """
+    column = model.__table__.c[field]
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if not column.nullable:
+            raise ValueError('is required')
+        return None
+    python_type = column.type.python_type
+    if python_type is bool:
+        if from_query and value in ('true', 'false'):
+            value = value == 'true'
+        if not isinstance(value, bool):
+            raise ValueError('must be true, false or null')
+    elif python_type is int:
+        if from_query and isinstance(value, str) and value.lstrip('-').isdigit():
+            value = int(value)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError('must be an integer')
+        bits = 64 if isinstance(column.type, db.BigInteger) else 32
+        if not -2 ** (bits - 1) <= value < 2 ** (bits - 1):
+            raise ValueError('is out of range')
+    elif python_type in (date, datetime):
+        if not isinstance(value, str):
+            raise ValueError('must be an ISO 8601 date')
+        try:
+            value = python_type.fromisoformat(value)
+        except ValueError:
+            raise ValueError('must be an ISO 8601 date')
+    elif python_type is str:
+        if not isinstance(value, str):
+            raise ValueError('must be a string')
+        value = value.strip()
+        if column.type.length and len(value) > column.type.length:
+            raise ValueError(f'must be at most {column.type.length} characters')
+    choices = CHOICES.get((model, field))
+    if choices and value not in choices:
+        raise ValueError(f'must be one of {", ".join(choices)}')
+    if model is Employee and field == 'email':
+        try:
+            validate_email(value, check_deliverability=False)
+        except EmailNotValidError:
+            raise ValueError('must be a valid email address')
+    return value
+
+
+def _validate(resource, item, index, errors, creating):
+    """
+    Returns the column values of one submitted item, adding a message to errors for each invalid field.
+    """
+    if not isinstance(item, dict):
+        errors.append({'index': index, 'message': 'Item is not an object'})
+        return None
+    values = {}
+    for field in item:
+        if field in ('id', 'version'):
+            continue
+        if field not in resource.writable:
+            errors.append({'index': index, 'field': field, 'message': 'is not writable'})
+    for field in resource.writable:
+        column = resource.model.__table__.c[field]
+        if field not in item:
+            # Columns with a default may be left out of a new item, and any column out of an update
+            if creating and not column.nullable and column.default is None:
+                errors.append({'index': index, 'field': field, 'message': 'is required'})
+            continue
+        try:
+            values[field] = _coerce(resource.model, field, item[field])
+        except ValueError as e:
+            errors.append({'index': index, 'field': field, 'message': str(e)})
+    return values
+
+
+def _check_employees_exist(values_list, errors):
+    # SQLite does not enforce foreign keys, so unknown employees are reported here on every database
+    employee_ids = {values['employee_id'] for values in values_list if values and values.get('employee_id')}
+    if not employee_ids:
+        return
+    known = {row_id for row_id, in db.session.query(Employee.id).filter(Employee.id.in_(employee_ids))}
+    for index, values in enumerate(values_list):
+        if values and values.get('employee_id') and values['employee_id'] not in known:
+            errors.append({'index': index, 'field': 'employee_id', 'message': 'no such employee'})
+
+
+def _submitted_items(resource_name, resource):
+    if not resource.writable:
+        raise ApiError(f'{resource_name} are read-only', 405)
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ApiError("Expected a JSON object with a non-empty 'items' list")
+    if len(items) > current_app.config['API_MAX_BATCH_SIZE']:
+        raise ApiError(f"At most {current_app.config['API_MAX_BATCH_SIZE']} items may be written at once")
+    return items
+
+
+def _commit(resource_name, rows=()):
+    """
+    Adds rows to the session and commits, returning their ids. A unique constraint violation,
+    e.g. an email that is already taken, or a value the database rejects rolls the whole batch back.
+    """
+    try:
+        db.session.add_all(rows)
+        db.session.flush()
+        ids = [row.id for row in rows]
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        raise ApiError(f'The {resource_name} conflict with existing data: {e.orig}', 409)
+    except DataError as e:
+        db.session.rollback()
+        raise ApiError(f'The database rejected a value: {e.orig}', 400)
+    return ids
+
+
+@api.route('/<resource_name>', methods=['POST'])
+def create_items(resource_name):
+    """
+    Creates a batch of items from a JSON body {'items': [{...}, ...]} in one transaction.
+
+    Either every item is created or, if any item is invalid, none is and the response lists the
+    errors by item index. Returns the created items, limited to 'fields' if given.
+    """
+    resource = _get_resource(resource_name)
+    fields = _requested_fields(resource)
+    items = _submitted_items(resource_name, resource)
+    errors = []
+    values_list = [_validate(resource, item, index, errors, creating=True) for index, item in enumerate(items)]
+    _check_employees_exist(values_list, errors)
+    if errors:
+        raise ApiError('Invalid items; nothing was created', 400, errors)
+
+    rows = []
+    for values in values_list:
+        if resource.model is Employee:
+            # As on the add-employee page, new employees belong to the user who added them
+            values['user_id'] = current_user.id
+        rows.append(resource.model(**values))
+    # Added through the ORM, so the dashboard counters, search index and caches see every item
+    ids = _commit(resource_name, rows)
+    return jsonify({'items': _fetch_by_ids(resource, fields, ids)}), 201
+
+
+@api.route('/<resource_name>', methods=['PATCH'])
+def update_items(resource_name):
+    """
+    Updates a batch of items from a JSON body {'items': [{'id': ..., ...}, ...]} in one transaction.
+
+    Only the fields present in an item are changed. An item that carries a 'version' is only
+    updated if it still has that version, so a client cannot overwrite a change it has not seen.
+    Either every item is updated or none is. Returns the updated items, limited to 'fields' if given.
+    """
+    resource = _get_resource(resource_name)
+    fields = _requested_fields(resource)
+    items = _submitted_items(resource_name, resource)
+    errors = []
+    ids = []
+    for index, item in enumerate(items):
+        item_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(item_id, int) or isinstance(item_id, bool):
+            errors.append({'index': index, 'field': 'id', 'message': 'must be an integer'})
+        elif item_id in ids:
+            errors.append({'index': index, 'field': 'id', 'message': 'appears more than once'})
+        ids.append(item_id)
+        version = item.get('version') if isinstance(item, dict) else None
+        if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+            errors.append({'index': index, 'field': 'version', 'message': 'must be an integer'})
+    values_list = [_validate(resource, item, index, errors, creating=False) for index, item in enumerate(items)]
+    _check_employees_exist(values_list, errors)
+    if errors:
+        raise ApiError('Invalid items; nothing was updated', 400, errors)
+
+    model = resource.model
+    expected = {item['id']: item['version'] for item in items if item.get('version') is not None}
+    matched = 0
+    if expected:
+        # The versions are checked by an UPDATE, which locks the rows until this transaction ends
+        # and compares against their latest committed version, so of two clients that read the
+        # same version only the first to get here updates; the other sees the new version.
+        matched = model.query.filter(or_(*[and_(model.id == item_id, model.version == version)
+                                           for item_id, version in expected.items()]))\
+            .update({model.version: model.version, model.updated_at: model.updated_at}, synchronize_session=False)
+    rows = {row.id: row for row in model.query.filter(model.id.in_(ids))}
+    missing = [{'index': index, 'message': f'{resource_name} {item_id} not found'}
+               for index, item_id in enumerate(ids) if item_id not in rows]
+    if missing:
+        db.session.rollback()
+        raise ApiError('Unknown items; nothing was updated', 404, missing)
+    if matched != len(expected):
+        stale = [{'index': index, 'message': f'version is {rows[item["id"]].version}'}
+                 for index, item in enumerate(items)
+                 if item.get('version') is not None and item['version'] != rows[item['id']].version]
+        db.session.rollback()
+        raise ApiError('Items changed since they were read; nothing was updated', 409, stale)
+
+    for item_id, values in zip(ids, values_list):
+        row = rows[item_id]
+        for field, value in values.items():
+            setattr(row, field, value)
+    _commit(resource_name)
+    return jsonify({'items': _fetch_by_ids(resource, fields, ids)})
@@ -0,0 +1,100 @@
+import csv
+import io
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, case, func
+
+from app import db
+from app.models import CertificationSummary, Employee, TrainingRecord
+from app.pagination import keyset_paginate
+from app.replica import replica_reads
+
+# Rows read per query while exporting
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_HEADER = ['employee_id', 'employee_name', 'role', 'course_name', 'certification_name',
+                 'certification_expiry', 'status']
+
+
+def expiry_window(days, today=None):
+    """
+    Returns the (first, last) expiry dates of the certifications expiring in the next `days` days, today included.
+    """
+    today = today or date.today()
+    return today, today + timedelta(days=days)
+
+
+def refresh_certification_summary(today=None):
+    """
+    Recomputes the per-role certification expiry counts in one transaction.
+
+    A single grouped query reads only the certifications that expired in the last 30 days or
+    expire in the next 90, a range scan on the certification expiry index.
+
+    Returns:
+        int: The number of roles summarised.
+    """
+    today = today or date.today()
+    expiry = TrainingRecord.certification_expiry
+
+    def count_between(first, last):
+        return func.coalesce(func.sum(case((and_(expiry >= first, expiry <= last), 1), else_=0)), 0)
+
+    grouped = db.session.query(
+        Employee.role,
+        count_between(today - timedelta(days=30), today - timedelta(days=1)),
+        count_between(today, today + timedelta(days=30)),
+        count_between(today, today + timedelta(days=60)),
+        count_between(today, today + timedelta(days=90)),
+    ).join(Employee, TrainingRecord.employee_id == Employee.id)\
+     .filter(expiry >= today - timedelta(days=30), expiry <= today + timedelta(days=90))\
+     .group_by(Employee.role).all()
+
+    computed_at = datetime.utcnow()
+    rows = [dict(role=role, expired_30d=expired, expiring_30d=in_30, expiring_60d=in_60, expiring_90d=in_90,
+                 computed_at=computed_at)
+            for role, expired, in_30, in_60, in_90 in grouped]
+    table = CertificationSummary.__table__
+    db.session.execute(table.delete())
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def get_certification_summary():
+    """
+    Returns the precomputed per-role counts, ordered by role, and when they were computed (None if never).
+    """
+    rows = CertificationSummary.query.order_by(CertificationSummary.role).all()
+    return rows, min((row.computed_at for row in rows), default=None)
+
+
+def iter_expiring_csv(expires_from, expires_to, role=None):
+    """
+    Yields a CSV export of the certifications expiring between two dates, a few lines at a time.
+
+    The rows are read in keyset-paginated batches of plain columns, so memory use stays flat
+    however many certifications match.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADER)
+    entities = (TrainingRecord.id, TrainingRecord.employee_id, Employee.full_name, Employee.role,
+                TrainingRecord.course_name, TrainingRecord.certification_name,
+                TrainingRecord.certification_expiry, TrainingRecord.status)
+    query = TrainingRecord.expiring_query(expires_from, expires_to, role, entities=entities)
+    columns = [TrainingRecord.certification_expiry, TrainingRecord.employee_id, TrainingRecord.id]
+    cursor = None
+    while True:
+        # The generator runs while the response streams, after the view has returned, so each batch opts in itself
+        with replica_reads():
+            rows, cursor = keyset_paginate(query, columns, cursor=cursor, per_page=EXPORT_BATCH_SIZE)
+        for row in rows:
+            writer.writerow([row.employee_id, row.full_name, row.role, row.course_name, row.certification_name,
+                             row.certification_expiry.isoformat(), row.status])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        if cursor is None:
+            break
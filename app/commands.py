@@ -0,0 +1,83 @@
+import click
+
+
+def register_commands(app):
+    """
+    Registers the application's maintenance commands with the Flask CLI (run them with `flask <command>`).
+    """
+
+    @app.cli.command('rebuild-dashboard')
+    def rebuild_dashboard():
+        """Recompute the dashboard counters from the source tables."""
+        from app.rollups import rebuild_dashboard_counters
+        count = rebuild_dashboard_counters()
+        click.echo(f'Rebuilt {count} dashboard counters.')
+
+    @app.cli.command('refresh-certification-summary')
+    def refresh_certification_summary():
+        """Recompute the per-role certification expiry counts; run it daily, e.g. from cron."""
+        from app.certifications import refresh_certification_summary as refresh
+        count = refresh()
+        click.echo(f'Summarised certification expiry for {count} roles.')
+
+    @app.cli.command('reap-s3-deletions')
+    def reap_s3_deletions():
+        """Delete the queued S3 objects that are due; run it from cron to catch up after restarts."""
+        from app.s3_reaper import reap_s3_deletions as reap
+        deleted, failed = reap()
+        click.echo(f'Deleted {deleted} S3 objects, {failed} failed and will be retried.')
+
+    @app.cli.command('import-employees')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'file_format', type=click.Choice(['csv', 'json', 'jsonl']),
+                  help='File format; detected from the extension by default.')
+    @click.option('--batch-size', type=int, help='Rows per transaction; defaults to IMPORT_BATCH_SIZE.')
+    def import_employees(path, file_format, batch_size):
+        """Import employees from a CSV, JSON or JSON Lines file."""
+        from app.importer import detect_format, import_employees as run_import
+
+        file_format = file_format or detect_format(path)
+        if not file_format:
+            raise click.UsageError('Cannot detect the file format; pass --format.')
+
+        with open(path, 'rb') as stream:
+            result = run_import(stream, file_format,
+                                batch_size=batch_size or app.config['IMPORT_BATCH_SIZE'],
+                                max_errors=app.config['IMPORT_MAX_ERRORS'])
+        for row_number, message in result.errors:
+            click.echo(f'Row {row_number if row_number else "-"}: {message}', err=True)
+        click.echo(f'Imported {result.inserted} employees, {result.failed} rows failed.')
+
+    @app.cli.command('backfill-picture-variants')
+    @click.option('--batch-size', type=int, default=100, help='Employees loaded per query.')
+    @click.option('--workers', type=int, help='Pictures processed at once; defaults to IMAGE_WORKERS.')
+    def backfill_picture_variants(batch_size, workers):
+        """Generate the resized picture variants of employees added before they existed."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        from sqlalchemy import false
+
+        from app.images import backfill_employee_picture
+        from app.models import UPLOAD_READY, Employee
+
+        def backfill(row):
+            # Threads do not inherit the command's application context
+            with app.app_context():
+                return backfill_employee_picture(row.id, row.picture_url.split('/')[-1])
+
+        done = failed = 0
+        last_id = 0
+        with ThreadPoolExecutor(max_workers=workers or app.config['IMAGE_WORKERS']) as pool:
+            while True:
+                rows = (Employee.query
+                        .with_entities(Employee.id, Employee.picture_url)
+                        .filter(Employee.id > last_id, Employee.picture_url.isnot(None),
+                                Employee.picture_status == UPLOAD_READY, Employee.picture_variants == false())
+                        .order_by(Employee.id).limit(batch_size).all())
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                for ok in pool.map(backfill, rows):
+                    done += ok
+                    failed += not ok
+        click.echo(f'Generated picture variants for {done} employees, {failed} failed.')
@@ -0,0 +1,120 @@
+import hashlib
+import os
+import time
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+
+from app import db
+
+
+def _deploy_token():
+    """
+    Returns the RELEASE environment variable (e.g. the deployed git sha) if set, otherwise a digest
+    of the application's code, templates and static files. Every worker process of a deploy, and
+    every host running the same image, computes the same token.
+    """
+    release = os.environ.get('RELEASE')
+    if release:
+        return release
+    digest = hashlib.blake2b(digest_size=12)
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    for root, dirs, files in os.walk(app_dir):
+        # Uploaded files are data, not part of the release
+        dirs[:] = sorted(d for d in dirs if d not in ('__pycache__', 'uploads'))
+        for name in sorted(files):
+            if name.endswith(('.pyc', '.pyo')):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, app_dir).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Part of every page validator and fragment cache key, so a deploy with changed templates never
+# answers 304 with an old page or renders an old fragment.
+DEPLOY_TOKEN = _deploy_token()
+
+
+def row_version(model, row_id):
+    """
+    Returns (version, updated_at) of one row, or None if it does not exist. Reads two columns by
+    primary key, without loading the row.
+    """
+    return db.session.query(model.version, model.updated_at).filter(model.id == row_id).first()
+
+
+def collection_version(model, **filters):
+    """
+    Returns (row count, id sum, version sum, newest updated_at) over the rows matching filters.
+
+    Any insert, update or delete among those rows changes at least one of the values.
+    """
+    return db.session.query(
+        func.count(model.id), func.coalesce(func.sum(model.id), 0),
+        func.coalesce(func.sum(model.version), 0), func.max(model.updated_at)
+    ).filter_by(**filters).one()
+
+
+def page_validators(endpoint, rows=(), collections=(), has_csrf_form=False):
+    """
+    Builds the ETag and Last-Modified of a page from the row_version() of the rows it shows and
+    the collection_version() of the lists it shows.
+
+    The ETag also covers the viewer, because the navigation bar and the admin controls depend on
+    who is logged in. For a page that contains a CSRF-protected form it also changes every half
+    WTF_CSRF_TIME_LIMIT, so a page served from the browser cache never holds an expired token.
+
+    A deleted row leaves no timestamp behind, so pages that show a collection get no Last-Modified
+    and are validated by their ETag alone.
+
+    Returns:
+        tuple: (etag, last_modified)
+    """
+    parts = [DEPLOY_TOKEN, endpoint, current_user.get_id(), current_user.is_admin,
+             current_user.employee.id if current_user.employee else None]
+    csrf_time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if has_csrf_form and csrf_time_limit:
+        parts.append(int(time.time() // (csrf_time_limit / 2)))
+    parts.extend(tuple(version) for version in rows)
+    parts.extend(tuple(version) for version in collections)
+    etag = hashlib.blake2b(repr(parts).encode('utf-8'), digest_size=12).hexdigest()
+    last_modified = None
+    if not collections:
+        timestamps = [updated_at for _, updated_at in rows if updated_at is not None]
+        last_modified = max(timestamps) if timestamps else None
+    return etag, last_modified
+
+
+def conditional_page(etag, last_modified, render):
+    """
+    Answers a GET with an empty 304 if its If-None-Match or If-Modified-Since shows the client
+    already has this version of the page; otherwise calls render() and returns the page with its
+    validators. render() runs only when the page is needed, so the page's queries and template
+    rendering are skipped entirely for a 304.
+
+    While flashed messages are waiting the page is always rendered, so that they are shown, and it
+    gets no validators, so that a later 304 cannot bring the flashed messages back.
+    """
+    flashes_pending = bool(session.get('_flashes'))
+    if request.method == 'GET' and not flashes_pending and \
+            not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return _with_validators(current_app.response_class(status=304), etag, last_modified)
+    response = make_response(render())
+    if flashes_pending:
+        response.cache_control.no_store = True
+        return response
+    return _with_validators(response, etag, last_modified)
+
+
+def _with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Browsers keep the page but ask again on every visit; shared caches must not keep it at all
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
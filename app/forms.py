@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, SubmitField, IntegerField, TextAreaField, SelectField, DateField
+from wtforms import HiddenField, StringField, PasswordField, BooleanField, SubmitField, IntegerField, TextAreaField, SelectField, DateField
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length
 from flask_wtf.file import FileField, FileAllowed, FileRequired
 from app.models import User
@@ -27,11 +27,11 @@ class EmployeeForm(FlaskForm):
     """
     Form for adding an employee with name, age, phone number, email, and role
     """
-    full_name = StringField('Full Name', validators=[DataRequired()])
+    full_name = StringField('Full Name', validators=[DataRequired(), Length(max=100)])
     age = IntegerField('Age', validators=[DataRequired()])
-    phone_number = StringField('Phone Number', validators=[DataRequired()])
-    email = StringField('Email', validators=[DataRequired(), Email()])
-    role = StringField('Role', validators=[DataRequired()])
+    phone_number = StringField('Phone Number', validators=[DataRequired(), Length(max=20)])
+    email = StringField('Email', validators=[DataRequired(), Email(), Length(max=120)])
+    role = StringField('Role', validators=[DataRequired(), Length(max=50)])
     picture = FileField('Picture', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
     submit = SubmitField('Add Employee')
 
@@ -53,6 +53,21 @@ class TicketResponseForm(FlaskForm):
     is_approved = SelectField('Approval', choices=[('None', 'Pending'), ('True', 'Approved'), ('False', 'Disapproved')], validators=[DataRequired()])
     submit = SubmitField('Submit Response')
 
+class TicketTriageForm(FlaskForm):
+    """
+    Form for responding to many tickets at once. The selected ticket ids are submitted as
+    'ticket_ids' checkboxes; 'Respond to All Matching' acts on the ticket list's filters instead.
+    """
+    admin_response = TextAreaField('Response', validators=[DataRequired()])
+    status = SelectField('Status', choices=[('Open', 'Open'), ('In Progress', 'In Progress'), ('Closed', 'Closed')], validators=[DataRequired()])
+    is_approved = SelectField('Approval', choices=[('None', 'Pending'), ('True', 'Approved'), ('False', 'Disapproved')], validators=[DataRequired()])
+    status_filter = HiddenField('Status Filter')
+    ticket_type_filter = HiddenField('Type Filter')
+    created_from_filter = HiddenField('Created From Filter')
+    created_to_filter = HiddenField('Created To Filter')
+    apply = SubmitField('Respond to Selected')
+    apply_all = SubmitField('Respond to All Matching')
+
 class TrainingRecordForm(FlaskForm):
     course_name = StringField('Course Name', validators=[DataRequired()])
     course_type = SelectField('Course Type', choices=[('Training', 'Training'), ('Certification', 'Certification')], validators=[DataRequired()])
@@ -75,4 +90,29 @@ class DocumentUploadForm(FlaskForm):
         FileRequired(),
         FileAllowed(['pdf', 'doc', 'docx', 'jpg', 'png'], 'Only PDF, DOC, DOCX, JPG, and PNG files are allowed!')
     ])
-    submit = SubmitField('Upload Document')
\ No newline at end of file
+    submit = SubmitField('Upload Document')
+
+class EmployeeImportForm(FlaskForm):
+    file = FileField('Employee File', validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'json', 'jsonl', 'ndjson'], 'Only CSV, JSON and JSON Lines files are allowed!')
+    ])
+    submit = SubmitField('Import Employees')
+
+class EmployeeBulkDeleteForm(FlaskForm):
+    """
+    Form for deleting every employee with a role, e.g. when a team is disbanded.
+    """
+    role = HiddenField('Role', validators=[DataRequired()])
+    submit = SubmitField('Delete All With This Role')
+
+class UserReviewForm(FlaskForm):
+    """
+    Form for approving or rejecting pending users in bulk. The selected user ids are
+    submitted as 'user_ids' checkboxes; the 'all matching' buttons act on the search instead.
+    """
+    search = HiddenField('Search')
+    approve = SubmitField('Approve Selected')
+    reject = SubmitField('Reject Selected')
+    approve_all = SubmitField('Approve All Matching')
+    reject_all = SubmitField('Reject All Matching')
@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from prometheus_client import Counter
+
+from app.conditional import DEPLOY_TOKEN
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_REQUESTS = Counter(
+    'template_fragment_cache_requests_total', 'Template fragment cache lookups.', ['result'])
+
+# The shared backend prunes expired and surplus entries once every this many writes
+SQLITE_PRUNE_INTERVAL = 200
+
+
+def fragment_key(location, parts):
+    """
+    Derives a cache key from a {% cache %} tag's location (template and line) and its key values.
+
+    The deploy token is part of every key, so a fragment cached before a deploy is never served
+    from an edited template.
+    """
+    raw = repr((DEPLOY_TOKEN, location, tuple(parts))).encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class MemoryBackend:
+    """
+    A bounded LRU cache in the memory of one process, with a time-to-live per entry.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """
+    A cache in a SQLite file, shared by every worker process on the host.
+
+    Entries expire after the time-to-live. When there are more than max_entries, the oldest
+    written are dropped first. Errors are logged and treated as misses, so the cache can never break a page.
+    """
+
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def _connection(self):
+        # SQLite connections must not cross threads or forks, so every thread of every process opens its own
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS fragment '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, stored REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_fragment_stored ON fragment (stored)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                'SELECT value FROM fragment WHERE key = ? AND expires > ?', (key, time.time())).fetchone()
+        except sqlite3.Error:
+            logger.exception("Fragment cache read failed")
+            return None
+        return row[0] if row else None
+
+    def set(self, key, value):
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute('INSERT OR REPLACE INTO fragment (key, value, expires, stored) VALUES (?, ?, ?, ?)',
+                               (key, value, now + self.ttl, now))
+            with self._writes_lock:
+                self._writes += 1
+                prune = self._writes % SQLITE_PRUNE_INTERVAL == 0
+            if prune:
+                connection.execute('DELETE FROM fragment WHERE expires <= ?', (now,))
+                connection.execute('DELETE FROM fragment WHERE key IN '
+                                   '(SELECT key FROM fragment ORDER BY stored DESC LIMIT -1 OFFSET ?)',
+                                   (self.max_entries,))
+        except sqlite3.Error:
+            logger.exception("Fragment cache write failed")
+
+    def clear(self):
+        try:
+            self._connection().execute('DELETE FROM fragment')
+        except sqlite3.Error:
+            logger.exception("Fragment cache clear failed")
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Adds a {% cache %} tag that stores the rendered markup of its body:
+
+        {% cache 'employee_card', employee.id, employee.version %} ... {% endcache %}
+
+    The values after the tag form the key, together with the tag's template and line. They must
+    include every value the body renders that can change: typically the row id and version,
+    and anything that depends on the viewer, such as current_user.is_admin.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        location = nodes.Const(f'{parser.name}:{lineno}')
+        return nodes.CallBlock(self.call_method('_render_cached', [location, nodes.List(parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, location, parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = fragment_key(location, parts)
+        value = cache.get(key)
+        if value is not None:
+            FRAGMENT_REQUESTS.labels('hit').inc()
+            return Markup(value)
+        FRAGMENT_REQUESTS.labels('miss').inc()
+        value = caller()
+        cache.set(key, str(value))
+        return value
+
+
+def init_fragment_cache(app):
+    """
+    Registers the {% cache %} tag with the app's templates and creates the configured backend:
+    'memory' (per process, the default), 'sqlite' (shared by the processes on a host) or 'none'.
+    Hits and misses are counted in the template_fragment_cache_requests_total metric.
+    """
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    backend = app.config['FRAGMENT_CACHE_BACKEND']
+    size, ttl = app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL']
+    if backend == 'memory':
+        app.jinja_env.fragment_cache = MemoryBackend(size, ttl)
+    elif backend == 'sqlite':
+        path = app.config['FRAGMENT_CACHE_PATH'] or os.path.join(tempfile.gettempdir(), 'ems-fragment-cache.sqlite3')
+        app.jinja_env.fragment_cache = SQLiteBackend(path, size, ttl)
+    elif backend != 'none':
+        raise ValueError(f"Unknown FRAGMENT_CACHE_BACKEND {backend!r}; use 'memory', 'sqlite' or 'none'")
@@ -0,0 +1,107 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, joinedload
+
+from app import db
+from app.models import Employee, User
+
+# user id -> (pickled detached User with its Employee loaded, monotonic expiry time)
+_identities = OrderedDict()
+_identities_lock = threading.Lock()
+# Incremented by every invalidation; a load that overlapped one is not cached, as it may have read the old row
+_invalidations = 0
+
+
+def load_user_identity(user_id):
+    """
+    Returns the User for a session's user id, with its Employee loaded in the same query.
+
+    With IDENTITY_CACHE_SIZE > 0 the loaded user is also kept in a per-process LRU cache for
+    IDENTITY_CACHE_TTL seconds, and later requests get it without touching the database.
+    Cached entries are pickled so that no two requests share an instance; on a hit the copy is
+    merged into the request's session without emitting SQL.
+    """
+    size = current_app.config['IDENTITY_CACHE_SIZE']
+    if size > 0:
+        now = time.monotonic()
+        with _identities_lock:
+            cached = _identities.get(user_id)
+            if cached and cached[1] > now:
+                _identities.move_to_end(user_id)
+                return db.session.merge(pickle.loads(cached[0]), load=False)
+            invalidations = _invalidations
+
+    user = User.query.options(joinedload(User.employee)).get(user_id)
+    if user is not None and size > 0:
+        entry = (pickle.dumps(user), time.monotonic() + current_app.config['IDENTITY_CACHE_TTL'])
+        with _identities_lock:
+            if _invalidations != invalidations:
+                return user
+            _identities[user_id] = entry
+            _identities.move_to_end(user_id)
+            while len(_identities) > size:
+                _identities.popitem(last=False)
+    return user
+
+
+def invalidate_user_identity(*user_ids):
+    """
+    Drops cached identities. ORM writes to User and Employee rows do this automatically when
+    they commit; bulk statements that bypass the ORM must call it, after committing, for the
+    users they touch.
+    """
+    global _invalidations
+    with _identities_lock:
+        _invalidations += 1
+        for user_id in user_ids:
+            _identities.pop(user_id, None)
+
+
+def clear_identity_cache():
+    """
+    Drops every cached identity.
+    """
+    global _invalidations
+    with _identities_lock:
+        _invalidations += 1
+        _identities.clear()
+
+
+# Changed users are collected per session and dropped once the change is committed: dropping them
+# at flush time would let another request cache the still-committed old row for the whole TTL.
+
+def _changed_user_ids(target):
+    return Session.object_session(target).info.setdefault('changed_identities', set())
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    _changed_user_ids(target).add(target.id)
+
+
+@event.listens_for(Employee, 'after_insert')
+@event.listens_for(Employee, 'after_update')
+@event.listens_for(Employee, 'after_delete')
+def _employee_changed(mapper, connection, target):
+    # The cached user carries its employee, so a change to the employee is a change to the identity.
+    # None rather than empty when user_id was never set, as for an employee without a user
+    previous_user_ids = inspect(target).attrs.user_id.history.deleted or ()
+    _changed_user_ids(target).update(user_id for user_id in (target.user_id, *previous_user_ids) if user_id is not None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    user_ids = session.info.pop('changed_identities', None)
+    if user_ids:
+        invalidate_user_identity(*user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('changed_identities', None)
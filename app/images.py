@@ -0,0 +1,166 @@
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+
+from app.s3_utils import get_s3_client, upload_file_to_s3
+
+logger = logging.getLogger(__name__)
+
+# variant name -> longest side in pixels. 'card' is the employee directory, 'profile' the profile page.
+PICTURE_VARIANTS = {
+    'card': 320,
+    'profile': 800,
+}
+# format -> (file extension, content type, Pillow save options)
+PICTURE_FORMATS = {
+    'webp': ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Variant keys embed the original's unique key, so an object never changes once written
+VARIANT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def picture_variant_key(s3_key, name, fmt):
+    """
+    Returns the S3 key of one variant of the picture stored under s3_key,
+    e.g. variants/<original key without extension>/card.webp.
+    """
+    stem = s3_key.rsplit('.', 1)[0]
+    return f'variants/{stem}/{name}.{PICTURE_FORMATS[fmt][0]}'
+
+
+def picture_variant_keys(s3_key):
+    """
+    Returns the S3 keys of every variant of the picture stored under s3_key.
+    """
+    return [picture_variant_key(s3_key, name, fmt) for name in PICTURE_VARIANTS for fmt in PICTURE_FORMATS]
+
+
+def _get_pool():
+    # Resizing is CPU-bound and holds the GIL, so it runs in worker processes rather than threads.
+    # The workers are spawned rather than forked, because forking a process that is running
+    # request and upload threads can copy held locks into the child.
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'],
+                                            mp_context=multiprocessing.get_context('spawn'))
+                _pool_pid = pid
+    return _pool
+
+
+def render_picture_variants(path, workdir):
+    """
+    Writes every PICTURE_VARIANTS size of the image at path into workdir, in every PICTURE_FORMATS
+    format. Runs in a worker process.
+
+    Returns:
+        list: (variant name, format, file path) tuples.
+    """
+    from PIL import Image, ImageOps
+
+    rendered = []
+    largest = max(PICTURE_VARIANTS.values())
+    with Image.open(path) as original:
+        # Lets the JPEG decoder scale down by up to 8x while decoding, which is far cheaper than a full decode
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        # Largest first, so every smaller size is resized from the previous one rather than the original
+        for name, size in sorted(PICTURE_VARIANTS.items(), key=lambda item: -item[1]):
+            image = image.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+            for fmt, (extension, _, options) in PICTURE_FORMATS.items():
+                target = os.path.join(workdir, f'{name}.{extension}')
+                image.save(target, format=fmt.upper(), **options)
+                rendered.append((name, fmt, target))
+    return rendered
+
+
+def generate_picture_variants(path, s3_key):
+    """
+    Resizes the picture at path on the process pool and uploads the variants under keys derived
+    from s3_key. Must run inside an application context.
+
+    Returns:
+        bool: True if every variant was uploaded.
+    """
+    workdir = tempfile.mkdtemp(prefix='variants-')
+    try:
+        rendered = _get_pool().submit(render_picture_variants, path, workdir).result(
+            timeout=current_app.config['IMAGE_TIMEOUT'])
+        for name, fmt, variant_path in rendered:
+            extra_args = {'ContentType': PICTURE_FORMATS[fmt][1], 'CacheControl': VARIANT_CACHE_CONTROL}
+            with open(variant_path, 'rb') as variant:
+                if not upload_file_to_s3(variant, picture_variant_key(s3_key, name, fmt), extra_args=extra_args):
+                    return False
+        return True
+    except Exception:
+        logger.exception(f"Could not generate picture variants for {s3_key}")
+        return False
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def mark_picture_variants(employee_id):
+    """
+    Records that an employee's picture variants exist.
+    """
+    from app import db
+    from app.models import Employee
+
+    # Updated through the ORM, so the events that keep the identity cache current run
+    employee = db.session.get(Employee, employee_id)
+    if employee is not None:
+        employee.picture_variants = True
+        db.session.commit()
+
+
+def process_employee_picture(path, s3_key, employee_id):
+    """
+    Generates and records the variants of a just-uploaded employee picture. Used as the
+    after_upload hook of picture uploads, so it runs in the upload worker thread.
+    """
+    if generate_picture_variants(path, s3_key):
+        mark_picture_variants(employee_id)
+
+
+def backfill_employee_picture(employee_id, s3_key):
+    """
+    Downloads an existing employee picture from S3 and generates its variants.
+
+    Returns:
+        bool: True if the variants were generated and recorded.
+    """
+    fd, path = tempfile.mkstemp(prefix='picture-')
+    try:
+        with os.fdopen(fd, 'wb') as download:
+            get_s3_client().download_fileobj(current_app.config['S3_BUCKET'], s3_key, download)
+        if not generate_picture_variants(path, s3_key):
+            return False
+        mark_picture_variants(employee_id)
+        return True
+    except Exception:
+        logger.exception(f"Could not backfill picture variants for employee {employee_id}")
+        return False
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+from collections import Counter, namedtuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from app import db
+from app.forms import EmployeeForm
+from app.models import Employee
+from app.rollups import apply_counter_deltas
+from app.search import reset_search_index
+
+# Columns read from each import row; they match the fields of EmployeeForm
+IMPORT_FIELDS = ('full_name', 'age', 'phone_number', 'email', 'role')
+IMPORT_FORMATS = ('csv', 'json', 'jsonl')
+
+ImportResult = namedtuple('ImportResult', ['inserted', 'failed', 'errors'])
+
+
+def detect_format(filename):
+    """
+    Returns the import format implied by a file name's extension, or None if it is not supported.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'ndjson':
+        return 'jsonl'
+    return extension if extension in IMPORT_FORMATS else None
+
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    for row in csv.DictReader(text):
+        yield row
+
+
+def _iter_jsonl(stream):
+    for line in io.TextIOWrapper(stream, encoding='utf-8-sig'):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _iter_json_array(stream, chunk_size=64 * 1024):
+    # Decodes one array element at a time from a sliding buffer, so the whole file is never in memory.
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer = text.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('A JSON import file must contain an array of employee objects')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = text.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_rows(stream, file_format):
+    """
+    Yields one dict per record of a binary CSV, JSON array or JSON Lines stream, reading it incrementally.
+    """
+    if file_format == 'csv':
+        return _iter_csv(stream)
+    if file_format == 'jsonl':
+        return _iter_jsonl(stream)
+    if file_format == 'json':
+        return _iter_json_array(stream)
+    raise ValueError(f'Unsupported import format: {file_format}')
+
+
+def validate_row(row, form=None):
+    """
+    Validates one import row with the same rules as the add-employee form.
+
+    Binding a form's fields costs more than validating them, so callers validating many rows
+    should create one form with new_row_form() and pass it in for every row.
+
+    Returns:
+        tuple: (values, None) with the cleaned column values, or (None, message) if the row is invalid.
+    """
+    if not isinstance(row, dict):
+        return None, 'Row is not an object'
+    formdata = MultiDict({field: '' if row.get(field) is None else str(row.get(field)).strip()
+                          for field in IMPORT_FIELDS})
+    if form is None:
+        form = new_row_form()
+    form.process(formdata)
+    if not form.validate():
+        message = '; '.join(f'{field}: {", ".join(errors)}' for field, errors in form.errors.items())
+        return None, message
+    return {field: getattr(form, field).data for field in IMPORT_FIELDS}, None
+
+
+def new_row_form():
+    """
+    Returns an EmployeeForm, without CSRF protection, for validating import rows.
+    """
+    return EmployeeForm(formdata=None, meta={'csrf': False})
+
+
+def import_employees(stream, file_format, batch_size=1000, max_errors=1000):
+    """
+    Imports employees from a CSV, JSON array or JSON Lines stream in batches.
+
+    Every row is validated with the EmployeeForm rules and checked for an email that is already
+    taken, by an existing employee or an earlier row. Imported employees are not linked to a user
+    account, as User.employee holds at most one employee per user. Valid rows are written with one bulk insert
+    and one commit per batch; invalid rows are reported and skipped without stopping the import.
+
+    Args:
+        stream: A binary file-like object.
+        file_format (str): One of 'csv', 'json' or 'jsonl'.
+        batch_size (int): The number of rows inserted per transaction.
+        max_errors (int): The number of row errors kept for the report; all of them are counted.
+
+    Returns:
+        ImportResult: The numbers of inserted and failed rows and up to max_errors (row number, message) pairs.
+    """
+    result = {'inserted': 0, 'failed': 0}
+    errors = []
+
+    def fail(row_number, message):
+        result['failed'] += 1
+        if len(errors) < max_errors:
+            errors.append((row_number, message))
+
+    batch = []
+    form = new_row_form()
+    try:
+        for row_number, row in enumerate(iter_rows(stream, file_format), start=1):
+            values, message = validate_row(row, form)
+            if message:
+                fail(row_number, message)
+                continue
+            batch.append((row_number, values))
+            if len(batch) >= batch_size:
+                result['inserted'] += _insert_batch(batch, fail)
+                batch = []
+    except (ValueError, csv.Error) as e:
+        # A malformed file stops the import; batches already committed stay committed.
+        fail(None, f'Could not parse file: {e}')
+    if batch:
+        result['inserted'] += _insert_batch(batch, fail)
+    if result['inserted']:
+        reset_search_index()
+    return ImportResult(result['inserted'], result['failed'], errors)
+
+
+def _insert_batch(batch, fail):
+    emails = [values['email'] for _, values in batch]
+    taken = {email for email, in db.session.query(Employee.email).filter(Employee.email.in_(emails))}
+    rows = []
+    for row_number, values in batch:
+        if values['email'] in taken:
+            fail(row_number, f'email: {values["email"]} is already in use')
+            continue
+        taken.add(values['email'])
+        rows.append((row_number, values))
+    if not rows:
+        db.session.rollback()
+        return 0
+
+    try:
+        _write([values for _, values in rows])
+        return len(rows)
+    except (IntegrityError, DataError):
+        # Someone else inserted one of these emails meanwhile, or a value does not fit its column
+        # (e.g. an age out of the column's range); fall back to one row per transaction.
+        db.session.rollback()
+    inserted = 0
+    for row_number, values in rows:
+        try:
+            _write([values])
+            inserted += 1
+        except (IntegrityError, DataError) as e:
+            db.session.rollback()
+            fail(row_number, f'Could not insert row: {e.orig}')
+    return inserted
+
+
+def _write(rows):
+    db.session.bulk_insert_mappings(Employee, rows)
+    # Bulk inserts bypass the ORM events, so the dashboard counters are updated explicitly.
+    apply_counter_deltas(db.session.connection(), 'employee_role', Counter(values['role'] for values in rows))
+    db.session.commit()
@@ -0,0 +1,135 @@
+import logging
+import os
+import time
+from collections import Counter
+
+from flask import Response, abort, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter as MetricCounter, Histogram,
+                               generate_latest, multiprocess, REGISTRY)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.', ['endpoint', 'method', 'status'])
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'SQL statements executed per request.', ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')))
+DB_TIME = Histogram(
+    'db_time_per_request_seconds', 'Total time spent in SQL statements per request.', ['endpoint'])
+DB_SLOWEST = Histogram(
+    'db_slowest_statement_seconds', 'Duration of the slowest SQL statement of each request.', ['endpoint'])
+REPEATED_STATEMENTS = MetricCounter(
+    'db_repeated_statement_warnings_total', 'Requests that repeated one SQL statement shape too often.', ['endpoint'])
+
+# Endpoints whose cost is not interesting and would only add noise
+_IGNORED_ENDPOINTS = {'static', 'metrics'}
+# Addresses /metrics is served to when no METRICS_TOKEN is configured
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class RequestQueryStats:
+    """
+    SQL statistics of the request being handled, kept on flask.g.
+    """
+    __slots__ = ('count', 'total', 'slowest', 'slowest_statement', 'shapes')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+        self.shapes = Counter()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_stats' in g:
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'sql_stats' in g):
+        return
+    starts = conn.info.get('query_start_time')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = g.sql_stats
+    stats.count += 1
+    stats.total += elapsed
+    # Statements are compiled with placeholders, so the text is the statement's shape.
+    stats.shapes[statement] += 1
+    if elapsed > stats.slowest:
+        stats.slowest = elapsed
+        stats.slowest_statement = statement
+
+
+def init_instrumentation(app):
+    """
+    Records per-request SQL statistics and request latency, adds a Server-Timing header, warns
+    about repeated statement shapes (N+1 query loops) and serves the histograms at /metrics.
+
+    The cost per statement is two clock reads and a dictionary update, so it is left on in production.
+    Set METRICS_ENABLED=false to turn it off entirely.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_stats = RequestQueryStats()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('request_started', None)
+        stats = g.pop('sql_stats', None)
+        endpoint = request.endpoint or 'unknown'
+        if started is None or stats is None or endpoint in _IGNORED_ENDPOINTS:
+            return response
+        duration = time.perf_counter() - started
+
+        REQUEST_DURATION.labels(endpoint, request.method, response.status_code).observe(duration)
+        DB_QUERIES.labels(endpoint).observe(stats.count)
+        DB_TIME.labels(endpoint).observe(stats.total)
+        DB_SLOWEST.labels(endpoint).observe(stats.slowest)
+
+        if stats.shapes:
+            statement, repeats = stats.shapes.most_common(1)[0]
+            if repeats > app.config['SQL_REPEAT_WARNING_THRESHOLD']:
+                REPEATED_STATEMENTS.labels(endpoint).inc()
+                logger.warning(f"Possible N+1 query in {endpoint}: statement ran {repeats} times in one request: "
+                               f"{' '.join(statement.split())[:300]}")
+        if stats.slowest > app.config['SQL_SLOW_STATEMENT_SECONDS']:
+            logger.warning(f"Slow SQL statement in {endpoint} took {stats.slowest * 1000:.1f} ms: "
+                           f"{' '.join(stats.slowest_statement.split())[:300]}")
+
+        response.headers.add('Server-Timing', f'db;dur={stats.total * 1000:.2f};desc="{stats.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={duration * 1000:.2f}')
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """
+        Serves the metrics in the Prometheus text format. With several worker processes,
+        PROMETHEUS_MULTIPROC_DIR must be set so that every scrape sees all of them.
+
+        With METRICS_TOKEN set, the token must be sent as a bearer token. Without it, only direct
+        requests from the same host (a local scraper or sidecar) are served.
+        """
+        token = app.config['METRICS_TOKEN']
+        if token:
+            if request.headers.get('Authorization') != f'Bearer {token}':
+                abort(401)
+        elif request.remote_addr not in LOCAL_ADDRESSES or 'X-Forwarded-For' in request.headers:
+            # A request relayed by a proxy on this host would otherwise look local
+            abort(404)
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
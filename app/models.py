@@ -1,8 +1,25 @@
 from app import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from datetime import datetime
-from sqlalchemy import func
+import uuid
+from sqlalchemy import and_, exists, false, func, literal_column, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from app.pagination import keyset_paginate
+from app.replica import replica_reads
+from app.passwords import hash_password
+from app.images import PICTURE_VARIANTS, picture_variant_key
+from app.s3_utils import get_s3_object_url
+
+# Upload states for Document.status and Employee.picture_status
+UPLOAD_PENDING = 'pending'
+UPLOAD_READY = 'ready'
+UPLOAD_FAILED = 'failed'
+
+# onupdate value of the version columns. As a SQL expression it also applies to bulk query.update()
+# statements, so every UPDATE of a row changes its version, which the page validators in app.conditional read.
+NEXT_VERSION = literal_column('version + 1')
 
 class User(UserMixin, db.Model):
     """
@@ -11,7 +28,8 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    # Room for the longer hashes PASSWORD_HASH_METHOD may select, e.g. pbkdf2:sha512 (166 characters)
+    password_hash = db.Column(db.String(255))
     is_admin = db.Column(db.Boolean, default=False)
     is_approved = db.Column(db.Boolean, default=False)
     employee = db.relationship('Employee', back_populates='user', uselist=False)
@@ -20,9 +38,9 @@ class User(UserMixin, db.Model):
 
     def set_password(self, password):
         """
-        Sets the password for the User model by generating a password hash.
+        Sets the password for the User model by generating a password hash with PASSWORD_HASH_METHOD.
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """
@@ -30,21 +48,83 @@ class User(UserMixin, db.Model):
         """
         return check_password_hash(self.password_hash, password)
 
+    __table_args__ = (
+        # Pending-user queue: is_approved = false, oldest sign-ups first
+        db.Index('ix_user_is_approved_id', 'is_approved', 'id'),
+    )
+
     def __repr__(self):
         return f'<User {self.username}>'
 
+    @classmethod
+    def _pending_query(cls, search=None):
+        query = cls.query.filter(cls.is_approved == false())
+        if search:
+            query = query.filter(or_(cls.username.startswith(search, autoescape=True),
+                                     cls.email.startswith(search, autoescape=True)))
+        return query
+
+    @classmethod
+    @replica_reads()
+    def get_pending_page(cls, search=None, cursor=None, per_page=50):
+        """
+        Returns one keyset-paginated page of users waiting for approval, oldest sign-ups first.
+
+        Filters by a username or email prefix.
+        """
+        return keyset_paginate(cls._pending_query(search), [cls.id], cursor=cursor, per_page=per_page)
+
+    @classmethod
+    def review_pending(cls, approve, user_ids=None, search=None):
+        """
+        Approves or rejects pending users in one set-based statement and one commit.
+
+        Acts on the given user ids, or on every pending user matching `search` if user_ids is None.
+        Approved users get is_approved set; rejected users are deleted, except those that already
+        have an employee record or messages, which are left pending. Users that are not pending
+        are never touched.
+
+        Returns:
+            int: The number of users approved or rejected.
+        """
+        from app.identity_cache import invalidate_user_identity
+
+        if user_ids is None:
+            user_ids = [user_id for user_id, in cls._pending_query(search).with_entities(cls.id)]
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return 0
+        pending = and_(cls.id.in_(user_ids), cls.is_approved == false())
+        if approve:
+            changed = cls.query.filter(pending).update({cls.is_approved: True}, synchronize_session=False)
+        else:
+            unreferenced = and_(
+                ~exists().where(Employee.user_id == cls.id),
+                ~exists().where(or_(Message.sender_id == cls.id, Message.recipient_id == cls.id)))
+            changed = cls.query.filter(pending, unreferenced).delete(synchronize_session=False)
+        db.session.commit()
+        # The bulk statement bypasses the ORM events that normally keep the identity cache current
+        invalidate_user_identity(*user_ids)
+        return changed
+
 class Employee(db.Model):
     """
     Employee model for storing employee information in the database using SQLAlchemy.
     """
     id = db.Column(db.Integer, primary_key=True)
-    full_name = db.Column(db.String(100), nullable=False)
+    full_name = db.Column(db.String(100), nullable=False, index=True)
     age = db.Column(db.Integer, nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    role = db.Column(db.String(50), nullable=False)
+    role = db.Column(db.String(50), nullable=False, index=True)
     picture_url = db.Column(db.String(500))
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    picture_status = db.Column(db.String(10), nullable=False, default=UPLOAD_READY, server_default=UPLOAD_READY)
+    # True once the resized picture variants (see app.images.PICTURE_VARIANTS) are in S3
+    picture_variants = db.Column(db.Boolean, nullable=False, default=False, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=NEXT_VERSION)
+    # The user the employee belongs to; None for employees imported in bulk
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     user = db.relationship('User', back_populates='employee')
     tickets = db.relationship('Ticket', back_populates='employee', lazy='dynamic')
     training_records = db.relationship('TrainingRecord', back_populates='employee', lazy='dynamic')
@@ -52,11 +132,51 @@ class Employee(db.Model):
 
     def __repr__(self):
         return f'<Employee {self.full_name}>'
+
+    @property
+    def picture_key(self):
+        """
+        The S3 key of the original picture, which is the last segment of picture_url.
+        """
+        return self.picture_url.split('/')[-1] if self.picture_url else None
+
+    def picture_variant_url(self, name, fmt='jpeg'):
+        """
+        Returns the URL of one resized variant of the picture, or of the original if there are no variants yet.
+        """
+        if not self.picture_variants:
+            return self.picture_url
+        return get_s3_object_url(picture_variant_key(self.picture_key, name, fmt))
+
+    def picture_srcset(self, fmt='jpeg'):
+        """
+        Returns a srcset attribute value listing every variant of the picture in one format.
+        """
+        if not self.picture_variants:
+            return ''
+        return ', '.join(f'{get_s3_object_url(picture_variant_key(self.picture_key, name, fmt))} {size}w'
+                         for name, size in sorted(PICTURE_VARIANTS.items(), key=lambda item: item[1]))
     
     @classmethod
+    @replica_reads()
     def get_role_distribution(cls):
         return db.session.query(cls.role, func.count(cls.id)).group_by(cls.role).all()
 
+    @classmethod
+    @replica_reads()
+    def get_directory_page(cls, role=None, name_prefix=None, cursor=None, per_page=24):
+        """
+        Returns one keyset-paginated page of the employee directory, ordered by name.
+
+        Filters by exact role and by full name prefix; both use the indexes on those columns.
+        """
+        query = cls.query
+        if role:
+            query = query.filter(cls.role == role)
+        if name_prefix:
+            query = query.filter(cls.full_name.startswith(name_prefix, autoescape=True))
+        return keyset_paginate(query, [cls.full_name, cls.id], cursor=cursor, per_page=per_page)
+
 class Ticket(db.Model):
     """
     Ticket model for storing ticket information in the database using SQLAlchemy.
@@ -68,17 +188,65 @@ class Ticket(db.Model):
     ticket_type = db.Column(db.String(20), nullable=False)  # Request, Issue, etc.
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=NEXT_VERSION)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     employee = db.relationship('Employee', back_populates='tickets')
     admin_response = db.Column(db.Text)
     is_approved = db.Column(db.Boolean, default=None)
 
+    __table_args__ = (
+        # Admin triage: filter by status, newest first
+        db.Index('ix_ticket_status_created_at', 'status', 'created_at'),
+        # "Your Tickets": one employee's tickets, newest first
+        db.Index('ix_ticket_employee_id_created_at', 'employee_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<Ticket {self.id}: {self.title}>'
     
     @classmethod
+    @replica_reads()
     def get_ticket_status_count(cls):
         return db.session.query(cls.status, func.count(cls.id)).group_by(cls.status).all()
+
+    @classmethod
+    def queue_criteria(cls, status=None, ticket_type=None, created_from=None, created_before=None):
+        """
+        Returns the filter criteria of the ticket queue; created_from is inclusive and created_before exclusive.
+        """
+        criteria = []
+        if status:
+            criteria.append(cls.status == status)
+        if ticket_type:
+            criteria.append(cls.ticket_type == ticket_type)
+        if created_from:
+            criteria.append(cls.created_at >= created_from)
+        if created_before:
+            criteria.append(cls.created_at < created_before)
+        return criteria
+
+    @classmethod
+    @replica_reads()
+    def get_queue_page(cls, employee_id=None, status=None, ticket_type=None, created_from=None,
+                       created_before=None, cursor=None, per_page=25):
+        """
+        Returns one keyset-paginated page of tickets, newest first.
+
+        With employee_id the page holds that employee's Ticket objects. Without it the page holds
+        (Ticket, employee_name, username) rows for the admin queue. created_from is inclusive and
+        created_before exclusive.
+        """
+        if employee_id is None:
+            query = db.session.query(
+                cls,
+                Employee.full_name.label('employee_name'),
+                User.username.label('username')
+            ).join(Employee, cls.employee_id == Employee.id)\
+             .outerjoin(User, Employee.user_id == User.id)
+        else:
+            query = cls.query.filter(cls.employee_id == employee_id)
+        query = query.filter(*cls.queue_criteria(status, ticket_type, created_from, created_before))
+        return keyset_paginate(query, [cls.created_at, cls.id], cursor=cursor, per_page=per_page, descending=True)
     
 class TrainingRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -92,12 +260,49 @@ class TrainingRecord(db.Model):
     certification_expiry = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=NEXT_VERSION)
     employee = db.relationship('Employee', back_populates='training_records')
 
+    __table_args__ = (
+        # Expiry reports: range scan over certification_expiry, employees grouped within each day
+        db.Index('ix_training_record_certification_expiry_employee_id', 'certification_expiry', 'employee_id'),
+    )
+
     def __repr__(self):
         return f'<TrainingRecord {self.course_name} for Employee {self.employee_id}>'
+
+    @classmethod
+    def expiring_query(cls, expires_from, expires_to, role=None, entities=None):
+        """
+        Returns a query over the certifications expiring between two dates (both inclusive),
+        joined to their employees. entities defaults to (TrainingRecord, employee_name, employee_role).
+        """
+        if entities is None:
+            entities = (cls, Employee.full_name.label('employee_name'), Employee.role.label('employee_role'))
+        query = db.session.query(*entities)\
+            .join(Employee, cls.employee_id == Employee.id)\
+            .filter(cls.certification_expiry >= expires_from, cls.certification_expiry <= expires_to)
+        if role:
+            query = query.filter(Employee.role == role)
+        return query
+
+    @classmethod
+    @replica_reads()
+    def get_expiring_page(cls, expires_from, expires_to, role=None, cursor=None, per_page=50):
+        """
+        Returns one keyset-paginated page of certifications expiring between two dates (both
+        inclusive), soonest first, as (TrainingRecord, employee_name, employee_role) rows.
+
+        The date range is a range scan on the (certification_expiry, employee_id) index, which
+        also provides the order, so only the rows of the page are read. role filters by the
+        employee's role.
+        """
+        return keyset_paginate(cls.expiring_query(expires_from, expires_to, role),
+                               [cls.certification_expiry, cls.employee_id, cls.id],
+                               cursor=cursor, per_page=per_page)
     
     @classmethod
+    @replica_reads()
     def get_popular_courses(cls):
         return db.session.query(cls.course_name, func.count(cls.id)).group_by(cls.course_name).order_by(func.count(cls.id).desc()).limit(5).all()
 
@@ -113,6 +318,13 @@ class Message(db.Model):
     sender = db.relationship('User', foreign_keys=[sender_id], backref=db.backref('sent_messages', lazy='dynamic'))
     recipient = db.relationship('User', foreign_keys=[recipient_id], backref=db.backref('received_messages', lazy='dynamic'))
 
+    __table_args__ = (
+        # Unread count: recipient_id = ? AND read = false
+        db.Index('ix_message_recipient_id_read_timestamp', 'recipient_id', 'read', 'timestamp'),
+        # Inbox: one recipient's messages, newest first
+        db.Index('ix_message_recipient_id_timestamp', 'recipient_id', 'timestamp'),
+    )
+
     def __init__(self, sender_id, recipient_id, subject, body):
         self.sender_id = sender_id
         self.recipient_id = recipient_id
@@ -121,15 +333,205 @@ class Message(db.Model):
 
     def __repr__(self):
         return f'<Message {self.subject}>'
+
+    @classmethod
+    @replica_reads()
+    def get_inbox_page(cls, recipient_id, cursor=None, per_page=25):
+        """
+        Returns one keyset-paginated page of a user's received messages, newest first, with each sender loaded in the same query.
+        """
+        query = cls.query.options(joinedload(cls.sender)).filter(cls.recipient_id == recipient_id)
+        return keyset_paginate(query, [cls.timestamp, cls.id], cursor=cursor, per_page=per_page, descending=True)
+
+    @classmethod
+    @replica_reads()
+    def count_unread(cls, recipient_id):
+        return db.session.query(func.count(cls.id)).filter(cls.recipient_id == recipient_id, cls.read == false()).scalar()
     
 class Document(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
-    s3_key = db.Column(db.String(255), unique=True, nullable=False)
+    # Own S3 object of a document uploaded before content-addressed storage; None for documents with a blob
+    s3_key = db.Column(db.String(255), unique=True, nullable=True)
+    status = db.Column(db.String(10), nullable=False, default=UPLOAD_READY, server_default=UPLOAD_READY)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1', onupdate=NEXT_VERSION)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     employee = db.relationship('Employee', back_populates='documents')
+    blob_id = db.Column(db.Integer, db.ForeignKey('document_blob.id'), index=True)
+    blob = db.relationship('DocumentBlob')
+
+    def __repr__(self):
+        return f'<Document {self.filename}>'
+
+    @property
+    def storage_key(self):
+        """
+        The S3 key holding the document's content: its blob's, or its own for older documents.
+        """
+        return self.blob.s3_key if self.blob_id else self.s3_key
+
+class DocumentBlob(db.Model):
+    """
+    One stored document file, shared by every Document with the same content.
+
+    Each distinct content is stored once, under a key derived from its SHA-256 digest (with a random
+    suffix if an earlier object under that key is still queued for deletion). ref_count
+    is the number of Documents referencing the blob; the S3 object is deleted with the last one.
+    status is the state of the S3 upload and is copied to the referencing Documents when it finishes.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    s3_key = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(10), nullable=False, default=UPLOAD_PENDING)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DocumentBlob {self.sha256}>'
+
+    @staticmethod
+    def key_for(sha256):
+        return f'documents/sha256/{sha256[:2]}/{sha256}'
+
+    @classmethod
+    def acquire(cls, sha256, size):
+        """
+        Adds a reference to the blob with the given digest, creating it if there is none. Runs in
+        the caller's transaction; the caller commits.
+
+        The reference is added with a single UPDATE, so concurrent uploads of the same content never
+        lose a count, and a blob created concurrently by another request is referenced rather than duplicated.
+
+        Returns:
+            tuple: (blob, needs_upload). needs_upload is True if the caller must upload the content:
+            the blob is new, or its previous upload failed.
+        """
+        while True:
+            referenced = cls.query.filter_by(sha256=sha256)\
+                .update({cls.ref_count: cls.ref_count + 1}, synchronize_session=False)
+            if referenced:
+                # Only one of several requests retrying a failed upload gets to upload it again
+                retry = cls.query.filter_by(sha256=sha256, status=UPLOAD_FAILED)\
+                    .update({cls.status: UPLOAD_PENDING}, synchronize_session=False)
+                blob = cls.query.filter_by(sha256=sha256).populate_existing().one()
+                if retry:
+                    # Documents left failed by the earlier attempt get the outcome of this one
+                    Document.query.filter_by(blob_id=blob.id, status=UPLOAD_FAILED)\
+                        .update({Document.status: UPLOAD_PENDING}, synchronize_session=False)
+                return blob, bool(retry)
+            s3_key = cls.key_for(sha256)
+            if db.session.query(S3Deletion.id).filter_by(s3_key=s3_key).first():
+                # The reaper may be deleting an earlier object under this key, so the content gets a new one
+                s3_key = f'{s3_key}-{uuid.uuid4().hex[:12]}'
+            try:
+                with db.session.begin_nested():
+                    blob = cls(sha256=sha256, s3_key=s3_key, size=size, ref_count=1, status=UPLOAD_PENDING)
+                    db.session.add(blob)
+                return blob, True
+            except IntegrityError:
+                # Another request created the blob after the UPDATE above; reference that one instead
+                continue
+
+    @classmethod
+    def release(cls, blob_id):
+        """
+        Drops one reference to a blob. Runs in the caller's transaction.
+
+        Returns:
+            str: The S3 key of the blob if that was its last reference, or None. Its row is then
+            deleted in this transaction, and the caller must delete the object before committing,
+            so that an upload of the same content that starts meanwhile waits for the commit and
+            creates a new blob instead of losing its object.
+        """
+        cls.query.filter_by(id=blob_id).update({cls.ref_count: cls.ref_count - 1}, synchronize_session=False)
+        s3_key = db.session.query(cls.s3_key).filter(cls.id == blob_id, cls.ref_count <= 0).scalar()
+        if s3_key is not None:
+            cls.query.filter_by(id=blob_id).delete(synchronize_session=False)
+        return s3_key
+
+    def copy_status_to_documents(self, status):
+        """
+        Gives every Document still waiting for this blob's upload its outcome. Used as the
+        after_status hook of blob uploads, so it runs in the transaction that records the blob's status.
+        """
+        Document.query.filter_by(blob_id=self.id, status=UPLOAD_PENDING)\
+            .update({Document.status: status}, synchronize_session=False)
+
+class S3Deletion(db.Model):
+    """
+    An S3 object waiting to be deleted by the background reaper in app.s3_reaper.
+
+    Rows are written in the same transaction as the rows that referenced the object, so an
+    object is queued exactly when its owner is really gone. blob_id is set for the object of a
+    DocumentBlob whose last reference went away; the reaper deletes that blob row together with
+    the object, unless a new upload of the same content has referenced the blob again meanwhile.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    # Indexed for DocumentBlob.acquire, which must not give a new blob a key that is still queued here
+    s3_key = db.Column(db.String(255), nullable=False, index=True)
+    blob_id = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<S3Deletion {self.s3_key}>'
+
+class Notification(db.Model):
+    """
+    An event pushed to one user's open pages: a new message, a change of their unread count, or a
+    change to one of their tickets. Written by the commit hooks in app.notifications, in the same
+    transaction as the change, and read by every app process to fan the event out to its streams.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    event = db.Column(db.String(20), nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        # Replay after a reconnect: user_id = ? AND id > ?
+        db.Index('ix_notification_user_id_id', 'user_id', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<Notification {self.event} for {self.user_id}>'
+
+class CertificationSummary(db.Model):
+    """
+    Certification expiry counts per employee role, precomputed by app.certifications.refresh_certification_summary
+    so that compliance overviews do not scan the training records.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    role = db.Column(db.String(50), unique=True, nullable=False)
+    expired_30d = db.Column(db.Integer, nullable=False, default=0)
+    expiring_30d = db.Column(db.Integer, nullable=False, default=0)
+    expiring_60d = db.Column(db.Integer, nullable=False, default=0)
+    expiring_90d = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CertificationSummary {self.role}>'
+
+class DashboardCounter(db.Model):
+    """
+    Rollup counts behind the admin dashboard, kept current by the listeners in app.rollups.
+
+    Each row holds the number of source rows for one (metric, name) pair, e.g. ('ticket_status', 'Open').
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    metric = db.Column(db.String(32), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('metric', 'name', name='uq_dashboard_counter_metric_name'),
+        db.Index('ix_dashboard_counter_metric_count', 'metric', 'count'),
+    )
 
     def __repr__(self):
-        return f'<Document {self.filename}>'
\ No newline at end of file
+        return f'<DashboardCounter {self.metric}:{self.name}={self.count}>'
@@ -0,0 +1,417 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, false, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Employee, Message, Notification, Ticket
+
+logger = logging.getLogger(__name__)
+
+# Ticket columns whose change is pushed to the ticket's owner
+TICKET_FIELDS = ('status', 'is_approved', 'admin_response')
+# Events delivered by one poll of the notification table
+POLL_BATCH_SIZE = 1000
+# Events a stream may have waiting before the oldest are dropped; a reconnect replays them from the table
+MAX_PENDING_EVENTS = 1000
+# How often a process that writes notifications deletes those older than NOTIFICATION_RETENTION
+PRUNE_INTERVAL = 3600
+# Skipped ids the hub keeps reading until their events commit or NOTIFICATION_LATE_SECONDS pass
+MAX_HOLES = 1000
+
+PushEvent = namedtuple('PushEvent', ['id', 'event', 'data', 'created_at'])
+
+_last_pruned = None
+_prune_lock = threading.Lock()
+
+
+def is_cooperative():
+    """
+    Whether the process runs under gevent with threading patched, as the Gunicorn gevent worker
+    does. Only then is a request that waits for events cheap enough to hold open; with real
+    threads every waiting request would take one of the worker's few threads.
+    """
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def push_enabled():
+    """
+    Whether this process serves the event stream: PUSH_EVENTS is on and the worker is cooperative.
+    """
+    return current_app.config['PUSH_EVENTS'] and is_cooperative()
+
+
+# Commit hooks. Mapper events queue what changed on the session; the notifications are written
+# once per flush, on the flush's connection, so they commit or roll back with the change.
+
+def _pending(session):
+    return session.info.setdefault('pending_notifications', {'unread': set(), 'events': [], 'tickets': []})
+
+
+@event.listens_for(Message, 'after_insert')
+def _message_sent(mapper, connection, target):
+    pending = _pending(Session.object_session(target))
+    pending['events'].append((target.recipient_id, 'message', {
+        'id': target.id, 'sender_id': target.sender_id, 'subject': target.subject}))
+    pending['unread'].add(target.recipient_id)
+
+
+@event.listens_for(Message, 'after_update')
+def _message_changed(mapper, connection, target):
+    if inspect(target).attrs.read.history.has_changes():
+        _pending(Session.object_session(target))['unread'].add(target.recipient_id)
+
+
+@event.listens_for(Message, 'after_delete')
+def _message_deleted(mapper, connection, target):
+    _pending(Session.object_session(target))['unread'].add(target.recipient_id)
+
+
+@event.listens_for(Ticket, 'after_update')
+def _ticket_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in TICKET_FIELDS):
+        _pending(Session.object_session(target))['tickets'].append((target.employee_id, ticket_event_data(target)))
+
+
+def ticket_event_data(ticket):
+    """
+    Returns the payload of a 'ticket' event for a ticket, or for a row with the same attributes.
+    """
+    return {'id': ticket.id, 'title': ticket.title, 'status': ticket.status, 'is_approved': ticket.is_approved}
+
+
+def queue_ticket_events(session, tickets):
+    """
+    Queues 'ticket' events for (employee_id, data) pairs, for bulk statements that bypass the ORM events.
+    They are written with the session's next flush, or by write_queued_notifications().
+    """
+    _pending(session)['tickets'].extend(tickets)
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_after_flush(session, flush_context):
+    write_queued_notifications(session)
+
+
+def write_queued_notifications(session):
+    """
+    Writes the notifications queued on a session, on its connection. Flushes do this themselves;
+    code that queues events after its last flush calls it before committing. With PUSH_EVENTS off
+    nothing would read them, so they are dropped.
+    """
+    pending = session.info.pop('pending_notifications', None)
+    if not pending or not current_app.config['PUSH_EVENTS']:
+        return
+    connection = session.connection()
+    rows = [(user_id, name, data) for user_id, name, data in pending['events']]
+
+    if pending['tickets']:
+        employee_ids = {employee_id for employee_id, _ in pending['tickets']}
+        owners = dict(connection.execute(
+            select(Employee.id, Employee.user_id).where(Employee.id.in_(employee_ids))).all())
+        rows.extend((owners[employee_id], 'ticket', data)
+                    for employee_id, data in pending['tickets'] if employee_id in owners)
+
+    if pending['unread']:
+        counts = dict(connection.execute(
+            select(Message.recipient_id, func.count(Message.id))
+            .where(Message.recipient_id.in_(pending['unread']), Message.read == false())
+            .group_by(Message.recipient_id)).all())
+        rows.extend((user_id, 'unread', {'unread': counts.get(user_id, 0)}) for user_id in pending['unread'])
+
+    if rows:
+        now = datetime.utcnow()
+        connection.execute(Notification.__table__.insert(), [
+            {'user_id': user_id, 'event': name, 'data': json.dumps(data), 'created_at': now}
+            for user_id, name, data in rows])
+        session.info['notifications_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_after_commit(session):
+    if session.info.pop('notifications_written', False):
+        # Streams in this process hear of the commit at once; other processes on their next poll
+        _hub.wake()
+        _prune_if_due()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('pending_notifications', None)
+    session.info.pop('notifications_written', None)
+
+
+# Reading
+#
+# Notification ids are assigned when a row is inserted, but the row only becomes visible when its
+# transaction commits, so events can become visible out of id order. Readers therefore do not
+# treat the highest id they have seen as a high-water mark. A client's position is an
+# EventCursor: every event up to floor has been delivered or given up on, and seen lists the ids
+# above floor that were delivered. The floor moves past an event once it is NOTIFICATION_LATE_SECONDS
+# old, so a lower id that is still invisible by then, i.e. a transaction that took longer than that
+# to commit, is given up on.
+
+EventCursor = namedtuple('EventCursor', ['floor', 'seen'])
+
+
+def _to_event(row):
+    return PushEvent(row.id, row.event, json.loads(row.data), row.created_at)
+
+
+def _late_cutoff(late_seconds=None):
+    if late_seconds is None:
+        late_seconds = current_app.config['NOTIFICATION_LATE_SECONDS']
+    return datetime.utcnow() - timedelta(seconds=late_seconds)
+
+
+def parse_cursor(value):
+    """
+    Parses a cursor sent back by a client, '<floor>' or '<floor>:<id>,<id>,...'. Returns None if
+    it is missing or malformed.
+    """
+    try:
+        floor, _, seen = value.partition(':')
+        return EventCursor(int(floor), frozenset(int(event_id) for event_id in seen.split(',') if event_id))
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_cursor(cursor):
+    if not cursor.seen:
+        return str(cursor.floor)
+    return f"{cursor.floor}:{','.join(str(event_id) for event_id in sorted(cursor.seen))}"
+
+
+def is_new(cursor, push_event):
+    """
+    Whether an event has not been delivered to the client at cursor yet.
+    """
+    return push_event.id > cursor.floor and push_event.id not in cursor.seen
+
+
+def advance_cursor(cursor, events, late_seconds=None):
+    """
+    Returns the cursor after the given events, which have been delivered or were already seen.
+    late_seconds defaults to NOTIFICATION_LATE_SECONDS; pass it where there is no app context.
+    """
+    cutoff = _late_cutoff(late_seconds)
+    floor = max([cursor.floor] + [e.id for e in events if e.created_at < cutoff])
+    seen = frozenset(event_id for event_id in cursor.seen.union(e.id for e in events) if event_id > floor)
+    return EventCursor(floor, seen)
+
+
+def get_events(user_id, cursor, limit=POLL_BATCH_SIZE):
+    """
+    Returns (events, cursor): a user's events that are new to a client at cursor, oldest first,
+    and the cursor to continue from.
+    """
+    rows = db.session.query(Notification.id, Notification.event, Notification.data, Notification.created_at)\
+        .filter(Notification.user_id == user_id, Notification.id > cursor.floor)\
+        .order_by(Notification.id).limit(limit + len(cursor.seen))
+    events = [_to_event(row) for row in rows]
+    return [e for e in events if is_new(cursor, e)], advance_cursor(cursor, events)
+
+
+def get_start_cursor(user_id):
+    """
+    Returns the cursor of a client that has seen every event committed so far, e.g. a page just rendered.
+    """
+    floor = db.session.query(func.max(Notification.id))\
+        .filter(Notification.user_id == user_id, Notification.created_at < _late_cutoff()).scalar() or 0
+    seen = db.session.query(Notification.id).filter(Notification.user_id == user_id, Notification.id > floor)
+    return EventCursor(floor, frozenset(event_id for event_id, in seen))
+
+
+def prune_notifications():
+    """
+    Deletes the notifications older than NOTIFICATION_RETENTION seconds and returns how many there were.
+    It runs in its own transaction, so it can be called while a session is committing.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['NOTIFICATION_RETENTION'])
+    with db.engine.begin() as connection:
+        return connection.execute(Notification.__table__.delete().where(Notification.created_at < cutoff)).rowcount
+
+
+def _prune_if_due():
+    # Every process that writes notifications prunes them, whether or not it has subscribers, so
+    # the table stays within NOTIFICATION_RETENTION however the streams are spread over processes.
+    global _last_pruned
+    if _last_pruned is not None and time.monotonic() - _last_pruned < PRUNE_INTERVAL:
+        return
+    if not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        _last_pruned = time.monotonic()
+        prune_notifications()
+    except Exception:
+        logger.exception("Could not prune notifications")
+    finally:
+        _prune_lock.release()
+
+
+class Subscription:
+    """
+    The events for one open stream or long poll, filled by the hub and drained by the request.
+    The hub may deliver an event the request has already read from the table, so the request
+    filters what it gets with its cursor.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.events = deque(maxlen=MAX_PENDING_EVENTS)
+        self.ready = threading.Event()
+
+    def put(self, push_event):
+        self.events.append(push_event)
+        self.ready.set()
+
+    def wait(self, timeout):
+        """
+        Returns the events that arrived, waiting up to timeout seconds for the first one.
+        """
+        self.ready.wait(timeout)
+        # Cleared before draining, so an event added while draining sets it again
+        self.ready.clear()
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+
+class NotificationHub:
+    """
+    Fans notifications out to the subscriptions of this process.
+
+    One background thread per process reads new notifications from the table, in one query for
+    all of the process's streams, every NOTIFICATION_POLL_INTERVAL seconds or as soon as this
+    process commits one. It runs only while the process has subscribers.
+
+    The ids it skips because their rows were not visible yet are kept as holes and read again on
+    each poll for NOTIFICATION_LATE_SECONDS, so an event that commits after one with a higher id is
+    still delivered.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.last_id = 0
+        # skipped id -> monotonic time it was skipped
+        self.holes = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self.lock:
+            if self.pid != os.getpid():
+                # A forked worker inherits the parent's state but not its thread
+                self.subscribers.clear()
+                self.wakeup.clear()
+                self.thread = None
+                self.pid = os.getpid()
+            self.subscribers[user_id].add(subscription)
+            if self.thread is None:
+                # Starts behind the events that may still be joined by late ones; the first poll
+                # fans those out again, and the requests drop the ones they have already sent
+                self.last_id = db.session.query(func.max(Notification.id))\
+                    .filter(Notification.created_at < _late_cutoff()).scalar() or 0
+                self.holes = {}
+                self.thread = threading.Thread(target=self._run, args=(current_app._get_current_object(),),
+                                               name='notification-hub', daemon=True)
+                self.thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.user_id]
+
+    def wake(self):
+        self.wakeup.set()
+
+    def _run(self, app):
+        with app.app_context():
+            interval = app.config['NOTIFICATION_POLL_INTERVAL']
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        self.thread = None
+                        return
+                self.wakeup.wait(interval)
+                self.wakeup.clear()
+                try:
+                    self._deliver(app.config['NOTIFICATION_LATE_SECONDS'])
+                except Exception:
+                    logger.exception("Could not read notifications")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def _deliver(self, late_seconds):
+        columns = (Notification.id, Notification.user_id, Notification.event, Notification.data,
+                   Notification.created_at)
+        late = []
+        if self.holes:
+            late = db.session.query(*columns).filter(Notification.id.in_(list(self.holes))).all()
+        rows = db.session.query(*columns).filter(Notification.id > self.last_id)\
+            .order_by(Notification.id).limit(POLL_BATCH_SIZE).all()
+
+        now = time.monotonic()
+        for row in late:
+            del self.holes[row.id]
+        expected = self.last_id + 1
+        for row in rows:
+            # A large jump, e.g. after an auto-increment gap, is not tracked id by id
+            if row.id - expected <= MAX_HOLES - len(self.holes):
+                self.holes.update((missing, now) for missing in range(expected, row.id))
+            expected = row.id + 1
+        if rows:
+            self.last_id = rows[-1].id
+        self.holes = {hole: skipped for hole, skipped in self.holes.items() if now - skipped < late_seconds}
+        if len(rows) == POLL_BATCH_SIZE:
+            # More are waiting; read them without sleeping
+            self.wakeup.set()
+        with self.lock:
+            for row in late + rows:
+                for subscription in self.subscribers.get(row.user_id, ()):
+                    subscription.put(_to_event(row))
+
+
+_hub = NotificationHub()
+
+
+def subscribe(user_id):
+    """
+    Registers a subscription for a user's events; pass it to unsubscribe() when the request ends.
+    """
+    return _hub.subscribe(user_id)
+
+
+def unsubscribe(subscription):
+    _hub.unsubscribe(subscription)
+
+
+def format_sse(events, cursor):
+    """
+    Formats events as Server-Sent Events messages, followed by an id-only message carrying the
+    cursor, which the browser sends back as Last-Event-ID when it reconnects.
+    """
+    messages = [f'event: {e.event}\ndata: {json.dumps(e.data)}\n\n' for e in events]
+    messages.append(f'id: {format_cursor(cursor)}\n\n')
+    return ''.join(messages)
@@ -0,0 +1,99 @@
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, literal, select
+
+from app import db
+from app.identity_cache import invalidate_user_identity
+from app.images import picture_variant_keys
+from app.models import Document, DocumentBlob, Employee, S3Deletion, Ticket, TrainingRecord
+from app.rollups import apply_counter_deltas
+from app.s3_reaper import queue_s3_deletions, wake_s3_reaper
+from app.search import queue_search_deletes
+
+
+def delete_employees(employee_ids):
+    """
+    Deletes employees together with their tickets, training records and documents.
+
+    Everything is removed in one transaction of set-based statements, OFFBOARD_CHUNK_SIZE employees
+    per statement, so removing a whole team costs a handful of queries rather than several per row.
+    The S3 objects that lose their owner (pictures, picture variants, and documents whose content
+    nothing else references) are queued in the same transaction and deleted by the background reaper.
+
+    The statements bypass the ORM events, so the dashboard counters, the search index and the
+    identity cache are updated here.
+
+    Returns:
+        int: The number of employees deleted.
+    """
+    ids = sorted(set(employee_ids))
+    chunk_size = current_app.config['OFFBOARD_CHUNK_SIZE']
+    deltas = {'employee_role': Counter(), 'ticket_status': Counter(), 'course_name': Counter()}
+    user_ids = set()
+    s3_keys = []
+    deleted = 0
+    try:
+        for start in range(0, len(ids), chunk_size):
+            deleted += _delete_chunk(ids[start:start + chunk_size], deltas, user_ids, s3_keys)
+        connection = db.session.connection()
+        for metric, counts in deltas.items():
+            apply_counter_deltas(connection, metric, {name: -count for name, count in counts.items()})
+        queue_s3_deletions(s3_keys)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    invalidate_user_identity(*user_ids)
+    wake_s3_reaper()
+    return deleted
+
+
+def _delete_chunk(employee_ids, deltas, user_ids, s3_keys):
+    # Everything the counter deltas are read from is locked until the commit. Locking the employees
+    # also holds off new tickets, records and documents for them, whose foreign key checks wait on
+    # these rows, and the ticket and record rows are locked so that a status or course change cannot
+    # slip in between the count and the delete.
+    employees = db.session.query(Employee.id, Employee.user_id, Employee.role, Employee.picture_url,
+                                 Employee.picture_variants).filter(Employee.id.in_(employee_ids))\
+        .with_for_update().all()
+    if not employees:
+        return 0
+    employee_ids = [employee.id for employee in employees]
+    for employee in employees:
+        if employee.user_id is not None:
+            user_ids.add(employee.user_id)
+        deltas['employee_role'][employee.role] += 1
+        if employee.picture_url:
+            picture_key = employee.picture_url.split('/')[-1]
+            s3_keys.append(picture_key)
+            if employee.picture_variants:
+                s3_keys.extend(picture_variant_keys(picture_key))
+
+    # Counted here rather than with GROUP BY, which cannot be combined with FOR UPDATE
+    deltas['ticket_status'].update(status for status, in db.session.query(Ticket.status)
+                                   .filter(Ticket.employee_id.in_(employee_ids)).with_for_update())
+    deltas['course_name'].update(course_name for course_name, in db.session.query(TrainingRecord.course_name)
+                                 .filter(TrainingRecord.employee_id.in_(employee_ids)).with_for_update())
+    queue_search_deletes(db.session, 'ticket', db.session.query(Ticket.id).filter(Ticket.employee_id.in_(employee_ids)))
+    queue_search_deletes(db.session, 'employee', [(employee_id,) for employee_id in employee_ids])
+
+    # Documents stored before content-addressed storage own their object
+    s3_keys.extend(key for key, in db.session.query(Document.s3_key)
+                   .filter(Document.employee_id.in_(employee_ids), Document.s3_key.isnot(None)))
+    # Shared blobs lose one reference per deleted document, and those left without any are queued with their row
+    referenced = select(Document.blob_id).where(Document.employee_id.in_(employee_ids), Document.blob_id.isnot(None))
+    references = select(func.count(Document.id))\
+        .where(Document.blob_id == DocumentBlob.id, Document.employee_id.in_(employee_ids)).scalar_subquery()
+    DocumentBlob.query.filter(DocumentBlob.id.in_(referenced))\
+        .update({DocumentBlob.ref_count: DocumentBlob.ref_count - references}, synchronize_session=False)
+    orphaned = select(DocumentBlob.s3_key, DocumentBlob.id, literal(0), literal(datetime.utcnow()))\
+        .where(DocumentBlob.id.in_(referenced), DocumentBlob.ref_count <= 0)
+    db.session.execute(S3Deletion.__table__.insert().from_select(
+        ['s3_key', 'blob_id', 'attempts', 'next_attempt_at'], orphaned))
+
+    for model in (Document, Ticket, TrainingRecord):
+        model.query.filter(model.employee_id.in_(employee_ids)).delete(synchronize_session=False)
+    Employee.query.filter(Employee.id.in_(employee_ids)).delete(synchronize_session=False)
+    return len(employee_ids)
@@ -0,0 +1,113 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+# A page of results plus the opaque cursor for the page that follows it (None on the last page).
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+
+def _dump_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _load_value(column, value):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    """
+    Encodes the sort-key values of the last row on a page into an opaque, URL-safe cursor.
+    """
+    payload = json.dumps([_dump_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    """
+    Decodes a cursor produced by encode_cursor back into values typed for the given columns.
+
+    Returns None if the cursor is missing or malformed, so a bad link simply restarts at the first page.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        return [_load_value(column, value) for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        return None
+
+
+def _after(columns, values, descending):
+    # Expanded form of (a, b) > (x, y): a > x OR (a = x AND b > y).
+    # MySQL uses the index for this shape, which it does not reliably do for row constructors.
+    clauses = []
+    for i, column in enumerate(columns):
+        step = column < values[i] if descending else column > values[i]
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, step) if equal else step)
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, cursor=None, per_page=20, descending=False):
+    """
+    Returns one Page of a query using keyset (seek) pagination.
+
+    The query is ordered by the given columns, which must end in a unique column such as the
+    primary key, and only rows after the cursor are read. Unlike OFFSET, the cost of fetching
+    a page does not grow with how deep into the result set it is.
+
+    Args:
+        query: A SQLAlchemy query, already filtered.
+        columns (list): The sort-key columns, most significant first.
+        cursor (str): The cursor from the previous page, or None for the first page.
+        per_page (int): The maximum number of rows to return.
+        descending (bool): Whether to walk the keys newest/highest first.
+
+    Returns:
+        Page: The rows and the cursor for the next page.
+    """
+    values = decode_cursor(cursor, columns)
+    if values is not None:
+        query = query.filter(_after(columns, values, descending))
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([_row_value(last, column) for column in columns])
+    return Page(rows, next_cursor)
+
+
+def _row_value(row, column):
+    # Rows are either a mapped entity or a Row from a multi-entity query whose first element is the entity.
+    if hasattr(row, column.key):
+        return getattr(row, column.key)
+    return getattr(row[0], column.key)
+
+
+def get_per_page(request_args, default, maximum):
+    """
+    Reads an optional per_page query argument, clamped to [1, maximum].
+    """
+    per_page = request_args.get('per_page', default, type=int)
+    return max(1, min(per_page, maximum))
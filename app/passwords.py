@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+# keyed digest of (username, password, stored hash) -> monotonic expiry time
+_failed_attempts = OrderedDict()
+_failed_attempts_lock = threading.Lock()
+# Random per process, so the cache keys cannot be matched against precomputed password digests
+_failed_attempts_key = os.urandom(32)
+
+
+class PasswordCheckBusy(Exception):
+    """
+    Raised when every password-check worker is busy and the queue is full, or a check timed out.
+    """
+
+
+def _get_executor():
+    global _executor, _executor_pid, _slots
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                from app.notifications import is_cooperative
+
+                workers = current_app.config['PASSWORD_CHECK_WORKERS']
+                if is_cooperative():
+                    # Under gevent a patched "thread" is a greenlet on the worker's one OS thread, and a hash
+                    # would stall every other request of the worker; gevent's executor runs it on real threads.
+                    from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+                    _executor = GeventThreadPoolExecutor(max_workers=workers)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-check')
+                _slots = threading.BoundedSemaphore(workers + current_app.config['PASSWORD_CHECK_QUEUE_SIZE'])
+                _executor_pid = pid
+    return _executor, _slots
+
+
+def _run_bounded(fn, *args):
+    # Key stretching is CPU-bound, and hashlib releases the GIL while it runs. Capping the number of
+    # concurrent hashes at the worker count keeps a burst of logins from taking every core away from
+    # other pages, and the queue limit turns an overload into a fast rejection instead of a pile-up.
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise PasswordCheckBusy()
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=current_app.config['PASSWORD_CHECK_TIMEOUT'])
+    except FutureTimeoutError:
+        raise PasswordCheckBusy()
+
+
+def hash_password(password):
+    """
+    Hashes a password with the configured PASSWORD_HASH_METHOD, e.g. 'pbkdf2:sha256:260000'.
+    """
+    return generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def needs_rehash(password_hash):
+    """
+    Returns True if a stored hash was made with other parameters than PASSWORD_HASH_METHOD.
+    """
+    return password_hash.split('$', 1)[0] != current_app.config['PASSWORD_HASH_METHOD']
+
+
+def _attempt_key(username, password, password_hash):
+    message = '\0'.join((username, password, password_hash)).encode('utf-8')
+    return hmac.new(_failed_attempts_key, message, hashlib.sha256).digest()
+
+
+def verify_password(user, password):
+    """
+    Checks a login attempt's password against a user's stored hash on the bounded executor.
+
+    A username/password pair that just failed is rejected from a short-lived cache without
+    hashing again. The stored hash is part of the cache key, so a password change takes effect at once.
+
+    Returns:
+        bool: True if the password is correct.
+
+    Raises:
+        PasswordCheckBusy: If the executor queue is full or the check timed out.
+    """
+    if not user.password_hash:
+        return False
+    key = _attempt_key(user.username, password, user.password_hash)
+    now = time.monotonic()
+    with _failed_attempts_lock:
+        expires = _failed_attempts.get(key)
+        if expires is not None:
+            if expires > now:
+                return False
+            del _failed_attempts[key]
+
+    if _run_bounded(check_password_hash, user.password_hash, password):
+        return True
+
+    with _failed_attempts_lock:
+        _failed_attempts[key] = now + current_app.config['FAILED_LOGIN_CACHE_TTL']
+        _failed_attempts.move_to_end(key)
+        while len(_failed_attempts) > current_app.config['FAILED_LOGIN_CACHE_SIZE']:
+            _failed_attempts.popitem(last=False)
+    return False
+
+
+def upgrade_password_hash(user, password):
+    """
+    Rehashes a just-verified password if the stored hash uses outdated parameters.
+
+    Returns:
+        bool: True if user.password_hash was replaced and needs to be committed.
+    """
+    if not needs_rehash(user.password_hash):
+        return False
+    # The method is passed in because executor threads have no application context.
+    user.password_hash = _run_bounded(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+    return True
@@ -0,0 +1,93 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import has_request_context, session as flask_session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.sql.selectable import Select
+
+# Name of the optional SQLALCHEMY_BINDS entry that points at a read replica
+REPLICA_BIND = 'replica'
+
+# Key in the Flask session cookie: until this Unix time the user's reads stay on the primary
+_PRIMARY_UNTIL = '_db_primary_until'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Lets SELECT statements inside the block go to the read replica, if one is configured.
+
+    Also usable as a decorator, @replica_reads(), on read-only views and query helpers. Writes,
+    locking reads, reads in a session that has written, and reads by a user within
+    REPLICA_READ_YOUR_WRITES_SECONDS of their own last commit still go to the primary.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class RoutingSession(SignallingSession):
+    """
+    A Flask-SQLAlchemy session that sends eligible reads to the 'replica' bind.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._replica_eligible(clause):
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause, **kwargs)
+
+    def _replica_eligible(self, clause):
+        if not _replica_reads.get() or REPLICA_BIND not in (self.app.config['SQLALCHEMY_BINDS'] or {}):
+            return False
+        if self._flushing or self.info.get('wrote') or not isinstance(clause, Select):
+            return False
+        if clause._for_update_arg is not None:
+            return False
+        if has_request_context() and flask_session.get(_PRIMARY_UNTIL, 0) > time.time():
+            return False
+        return True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy whose sessions can route reads to a read replica; see replica_reads().
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    if session.new or session.dirty or session.deleted:
+        session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _bulk_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    # The session cookie carries the window to the user's next requests, whichever worker serves them
+    if session.info.pop('wrote', False) and has_request_context():
+        window = session.app.config['REPLICA_READ_YOUR_WRITES_SECONDS']
+        if window and REPLICA_BIND in (session.app.config['SQLALCHEMY_BINDS'] or {}):
+            flask_session[_PRIMARY_UNTIL] = time.time() + window
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
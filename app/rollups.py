@@ -0,0 +1,177 @@
+import hashlib
+import json
+from collections import Counter
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import DashboardCounter, Employee, Ticket, TrainingRecord
+
+# metric name -> (model, grouped attribute)
+METRICS = {
+    'employee_role': (Employee, 'role'),
+    'ticket_status': (Ticket, 'status'),
+    'course_name': (TrainingRecord, 'course_name'),
+}
+
+
+def _upsert_statement(connection, metric, name, delta):
+    """
+    Builds an INSERT ... ON DUPLICATE KEY / ON CONFLICT statement that adds delta to one counter row.
+    Returns None for dialects without an upsert, in which case the caller falls back to UPDATE-then-INSERT.
+    """
+    table = DashboardCounter.__table__
+    values = dict(metric=metric, name=name, count=delta)
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        return mysql.insert(table).values(**values).on_duplicate_key_update(count=table.c.count + delta)
+    if dialect == 'sqlite':
+        return sqlite.insert(table).values(**values).on_conflict_do_update(
+            index_elements=['metric', 'name'], set_={'count': table.c.count + delta})
+    return None
+
+
+def apply_counter_deltas(connection, metric, deltas):
+    """
+    Adds the given per-name deltas to a metric's counters.
+
+    Runs on the caller's connection so the counters commit or roll back together with the change
+    that caused them. Bulk statements that bypass the ORM (bulk inserts, query.update/delete) must
+    call this themselves with the deltas they produced.
+
+    Args:
+        connection: The connection of the current flush or transaction.
+        metric (str): One of the keys of METRICS.
+        deltas (dict): Maps a grouped value (e.g. a role name) to the change in its count.
+    """
+    for name, delta in deltas.items():
+        if name is None or not delta:
+            continue
+        _add(connection, metric, name, delta)
+
+
+def _add(connection, metric, name, delta):
+    statement = _upsert_statement(connection, metric, name, delta)
+    if statement is not None:
+        connection.execute(statement)
+        return
+    table = DashboardCounter.__table__
+    result = connection.execute(
+        table.update()
+        .where(table.c.metric == metric, table.c.name == name)
+        .values(count=table.c.count + delta))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(metric=metric, name=name, count=delta))
+
+
+def _queue_deltas(target, metric, deltas):
+    # Deltas are summed per flush and written by _apply_queued_deltas, so a flush of many rows
+    # costs one upsert per changed name rather than one per row.
+    session = Session.object_session(target)
+    queued = session.info.setdefault('counter_deltas', {}).setdefault(metric, Counter())
+    queued.update(deltas)
+
+
+def _register(metric, model, attribute):
+    @event.listens_for(model, 'after_insert')
+    def after_insert(mapper, connection, target):
+        _queue_deltas(target, metric, {getattr(target, attribute): 1})
+
+    @event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        _queue_deltas(target, metric, {getattr(target, attribute): -1})
+
+    @event.listens_for(model, 'after_update')
+    def after_update(mapper, connection, target):
+        history = inspect(target).attrs[attribute].history
+        if not history.has_changes():
+            return
+        deltas = Counter()
+        for old in history.deleted:
+            deltas[old] -= 1
+        for new in history.added:
+            deltas[new] += 1
+        _queue_deltas(target, metric, deltas)
+
+    # active_history makes the ORM load the old value before it is overwritten, so that
+    # after_update can decrement the right counter even when the attribute was expired.
+    @event.listens_for(getattr(model, attribute), 'set', active_history=True)
+    def on_set(target, value, oldvalue, initiator):
+        pass
+
+
+for _metric, (_model, _attribute) in METRICS.items():
+    _register(_metric, _model, _attribute)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_queued_deltas(session, flush_context):
+    queued = session.info.pop('counter_deltas', None)
+    if queued:
+        connection = session.connection()
+        for metric, deltas in queued.items():
+            apply_counter_deltas(connection, metric, deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_queued_deltas(session):
+    session.info.pop('counter_deltas', None)
+
+
+def get_counts(metric, limit=None):
+    """
+    Returns (name, count) pairs for a metric, largest first, skipping names whose count dropped to zero.
+    """
+    query = db.session.query(DashboardCounter.name, DashboardCounter.count)\
+        .filter(DashboardCounter.metric == metric, DashboardCounter.count > 0)\
+        .order_by(DashboardCounter.count.desc(), DashboardCounter.name)
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def get_dashboard_data():
+    """
+    Returns the dashboard chart data and an ETag for it.
+
+    The ETag is a digest of the data itself, so it changes exactly when a displayed count does,
+    without a shared version row that every write transaction would have to lock and update.
+    """
+    data = {
+        'employee_roles': dict(get_counts('employee_role')),
+        'ticket_status': dict(get_counts('ticket_status')),
+        'popular_courses': dict(get_counts('course_name', limit=5)),
+    }
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    return data, f'dashboard-{digest}'
+
+
+def rebuild_dashboard_counters():
+    """
+    Recomputes every counter from the source tables in one transaction.
+
+    Used to populate the counters on an existing database and to repair them after writes that
+    bypassed the listeners.
+    """
+    table = DashboardCounter.__table__
+    db.session.execute(table.delete())
+    rows = []
+    for metric, (model, attribute) in METRICS.items():
+        column = getattr(model, attribute)
+        grouped = db.session.execute(
+            select(column, func.count(model.id)).where(column.isnot(None)).group_by(column))
+        rows.extend(dict(metric=metric, name=name, count=count) for name, count in grouped)
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def ensure_dashboard_counters():
+    """
+    Builds the counters if there are none, e.g. right after the table is created.
+    """
+    if not db.session.query(DashboardCounter.id).first():
+        rebuild_dashboard_counters()
@@ -1,16 +1,33 @@
+import hashlib
 import os
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, current_app, Response, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from app import db
-from app.models import User, Employee, TrainingRecord, Message, Document
-from app.forms import LoginForm, RegistrationForm, EmployeeForm, TrainingRecordForm, MessageForm, DocumentUploadForm
+from app.models import User, Employee, TrainingRecord, Message, Document, DocumentBlob, UPLOAD_PENDING, UPLOAD_READY
+from app.forms import LoginForm, RegistrationForm, EmployeeForm, TrainingRecordForm, MessageForm, DocumentUploadForm, EmployeeImportForm, UserReviewForm, EmployeeBulkDeleteForm
 from app.models import Ticket
-from app.forms import TicketForm, TicketResponseForm
-from app.s3_utils import upload_file_to_s3, delete_file_from_s3, generate_presigned_url
+from app.forms import TicketForm, TicketResponseForm, TicketTriageForm
+from app.s3_utils import delete_file_from_s3, generate_presigned_url, get_s3_object_url
+from app.uploads import UploadQueueFull, UploadSlot, discard_spooled_upload, get_upload_progress, spool_upload
+from app.images import picture_variant_keys, process_employee_picture
+from app.passwords import PasswordCheckBusy, upgrade_password_hash, verify_password
+from app.pagination import get_per_page
+from app.conditional import collection_version, conditional_page, page_validators, row_version
+from app.importer import detect_format, import_employees as run_employee_import
+from app.rollups import get_dashboard_data
+from app.search import SEARCH_SOURCES, search as run_search
+from app.certifications import expiry_window, get_certification_summary, iter_expiring_csv
+from app.replica import replica_reads
+from app.offboarding import delete_employees
+from app.triage import triage_tickets
+from app.notifications import (advance_cursor, format_cursor, format_sse, get_events, get_start_cursor,
+                               is_new, parse_cursor, push_enabled, subscribe, unsubscribe)
+import time
 import uuid
-import io
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 
 # Define the main blueprint for the application
 main = Blueprint('main', __name__)
@@ -44,12 +61,23 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and verify_password(user, form.password.data)
+        except PasswordCheckBusy:
+            flash('Too many sign-in attempts right now. Please try again in a moment.')
+            return render_template('login.html', title='Sign In', form=form), 503
+        if not valid:
             flash('Invalid username or password')
             return redirect(url_for('main.login'))
         if not user.is_approved:
             flash('Your account has not been approved yet. Please wait for admin approval.')
             return redirect(url_for('main.login'))
+        try:
+            if upgrade_password_hash(user, form.password.data):
+                db.session.commit()
+        except PasswordCheckBusy:
+            # The old hash still works; it is upgraded on a later login.
+            pass
         login_user(user, remember=form.remember_me.data)
         return redirect(url_for('main.index'))
     return render_template('login.html', title='Sign In', form=form)
@@ -103,22 +131,34 @@ def register():
 
 @main.route('/employee_list')
 @login_required
+@replica_reads()
 def employee_list():
     """
     Defines the route for the employee list page of the application.
 
-    This function requires the user to be logged in and retrieves a list of all employees 
-    from the database. It then renders the 'employee_list.html' template, passing the 
-    list of employees as a parameter.
+    This function requires the user to be logged in and retrieves one page of employees 
+    from the database, ordered by name. The page is selected with an opaque 'cursor' query 
+    argument, and can be filtered by 'role' and by a 'name' prefix. It then renders the 
+    'employee_list.html' template, passing the page of employees and the cursor for the 
+    next page as parameters.
 
     Returns:
-        A rendered 'employee_list.html' template with the list of employees.
+        A rendered 'employee_list.html' template with one page of employees.
     """
-    employees = Employee.query.all()
-    return render_template('employee_list.html', employees=employees)
+    role = request.args.get('role', '').strip()
+    name_prefix = request.args.get('name', '').strip()
+    per_page = get_per_page(request.args, current_app.config['EMPLOYEES_PER_PAGE'], current_app.config['MAX_PER_PAGE'])
+    page = Employee.get_directory_page(role=role, name_prefix=name_prefix,
+                                       cursor=request.args.get('cursor'), per_page=per_page)
+    bulk_delete_form = None
+    if current_user.is_admin and role:
+        bulk_delete_form = EmployeeBulkDeleteForm(role=role)
+    return render_template('employee_list.html', employees=page.items, next_cursor=page.next_cursor,
+                           role=role, name_prefix=name_prefix, per_page=per_page, bulk_delete_form=bulk_delete_form)
 
 @main.route('/employee/<int:id>')
 @login_required
+@replica_reads()
 def employee_profile(id):
     """
     Defines the route for viewing an employee's profile.
@@ -130,11 +170,18 @@ def employee_profile(id):
     Parameters:
         id (int): The id of the employee.
 
+    The page carries an ETag and Last-Modified derived from the employee's version, and a repeat
+    visit to an unchanged profile gets an empty 304 without the employee being loaded.
+
     Returns:
-        A rendered 'employee_profile.html' template with the employee object.
+        A rendered 'employee_profile.html' template with the employee object, or a 304 response.
     """
-    employee = Employee.query.get_or_404(id)
-    return render_template('employee_profile.html', employee=employee)
+    version = row_version(Employee, id)
+    if version is None:
+        abort(404)
+    etag, last_modified = page_validators('employee_profile', rows=[version])
+    return conditional_page(etag, last_modified, lambda: render_template(
+        'employee_profile.html', employee=Employee.query.get_or_404(id)))
 
 @main.route('/add_employee', methods=['GET', 'POST'])
 @login_required
@@ -142,7 +189,7 @@ def add_employee():
     """
     Defines the route for adding a new employee to the system.
 
-    This function handles both GET and POST requests. When a GET request is made, it renders the 'add_employee.html' template with an empty EmployeeForm. When a POST request is made, it validates the form data. If the form is valid, it attempts to upload the provided picture to S3. If the upload is successful, it creates a new Employee object with the provided data and adds it to the database. If any errors occur during this process, it flashes an error message and re-renders the 'add_employee.html' template with the form data.
+    This function handles both GET and POST requests. When a GET request is made, it renders the 'add_employee.html' template with an empty EmployeeForm. When a POST request is made, it validates the form data. If the form is valid, it creates a new Employee object with the provided data and adds it to the database. A provided picture is spooled to local disk and uploaded to S3 by a background worker, which also stores resized variants of it for the directory and profile pages, with the employee's picture_status pending until the upload finishes. If any errors occur during this process, or the upload queue is full, it flashes an error message and re-renders the 'add_employee.html' template with the form data.
 
     Parameters:
         None
@@ -152,41 +199,92 @@ def add_employee():
     """
     form = EmployeeForm()
     if form.validate_on_submit():
-        picture_url = None
-        if form.picture.data:
-            try:
-                file_stream = io.BytesIO(form.picture.data.read())
-                filename = f"{uuid.uuid4()}.{form.picture.data.filename.split('.')[-1]}"
-                picture_url = upload_file_to_s3(file_stream, filename)
-                if not picture_url:
-                    flash('Error uploading image to S3', 'error')
-                    return render_template('add_employee.html', form=form)
-            except Exception as e:
-                flash(f'Error processing image: {str(e)}', 'error')
-                return render_template('add_employee.html', form=form)
-
-        employee = Employee(
-            full_name=form.full_name.data,
-            age=form.age.data,
-            phone_number=form.phone_number.data,
-            email=form.email.data,
-            role=form.role.data,
-            picture_url=picture_url,
-            user_id=current_user.id
-        )
-        db.session.add(employee)
-        db.session.commit()
+        try:
+            # Only a picture takes a place in the upload queue, so a full queue never blocks adding an employee without one
+            with (UploadSlot() if form.picture.data else nullcontext()) as slot:
+                picture_url = None
+                spooled_path = None
+                if form.picture.data:
+                    try:
+                        spooled_path = spool_upload(form.picture.data)
+                        filename = f"{uuid.uuid4()}.{form.picture.data.filename.split('.')[-1]}"
+                        picture_url = get_s3_object_url(filename)
+                    except Exception as e:
+                        flash(f'Error processing image: {str(e)}', 'error')
+                        return render_template('add_employee.html', form=form)
+
+                employee = Employee(
+                    full_name=form.full_name.data,
+                    age=form.age.data,
+                    phone_number=form.phone_number.data,
+                    email=form.email.data,
+                    role=form.role.data,
+                    picture_url=picture_url,
+                    picture_status=UPLOAD_PENDING if spooled_path else UPLOAD_READY,
+                    user_id=current_user.id
+                )
+                try:
+                    db.session.add(employee)
+                    db.session.commit()
+                except Exception:
+                    if spooled_path:
+                        discard_spooled_upload(spooled_path)
+                    raise
+                if spooled_path:
+                    # The picture goes to S3 in the background; the page shows a placeholder until it is ready
+                    slot.submit(spooled_path, filename, Employee, employee.id, 'picture_status',
+                                after_upload=process_employee_picture, derived_keys=picture_variant_keys)
+        except UploadQueueFull:
+            flash('The upload service is busy. Please try again in a moment.', 'error')
+            return render_template('add_employee.html', form=form)
         flash('Employee added successfully', 'success')
         return redirect(url_for('main.employee_list'))
     return render_template('add_employee.html', form=form)
 
+@main.route('/admin/import_employees', methods=['GET', 'POST'])
+@login_required
+def import_employees():
+    """
+    Defines the route for importing employees in bulk from a CSV, JSON or JSON Lines file.
+
+    This function handles GET and POST requests and requires the user to be an admin. The uploaded file is parsed
+    as a stream, each row is validated with the same rules as the add employee form, and valid rows are inserted in
+    batches of IMPORT_BATCH_SIZE, one transaction per batch. Invalid rows are skipped and listed in the report.
+
+    Returns:
+        A rendered 'import_employees.html' template with the import report, or a redirect to the index page if the user is not an admin.
+    """
+    if not current_user.is_admin:
+        flash('You do not have permission to import employees.')
+        return redirect(url_for('main.index'))
+    form = EmployeeImportForm()
+    result = None
+    if form.validate_on_submit():
+        file = form.file.data
+        # The request's stream may be a SpooledTemporaryFile, which io.TextIOWrapper cannot wrap
+        # before Python 3.11, so the file is copied to disk and read from there.
+        path = spool_upload(file)
+        try:
+            with open(path, 'rb') as spooled:
+                result = run_employee_import(spooled, detect_format(file.filename),
+                                             batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+                                             max_errors=current_app.config['IMPORT_MAX_ERRORS'])
+        finally:
+            discard_spooled_upload(path)
+        flash(f'Imported {result.inserted} employees, {result.failed} rows failed.',
+              'success' if not result.failed else 'warning')
+    return render_template('import_employees.html', form=form, result=result)
+
 @main.route('/delete_employee/<int:id>', methods=['POST'])
 @login_required
 def delete_employee(id):
     """
     Defines the route for deleting an employee from the system.
 
-    This function handles POST requests and requires the user to be an admin. It retrieves the employee to be deleted from the database using the provided id. If the employee has a profile picture, it attempts to delete the picture from S3. After deleting the picture, it removes the employee from the database and commits the changes. Finally, it flashes a success message and redirects the user to the employee list page.
+    This function handles POST requests and requires the user to be an admin. It deletes the employee
+    together with their tickets, training records and documents. Their profile picture and documents
+    are removed from S3 in the background, after the deletion has been committed. Finally, it flashes
+    a success message and redirects the user to the employee list page.
 
     Parameters:
         id (int): The id of the employee to be deleted.
@@ -197,30 +295,42 @@ def delete_employee(id):
     if not current_user.is_admin:
         flash('You do not have permission to delete employees.')
         return redirect(url_for('main.employee_list'))
-    
-    employee = Employee.query.get_or_404(id)
-    
-    # Delete the profile picture from S3 if it exists
-    if employee.picture_url:
-        # Extract the filename from the URL
-        filename = employee.picture_url.split('/')[-1]
-        if delete_file_from_s3(filename):
-            print(f"Successfully deleted {filename} from S3")
-        else:
-            print(f"Failed to delete {filename} from S3")
-    
-    db.session.delete(employee)
-    db.session.commit()
+
+    if not delete_employees([id]):
+        abort(404)
     flash('Employee deleted successfully')
     return redirect(url_for('main.employee_list'))
 
+@main.route('/admin/delete_employees', methods=['POST'])
+@login_required
+def delete_employees_by_role():
+    """
+    Defines the route for deleting every employee with a role, along with their tickets, training
+    records and documents. Requires the user to be an admin.
+
+    Returns:
+        A redirect to the employee list page.
+    """
+    if not current_user.is_admin:
+        flash('You do not have permission to delete employees.')
+        return redirect(url_for('main.employee_list'))
+
+    form = EmployeeBulkDeleteForm()
+    if not form.validate_on_submit():
+        flash('Select a role to delete its employees.')
+        return redirect(url_for('main.employee_list'))
+    ids = [employee_id for employee_id, in db.session.query(Employee.id).filter(Employee.role == form.role.data)]
+    count = delete_employees(ids)
+    flash(f'Deleted {count} employees with the role {form.role.data}.')
+    return redirect(url_for('main.employee_list'))
+
 @main.route('/admin/approve_users')
 @login_required
 def approve_users():
     """
     Defines the route for approving users in the system.
 
-    This function handles GET requests and requires the user to be an admin. It retrieves a list of users who are waiting for approval from the database. If the current user is not an admin, it flashes an error message and redirects them to the index page. Otherwise, it renders the approve_users.html template, passing the list of users to be approved.
+    This function handles GET requests and requires the user to be an admin. It retrieves one page of users who are waiting for approval, oldest sign-ups first, optionally filtered by a 'q' username or email prefix and selected with an opaque 'cursor' query argument. If the current user is not an admin, it flashes an error message and redirects them to the index page. Otherwise, it renders the approve_users.html template, passing the page of users and the bulk review form.
 
     Returns:
         A rendered template for approving users or a redirect to the index page if the user is not an admin.
@@ -228,31 +338,79 @@ def approve_users():
     if not current_user.is_admin:
         flash('You do not have permission to access this page.')
         return redirect(url_for('main.index'))
-    users = User.query.filter_by(is_approved=False).all()
-    return render_template('approve_users.html', users=users)
+    search = request.args.get('q', '').strip()
+    per_page = get_per_page(request.args, current_app.config['PENDING_USERS_PER_PAGE'], current_app.config['MAX_PER_PAGE'])
+    page = User.get_pending_page(search=search, cursor=request.args.get('cursor'), per_page=per_page)
+    form = UserReviewForm(search=search)
+    return render_template('approve_users.html', users=page.items, next_cursor=page.next_cursor,
+                           search=search, per_page=per_page, form=form)
 
-@main.route('/admin/approve_user/<int:user_id>')
+@main.route('/admin/review_users', methods=['POST'])
 @login_required
-def approve_user(user_id):
+def review_users():
     """
-    Defines the route for approving a user in the system.
+    Defines the route for approving or rejecting pending users in bulk.
 
-    This function handles GET requests and requires the user to be an admin. It retrieves a user from the database based on the provided user_id and approves them. If the current user is not an admin, it flashes an error message and redirects them to the index page. Otherwise, it updates the user's approval status, commits the changes, and redirects to the approve users page.
-
-    Args:
-        user_id (int): The id of the user to be approved.
+    This function handles POST requests from the approve users page and requires the user to be an admin. Depending on the button pressed, it approves one user (a row's Approve button), approves or rejects the checked users, or every pending user matching the page's search, in a single UPDATE or DELETE statement and one commit. It then flashes the number of users changed and redirects back to the approve users page.
 
     Returns:
-        A redirect to the approve users page.
+        A redirect to the approve users page or to the index page if the user is not an admin.
     """
     if not current_user.is_admin:
         flash('You do not have permission to perform this action.')
         return redirect(url_for('main.index'))
-    user = User.query.get_or_404(user_id)
-    user.is_approved = True
-    db.session.commit()
-    flash(f'User {user.username} has been approved.')
-    return redirect(url_for('main.approve_users'))
+    form = UserReviewForm()
+    if not form.validate_on_submit():
+        flash('The form has expired. Please try again.', 'danger')
+        return redirect(url_for('main.approve_users'))
+    single_user_id = request.form.get('approve_user', type=int)
+    approve = form.approve.data or form.approve_all.data or single_user_id is not None
+    if single_user_id is not None:
+        count = User.review_pending(True, user_ids=[single_user_id])
+    elif form.approve_all.data or form.reject_all.data:
+        count = User.review_pending(approve, search=form.search.data.strip())
+    else:
+        user_ids = request.form.getlist('user_ids', type=int)
+        if not user_ids:
+            flash('No users were selected.', 'warning')
+            return redirect(url_for('main.approve_users', q=form.search.data or None))
+        if len(user_ids) > current_app.config['API_MAX_BATCH_SIZE']:
+            flash(f"At most {current_app.config['API_MAX_BATCH_SIZE']} users can be reviewed at once.", 'danger')
+            return redirect(url_for('main.approve_users', q=form.search.data or None))
+        count = User.review_pending(approve, user_ids=user_ids)
+    flash(f'{count} user(s) have been {"approved" if approve else "rejected"}.')
+    return redirect(url_for('main.approve_users', q=form.search.data or None))
+
+@main.route('/api/admin/review_users', methods=['POST'])
+@login_required
+def review_users_api():
+    """
+    Defines the JSON API for approving or rejecting pending users in bulk.
+
+    Expects a JSON body with 'action' ('approve' or 'reject') and either 'user_ids', a list of at
+    most API_MAX_BATCH_SIZE user ids, or 'all_matching': true with an optional 'q' username or email prefix. Only JSON
+    bodies are accepted, so the endpoint cannot be driven by a cross-site form post.
+
+    Returns:
+        A JSON response with the action and the number of users changed.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or data.get('action') not in ('approve', 'reject'):
+        return jsonify({'error': "Expected a JSON object with 'action' set to 'approve' or 'reject'"}), 400
+    approve = data['action'] == 'approve'
+    if data.get('all_matching') is True:
+        count = User.review_pending(approve, search=str(data.get('q') or '').strip())
+    else:
+        user_ids = data.get('user_ids')
+        # bool is a subclass of int, but true is not a user id
+        if not isinstance(user_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in user_ids):
+            return jsonify({'error': "Expected 'user_ids' to be a list of integers, or 'all_matching': true"}), 400
+        if len(user_ids) > current_app.config['API_MAX_BATCH_SIZE']:
+            return jsonify({'error': f"At most {current_app.config['API_MAX_BATCH_SIZE']} user ids may be reviewed at once"}), 400
+        count = User.review_pending(approve, user_ids=user_ids)
+    return jsonify({'action': data['action'], 'count': count})
 
 @main.route('/benefits')
 def benefits():
@@ -295,39 +453,169 @@ def create_ticket():
 
 @main.route('/view_tickets')
 @login_required
+@replica_reads()
 def view_tickets():
     """
-    Renders the view_tickets.html template with a list of tickets and a flag indicating if the current user is an admin.
+    Renders the view_tickets.html template with one page of tickets, newest first, and a flag indicating if the current user is an admin.
+
+    The tickets can be filtered with the 'status', 'ticket_type', 'created_from' and 'created_to' (YYYY-MM-DD, inclusive)
+    query arguments, and the page is selected with an opaque 'cursor' query argument.
 
     Returns:
         A rendered template for viewing tickets, with the following context variables:
-            - tickets (list): A list of tickets, with each ticket containing the following attributes:
+            - tickets (list): A page of tickets, with each ticket containing the following attributes:
                 - title (str): The title of the ticket.
                 - description (str): The description of the ticket.
                 - ticket_type (str): The type of the ticket (either 'Request' or 'Issue').
                 - created_at (datetime): The timestamp when the ticket was created.
                 - employee_name (str): The full name of the employee associated with the ticket.
                 - username (str): The username of the user associated with the employee.
+            - next_cursor (str): The cursor for the next page, or None on the last page.
+            - filters (dict): The active filters, echoed back into the filter form and page links.
             - is_admin (bool): A flag indicating if the current user is an admin.
     """
+    filters = {
+        'status': request.args.get('status', '').strip(),
+        'ticket_type': request.args.get('ticket_type', '').strip(),
+        'created_from': request.args.get('created_from', '').strip(),
+        'created_to': request.args.get('created_to', '').strip(),
+    }
+    per_page = get_per_page(request.args, current_app.config['TICKETS_PER_PAGE'], current_app.config['MAX_PER_PAGE'])
+    query_args = dict(_ticket_queue_filters(filters), cursor=request.args.get('cursor'), per_page=per_page)
+
+    tickets, next_cursor = [], None
     if current_user.is_admin:
-        # For admins, fetch all tickets with user and employee information
-        tickets = db.session.query(
-            Ticket,
-            Employee.full_name.label('employee_name'),
-            User.username.label('username')
-        ).join(Employee, Ticket.employee_id == Employee.id)\
-         .join(User, Employee.user_id == User.id)\
-         .all()
+        # For admins, fetch tickets with user and employee information
+        tickets, next_cursor = Ticket.get_queue_page(**query_args)
     else:
         # For regular users, fetch only their tickets
         if current_user.employee:
-            tickets = Ticket.query.filter_by(employee_id=current_user.employee.id).all()
+            tickets, next_cursor = Ticket.get_queue_page(employee_id=current_user.employee.id, **query_args)
         else:
             flash('You do not have an associated employee record. Please contact an administrator.', 'warning')
-            tickets = []
     
-    return render_template('view_tickets.html', title='View Tickets', tickets=tickets, is_admin=current_user.is_admin)
+    triage_form = None
+    if current_user.is_admin:
+        triage_form = TicketTriageForm(**{f'{key}_filter': value for key, value in filters.items()})
+    return render_template('view_tickets.html', title='View Tickets', tickets=tickets, next_cursor=next_cursor,
+                           filters=filters, per_page=per_page, is_admin=current_user.is_admin, triage_form=triage_form)
+
+def _ticket_queue_filters(filters):
+    """
+    Turns the ticket list's filter arguments into the keyword arguments of Ticket.queue_criteria.
+    """
+    created_to = _parse_date_arg(filters.get('created_to', ''))
+    return dict(
+        status=filters.get('status', ''),
+        ticket_type=filters.get('ticket_type', ''),
+        created_from=_parse_date_arg(filters.get('created_from', '')),
+        created_before=created_to + timedelta(days=1) if created_to else None,
+    )
+
+def _invalid_date_filters(filters):
+    """
+    Returns the names of the date filters that are set but are not YYYY-MM-DD dates. A bulk
+    update must not run with them, as the list ignores an invalid date and would match every ticket.
+    """
+    return [key for key in ('created_from', 'created_to') if filters.get(key) and _parse_date_arg(filters[key]) is None]
+
+@main.route('/admin/triage_tickets', methods=['POST'])
+@login_required
+def triage_tickets_form():
+    """
+    Defines the route for responding to many tickets at once from the ticket list.
+
+    Requires the user to be an admin. Depending on the button pressed, it sets the response, status
+    and approval on the checked tickets, or on every ticket matching the list's filters, in a single
+    UPDATE statement and one commit. It then flashes the number of tickets changed and redirects
+    back to the ticket list.
+
+    Returns:
+        A redirect to the view tickets page or to the index page if the user is not an admin.
+    """
+    if not current_user.is_admin:
+        flash('You do not have permission to perform this action.')
+        return redirect(url_for('main.index'))
+    form = TicketTriageForm()
+    filters = {key: getattr(form, f'{key}_filter').data or '' for key in ('status', 'ticket_type', 'created_from', 'created_to')}
+    active_filters = {key: value for key, value in filters.items() if value}
+    if not form.validate_on_submit():
+        flash('Enter a response to apply to the tickets.', 'danger')
+        return redirect(url_for('main.view_tickets', **active_filters))
+    is_approved = None if form.is_approved.data == 'None' else (form.is_approved.data == 'True')
+    if form.apply_all.data:
+        invalid = _invalid_date_filters(filters)
+        if invalid:
+            flash(f"Invalid date in {', '.join(invalid)}; no tickets were updated.", 'danger')
+            return redirect(url_for('main.view_tickets'))
+        count = triage_tickets(form.status.data, is_approved, form.admin_response.data,
+                               filters=_ticket_queue_filters(filters))
+    else:
+        ticket_ids = request.form.getlist('ticket_ids', type=int)
+        if not ticket_ids:
+            flash('No tickets were selected.', 'warning')
+            return redirect(url_for('main.view_tickets', **active_filters))
+        if len(ticket_ids) > current_app.config['API_MAX_BATCH_SIZE']:
+            flash(f"At most {current_app.config['API_MAX_BATCH_SIZE']} tickets can be updated at once.", 'danger')
+            return redirect(url_for('main.view_tickets', **active_filters))
+        count = triage_tickets(form.status.data, is_approved, form.admin_response.data, ticket_ids=ticket_ids)
+    flash(f'{count} ticket(s) have been updated.', 'success')
+    return redirect(url_for('main.view_tickets', **active_filters))
+
+@main.route('/api/admin/triage_tickets', methods=['POST'])
+@login_required
+def triage_tickets_api():
+    """
+    Defines the JSON API for responding to many tickets at once.
+
+    Expects a JSON body with 'status' (one of the ticket statuses), 'is_approved' (true, false or
+    null), 'admin_response', and either 'ticket_ids', a list of at most API_MAX_BATCH_SIZE ticket
+    ids, or 'all_matching': true with an optional 'filters' object, whose 'status', 'ticket_type',
+    'created_from' and 'created_to' (YYYY-MM-DD, inclusive) keys are the ticket list's query arguments.
+
+    Returns:
+        A JSON response with the number of tickets changed.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    data = request.get_json(silent=True)
+    statuses = [value for value, _ in TicketTriageForm.status.kwargs['choices']]
+    if not isinstance(data, dict) or data.get('status') not in statuses:
+        return jsonify({'error': f"Expected a JSON object with 'status' set to one of {', '.join(statuses)}"}), 400
+    if data.get('is_approved') not in (True, False, None):
+        return jsonify({'error': "Expected 'is_approved' to be true, false or null"}), 400
+    admin_response = data.get('admin_response')
+    if not isinstance(admin_response, str) or not admin_response.strip():
+        return jsonify({'error': "Expected a non-empty 'admin_response'"}), 400
+    if data.get('all_matching') is True:
+        filters = data.get('filters', {})
+        names = ('status', 'ticket_type', 'created_from', 'created_to')
+        if not isinstance(filters, dict) or not set(filters) <= set(names) \
+                or not all(isinstance(value, str) for value in filters.values()):
+            return jsonify({'error': f"Expected 'filters' to be an object of strings with the keys {', '.join(names)}"}), 400
+        invalid = _invalid_date_filters(filters)
+        if invalid:
+            return jsonify({'error': f"Expected {', '.join(invalid)} to be a YYYY-MM-DD date"}), 400
+        count = triage_tickets(data['status'], data.get('is_approved'), admin_response,
+                               filters=_ticket_queue_filters(filters))
+    else:
+        ticket_ids = data.get('ticket_ids')
+        # bool is a subclass of int, but true is not a ticket id
+        if not isinstance(ticket_ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ticket_ids):
+            return jsonify({'error': "Expected 'ticket_ids' to be a list of integers, or 'all_matching': true"}), 400
+        if len(ticket_ids) > current_app.config['API_MAX_BATCH_SIZE']:
+            return jsonify({'error': f"At most {current_app.config['API_MAX_BATCH_SIZE']} ticket ids may be updated at once"}), 400
+        count = triage_tickets(data['status'], data.get('is_approved'), admin_response, ticket_ids=ticket_ids)
+    return jsonify({'count': count})
+
+def _parse_date_arg(value):
+    """
+    Parses a YYYY-MM-DD query argument into a datetime at midnight, or None if it is empty or invalid.
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
 
 @main.route('/ticket/<int:ticket_id>', methods=['GET', 'POST'])
 @login_required
@@ -341,8 +629,18 @@ def ticket_detail(ticket_id):
     Returns:
         flask.Response: The rendered HTML template for the ticket detail page.
 
-    This function is a Flask route that handles GET and POST requests to the '/ticket/<int:ticket_id>' endpoint. It requires the user to be logged in. The function retrieves the ticket with the specified ticket_id from the database using the Ticket.query.get_or_404() method. It then creates a TicketResponseForm instance. If the user is an admin and the form is valid upon submission, the function updates the ticket's admin_response, status, and is_approved fields based on the form data. The changes are then committed to the database. Finally, a success flash message is displayed and the user is redirected to the view_tickets route. If the user is not an admin or the form is not valid, the function renders the 'ticket_detail.html' template with the ticket and form as context variables.
+    This function is a Flask route that handles GET and POST requests to the '/ticket/<int:ticket_id>' endpoint. It requires the user to be logged in. The function retrieves the ticket with the specified ticket_id from the database using the Ticket.query.get_or_404() method. It then creates a TicketResponseForm instance. If the user is an admin and the form is valid upon submission, the function updates the ticket's admin_response, status, and is_approved fields based on the form data. The changes are then committed to the database. Finally, a success flash message is displayed and the user is redirected to the view_tickets route. If the user is not an admin or the form is not valid, the function renders the 'ticket_detail.html' template with the ticket and form as context variables. GET responses carry an ETag and Last-Modified derived from the ticket's version, and an unchanged ticket is answered with an empty 304.
     """
+    if request.method == 'GET':
+        # An unchanged ticket is answered with a 304 before it is loaded
+        version = row_version(Ticket, ticket_id)
+        if version is None:
+            abort(404)
+        etag, last_modified = page_validators('ticket_detail', rows=[version], has_csrf_form=current_user.is_admin)
+        return conditional_page(etag, last_modified, lambda: render_template(
+            'ticket_detail.html', title='Ticket Detail', ticket=Ticket.query.get_or_404(ticket_id),
+            form=TicketResponseForm()))
+
     ticket = Ticket.query.get_or_404(ticket_id)
     form = TicketResponseForm()
     
@@ -358,10 +656,91 @@ def ticket_detail(ticket_id):
 
 @main.route('/employee/<int:employee_id>/training')
 @login_required
+@replica_reads()
 def employee_training(employee_id):
-    employee = Employee.query.get_or_404(employee_id)
-    training_records = TrainingRecord.query.filter_by(employee_id=employee_id).all()
-    return render_template('employee_training.html', employee=employee, training_records=training_records)
+    version = row_version(Employee, employee_id)
+    if version is None:
+        abort(404)
+    etag, last_modified = page_validators('employee_training', rows=[version],
+                                          collections=[collection_version(TrainingRecord, employee_id=employee_id)])
+    return conditional_page(etag, last_modified, lambda: render_template(
+        'employee_training.html', employee=Employee.query.get_or_404(employee_id),
+        training_records=TrainingRecord.query.filter_by(employee_id=employee_id).all()))
+
+def _expiry_filters():
+    # Reads the 'days' and 'role' query arguments shared by the certification expiry report, export and API
+    days = request.args.get('days', current_app.config['CERTIFICATION_WINDOW_DAYS'], type=int)
+    days = max(0, min(days, current_app.config['CERTIFICATION_WINDOW_MAX_DAYS']))
+    return days, request.args.get('role', '').strip()
+
+@main.route('/reports/certifications')
+@login_required
+@replica_reads()
+def certification_report():
+    """
+    Renders the org-wide report of certifications expiring in the next 'days' days, soonest first.
+
+    This function requires the user to be an admin. The certifications can be filtered by employee 'role',
+    and the page is selected with an opaque 'cursor' query argument. The precomputed per-role expiry counts
+    are shown above the list.
+
+    Returns:
+        A rendered 'certification_report.html' template, or a redirect to the index page if the user is not an admin.
+    """
+    if not current_user.is_admin:
+        flash('You do not have permission to access this page.')
+        return redirect(url_for('main.index'))
+    days, role = _expiry_filters()
+    expires_from, expires_to = expiry_window(days)
+    per_page = get_per_page(request.args, current_app.config['CERTIFICATIONS_PER_PAGE'], current_app.config['MAX_PER_PAGE'])
+    page = TrainingRecord.get_expiring_page(expires_from, expires_to, role=role,
+                                            cursor=request.args.get('cursor'), per_page=per_page)
+    summary, summary_computed_at = get_certification_summary()
+    return render_template('certification_report.html', records=page.items, next_cursor=page.next_cursor,
+                           days=days, role=role, per_page=per_page, expires_to=expires_to,
+                           summary=summary, summary_computed_at=summary_computed_at)
+
+@main.route('/reports/certifications/export')
+@login_required
+def export_certification_report():
+    """
+    Streams the certifications expiring in the next 'days' days, optionally filtered by 'role', as a CSV file.
+    """
+    if not current_user.is_admin:
+        abort(403)
+    days, role = _expiry_filters()
+    expires_from, expires_to = expiry_window(days)
+    response = Response(stream_with_context(iter_expiring_csv(expires_from, expires_to, role)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=certifications-expiring-{expires_to.isoformat()}.csv'
+    return response
+
+@main.route('/api/certifications/expiring')
+@login_required
+@replica_reads()
+def expiring_certifications():
+    """
+    Returns one page of the certifications expiring in the next 'days' days as JSON, with the cursor of the next page.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    days, role = _expiry_filters()
+    expires_from, expires_to = expiry_window(days)
+    per_page = get_per_page(request.args, current_app.config['CERTIFICATIONS_PER_PAGE'], current_app.config['MAX_PER_PAGE'])
+    page = TrainingRecord.get_expiring_page(expires_from, expires_to, role=role,
+                                            cursor=request.args.get('cursor'), per_page=per_page)
+    return jsonify({
+        'certifications': [{
+            'id': record.id,
+            'employee_id': record.employee_id,
+            'employee_name': employee_name,
+            'role': employee_role,
+            'course_name': record.course_name,
+            'certification_name': record.certification_name,
+            'certification_expiry': record.certification_expiry.isoformat(),
+            'status': record.status,
+        } for record, employee_name, employee_role in page.items],
+        'next_cursor': page.next_cursor,
+    })
 
 @main.route('/employee/<int:employee_id>/add_training', methods=['GET', 'POST'])
 @login_required
@@ -428,9 +807,105 @@ def send_message():
 
 @main.route('/messages')
 @login_required
+@replica_reads()
 def messages():
-    messages = current_user.received_messages.order_by(Message.timestamp.desc()).all()
-    return render_template('messages.html', messages=messages)
+    per_page = get_per_page(request.args, current_app.config['MESSAGES_PER_PAGE'], current_app.config['MAX_PER_PAGE'])
+    page = Message.get_inbox_page(current_user.id, cursor=request.args.get('cursor'), per_page=per_page)
+    return render_template('messages.html', messages=page.items, next_cursor=page.next_cursor, per_page=per_page)
+
+@main.route('/api/messages/unread_count')
+@login_required
+@replica_reads()
+def unread_message_count():
+    """
+    Returns the number of unread messages of the current user, for the navbar badge.
+    """
+    return jsonify({'unread': Message.count_unread(current_user.id)})
+
+@main.route('/events/stream')
+@login_required
+def event_stream():
+    """
+    Streams the current user's events ('message', 'unread' and 'ticket') as Server-Sent Events.
+
+    With PUSH_EVENTS on, a cooperative (gevent) worker holds the stream open, for up to STREAM_MAX_SECONDS, with
+    events arriving as they are committed. A browser that reconnects sends the cursor it was last
+    given in the Last-Event-ID header and gets the events it missed first. Under a threaded worker
+    an open stream would tie up a thread, and reconnecting to poll would cost more than the page
+    loads it saves, so the response is 204, which tells the browser not to reconnect.
+    """
+    if not push_enabled():
+        return Response(status=204)
+    user_id = current_user.id
+    retry_ms = int(current_app.config['STREAM_RETRY_SECONDS'] * 1000)
+    late_seconds = current_app.config['NOTIFICATION_LATE_SECONDS']
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    # Subscribed before reading the backlog, so no event falls between the two
+    subscription = subscribe(user_id)
+    cursor = parse_cursor(request.headers.get('Last-Event-ID'))
+    if cursor is None:
+        backlog, cursor = [], get_start_cursor(user_id)
+    else:
+        backlog, cursor = get_events(user_id, cursor)
+    heartbeat = current_app.config['STREAM_HEARTBEAT_SECONDS']
+    deadline = time.monotonic() + current_app.config['STREAM_MAX_SECONDS']
+    # Streaming needs no database connection
+    db.session.remove()
+
+    def generate():
+        position = cursor
+        # Events sent above the cursor's floor, so that it moves past them once they are old enough
+        sent = list(backlog)
+        try:
+            yield f'retry: {retry_ms}\n\n' + format_sse(backlog, position)
+            while time.monotonic() < deadline:
+                events = [e for e in subscription.wait(heartbeat) if is_new(position, e)]
+                sent.extend(events)
+                position = advance_cursor(position, sent, late_seconds)
+                sent = [e for e in sent if e.id > position.floor]
+                if events:
+                    yield format_sse(events, position)
+                else:
+                    # A comment keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+        finally:
+            unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers=headers)
+
+@main.route('/api/events')
+@login_required
+def poll_events():
+    """
+    Long-polling alternative to the event stream, for clients without EventSource.
+
+    Returns the current user's events that are new after the cursor given as 'after' as JSON,
+    with the 'cursor' to pass as 'after' next time. Without 'after' it only returns the cursor to
+    start from. The request waits up to LONG_POLL_TIMEOUT seconds for an event. Like the stream,
+    it needs PUSH_EVENTS and a cooperative worker; otherwise it answers 204 and the client stops.
+    """
+    if not push_enabled():
+        return Response(status=204)
+    user_id = current_user.id
+    cursor = parse_cursor(request.args.get('after'))
+    if cursor is None:
+        return jsonify({'events': [], 'cursor': format_cursor(get_start_cursor(user_id))})
+
+    subscription = subscribe(user_id)
+    try:
+        events, next_cursor = get_events(user_id, cursor)
+        if not events:
+            # Waiting needs no database connection
+            db.session.remove()
+            events = [e for e in subscription.wait(current_app.config['LONG_POLL_TIMEOUT']) if is_new(next_cursor, e)]
+            next_cursor = advance_cursor(next_cursor, events)
+    finally:
+        unsubscribe(subscription)
+    return jsonify({
+        'events': [{'id': e.id, 'event': e.event, 'data': e.data} for e in events],
+        'cursor': format_cursor(next_cursor),
+    })
 
 @main.route('/message/<int:message_id>')
 @login_required
@@ -444,10 +919,16 @@ def view_message(message_id):
 
 @main.route('/employee/<int:employee_id>/documents')
 @login_required
+@replica_reads()
 def employee_documents(employee_id):
-    employee = Employee.query.get_or_404(employee_id)
-    documents = Document.query.filter_by(employee_id=employee_id).all()
-    return render_template('employee_documents.html', employee=employee, documents=documents)
+    version = row_version(Employee, employee_id)
+    if version is None:
+        abort(404)
+    etag, last_modified = page_validators('employee_documents', rows=[version],
+                                          collections=[collection_version(Document, employee_id=employee_id)])
+    return conditional_page(etag, last_modified, lambda: render_template(
+        'employee_documents.html', employee=Employee.query.get_or_404(employee_id),
+        documents=Document.query.filter_by(employee_id=employee_id).all()))
 
 @main.route('/employee/<int:employee_id>/upload_document', methods=['GET', 'POST'])
 @login_required
@@ -458,17 +939,32 @@ def upload_document(employee_id):
         file = form.document.data
         filename = secure_filename(file.filename)
         file_type = filename.rsplit('.', 1)[1].lower()
-        s3_key = f"documents/{employee_id}/{filename}"
-        
-        s3_url = upload_file_to_s3(file, s3_key)
-        if s3_url:
-            new_document = Document(filename=filename, file_type=file_type, s3_key=s3_key, employee_id=employee_id)
-            db.session.add(new_document)
-            db.session.commit()
-            flash('Document uploaded successfully', 'success')
+
+        try:
+            with UploadSlot() as slot:
+                # The file is hashed while it is spooled; content already stored is not sent to S3 again
+                digest = hashlib.sha256()
+                spooled_path = spool_upload(file, digest)
+                try:
+                    blob, needs_upload = DocumentBlob.acquire(digest.hexdigest(), os.path.getsize(spooled_path))
+                    new_document = Document(filename=filename, file_type=file_type, blob=blob,
+                                            employee_id=employee_id, status=blob.status)
+                    db.session.add(new_document)
+                    db.session.commit()
+                except Exception:
+                    discard_spooled_upload(spooled_path)
+                    raise
+                if needs_upload:
+                    # The file goes to S3 in the background; the documents page shows its progress
+                    slot.submit(spooled_path, blob.s3_key, DocumentBlob, blob.id, 'status',
+                                after_status=DocumentBlob.copy_status_to_documents)
+                else:
+                    discard_spooled_upload(spooled_path)
+            flash('Document is uploading' if new_document.status == UPLOAD_PENDING else 'Document uploaded successfully',
+                  'success')
             return redirect(url_for('main.employee_documents', employee_id=employee_id))
-        else:
-            flash('Error uploading document', 'error')
+        except UploadQueueFull:
+            flash('The upload service is busy. Please try again in a moment.', 'error')
     return render_template('upload_document.html', form=form, employee=employee)
 
 @main.route('/document/<int:document_id>/delete', methods=['POST'])
@@ -476,29 +972,70 @@ def upload_document(employee_id):
 def delete_document(document_id):
     document = Document.query.get_or_404(document_id)
     employee_id = document.employee_id
-    
-    if delete_file_from_s3(document.s3_key):
-        db.session.delete(document)
+
+    # A shared blob's object is only deleted with its last reference, before that is committed
+    db.session.delete(document)
+    s3_key = DocumentBlob.release(document.blob_id) if document.blob_id else document.s3_key
+    if s3_key is None or delete_file_from_s3(s3_key):
         db.session.commit()
         flash('Document deleted successfully', 'success')
     else:
+        db.session.rollback()
         flash('Error deleting document from S3', 'error')
     
     return redirect(url_for('main.employee_documents', employee_id=employee_id))
 
+@main.route('/api/document/<int:document_id>/status')
+@login_required
+def document_status(document_id):
+    """
+    Returns the upload state of a document, and the percentage sent while this process is uploading it.
+    """
+    document = Document.query.get_or_404(document_id)
+    return jsonify({'status': document.status, 'progress': get_upload_progress(document.storage_key)})
+
 @main.route('/document/<int:document_id>/download')
 @login_required
 def download_document(document_id):
     document = Document.query.get_or_404(document_id)
-    presigned_url = generate_presigned_url(document.s3_key)
+    if document.blob_id:
+        # Blob keys are digests, so the link names the download after the document
+        presigned_url = generate_presigned_url(document.storage_key, download_name=document.filename)
+    else:
+        presigned_url = generate_presigned_url(document.s3_key)
     if presigned_url:
         return redirect(presigned_url)
     else:
         flash('Error generating download link', 'error')
         return redirect(url_for('main.employee_documents', employee_id=document.employee_id))
     
+@main.route('/search')
+@login_required
+@replica_reads()
+def search():
+    """
+    Defines the route for searching employees, tickets and messages.
+
+    The 'q' query argument is matched against employee names, roles and emails, ticket titles, descriptions
+    and responses, or message subjects and bodies, depending on the 'type' query argument. Results are ranked
+    by relevance and paginated with the 'page' query argument.
+
+    Returns:
+        A rendered 'search.html' template with one page of results.
+    """
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'employee')
+    if kind not in SEARCH_SOURCES:
+        kind = 'employee'
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = get_per_page(request.args, current_app.config['SEARCH_RESULTS_PER_PAGE'], current_app.config['MAX_PER_PAGE'])
+    results = run_search(kind, query, current_user, page=page, per_page=per_page)
+    return render_template('search.html', title='Search', query=query, kind=kind, page=page, per_page=per_page,
+                           hits=results.hits, has_next=results.has_next)
+
 @main.route('/dashboard')
 @login_required
+@replica_reads()
 def dashboard():
     if not current_user.is_admin:
         flash('You do not have permission to view the dashboard.', 'error')
@@ -507,10 +1044,20 @@ def dashboard():
 
 @main.route('/api/dashboard_data')
 @login_required
+@replica_reads()
 def dashboard_data():
-    data = {
-        'employee_roles': dict(Employee.get_role_distribution()),
-        'ticket_status': dict(Ticket.get_ticket_status_count()),
-        'popular_courses': dict(TrainingRecord.get_popular_courses()),
-    }
-    return jsonify(data)
\ No newline at end of file
+    """
+    Returns the dashboard chart data from the incrementally maintained counters.
+
+    The response carries a digest of the data as its ETag, so a polling client that sends
+    If-None-Match gets an empty 304 until an Employee, Ticket or TrainingRecord write changes a count.
+    """
+    data, etag = get_dashboard_data()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(data)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models import DocumentBlob, S3Deletion
+from app.s3_utils import delete_files_from_s3
+
+logger = logging.getLogger(__name__)
+
+# DeleteObjects accepts at most this many keys per request
+MAX_DELETE_BATCH = 1000
+# Longest wait before a failed key is tried again
+MAX_RETRY_DELAY = 3600
+# Seconds a claimed batch is reserved for the process deleting it
+CLAIM_SECONDS = 300
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+# Set while a reaper run is queued but has not started, so that a burst of wake-ups runs it once
+_scheduled = threading.Event()
+
+
+def queue_s3_deletions(s3_keys):
+    """
+    Queues objects for the reaper in the current transaction. Call wake_s3_reaper() after committing.
+    """
+    rows = [{'s3_key': key, 'attempts': 0, 'next_attempt_at': datetime.utcnow()} for key in s3_keys]
+    if rows:
+        db.session.execute(S3Deletion.__table__.insert(), rows)
+
+
+def _delete_with_retry(s3_keys):
+    # Retries the whole request when it fails outright, e.g. on a throttling error or a dropped connection
+    retries = current_app.config['S3_DELETE_RETRIES']
+    for attempt in range(retries + 1):
+        try:
+            return delete_files_from_s3(s3_keys)
+        except Exception as e:
+            if attempt == retries:
+                logger.error(f"DeleteObjects failed for {len(s3_keys)} keys after {retries + 1} attempts: {e}")
+                return {key: str(e) for key in s3_keys}
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def _reap_batch(batch_size):
+    """
+    Deletes one batch of due objects. Returns (deleted, failed, queued entries handled).
+
+    The batch is claimed in one short transaction and settled in another, so no row lock is held
+    while DeleteObjects and its backoff run. A claimed entry is not due again for CLAIM_SECONDS,
+    so another process does not delete the same keys meanwhile, and a process that dies holding
+    a claim only delays its keys.
+    """
+    now = datetime.utcnow()
+    entries = S3Deletion.query.filter(S3Deletion.next_attempt_at <= now)\
+        .order_by(S3Deletion.id).limit(batch_size).with_for_update().all()
+    if not entries:
+        db.session.commit()
+        return 0, 0, 0
+    for entry in entries:
+        entry.next_attempt_at = now + timedelta(seconds=CLAIM_SECONDS)
+
+    # Blobs are deleted with their object, and only if nothing references them again. The row locks
+    # make a concurrent upload of the same content wait, and then create a new blob.
+    blob_ids = {entry.blob_id for entry in entries if entry.blob_id is not None}
+    if blob_ids:
+        orphaned = {blob_id for blob_id, in db.session.query(DocumentBlob.id).filter(
+            DocumentBlob.id.in_(blob_ids), DocumentBlob.ref_count <= 0).with_for_update()}
+        if orphaned:
+            DocumentBlob.query.filter(DocumentBlob.id.in_(orphaned)).delete(synchronize_session=False)
+    # A key that a blob uses again is not deleted. Blobs created from now on cannot take a key that
+    # is still queued here (see DocumentBlob.acquire), so the check cannot go stale before the delete.
+    keys = {entry.s3_key for entry in entries}
+    in_use = {key for key, in db.session.query(DocumentBlob.s3_key)
+              .filter(DocumentBlob.s3_key.in_(keys)).with_for_update()}
+    entry_ids = [entry.id for entry in entries]
+    db.session.commit()
+
+    to_delete = sorted(keys - in_use)
+    errors = _delete_with_retry(to_delete)
+
+    base_delay = current_app.config['S3_DELETE_RETRY_DELAY']
+    entries = S3Deletion.query.filter(S3Deletion.id.in_(entry_ids)).all()
+    done = [entry.id for entry in entries if entry.s3_key not in errors]
+    for entry in entries:
+        if entry.s3_key in errors:
+            entry.attempts += 1
+            entry.next_attempt_at = now + timedelta(seconds=min(base_delay * 2 ** (entry.attempts - 1), MAX_RETRY_DELAY))
+            logger.warning(f"Could not delete {entry.s3_key} from S3 (attempt {entry.attempts}): {errors[entry.s3_key]}")
+    if done:
+        S3Deletion.query.filter(S3Deletion.id.in_(done)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(to_delete) - len(errors), len(errors), len(entry_ids)
+
+
+def reap_s3_deletions():
+    """
+    Deletes every queued object that is due, in DeleteObjects batches of up to S3_DELETE_BATCH_SIZE
+    (at most 1000) keys. Keys that fail are tried again later, with a growing delay.
+
+    Returns:
+        tuple: (objects deleted, objects that failed this time)
+    """
+    batch_size = max(1, min(current_app.config['S3_DELETE_BATCH_SIZE'], MAX_DELETE_BATCH))
+    deleted = failed = 0
+    while True:
+        batch_deleted, batch_failed, handled = _reap_batch(batch_size)
+        deleted += batch_deleted
+        failed += batch_failed
+        if handled < batch_size:
+            return deleted, failed
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='s3-reaper')
+                _executor_pid = pid
+                _scheduled.clear()
+    return _executor
+
+
+def _run(app):
+    _scheduled.clear()
+    try:
+        with app.app_context():
+            try:
+                reap_s3_deletions()
+            finally:
+                db.session.remove()
+    except Exception:
+        logger.exception("S3 reaper run failed")
+
+
+def wake_s3_reaper():
+    """
+    Starts a reaper run in this process's background thread, unless one is already waiting to start.
+    """
+    executor = _get_executor()
+    if not _scheduled.is_set():
+        _scheduled.set()
+        executor.submit(_run, current_app._get_current_object())
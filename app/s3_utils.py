@@ -1,13 +1,31 @@
-import boto3
-from botocore.exceptions import ClientError
+from collections import OrderedDict
 from flask import current_app
 import logging
+import os
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# boto3 and botocore are imported on the first S3 operation rather than with this module: they take
+# a large share of the app's import time, and most requests and CLI commands never touch S3.
+
+# The S3 client is shared by every thread of a process: creating one resolves credentials and
+# endpoints and starts a fresh connection pool, which is far more expensive than the request itself.
+_s3_client = None
+_s3_client_pid = None
+_s3_client_lock = threading.Lock()
+
+# (s3_key, download name) -> (presigned url, monotonic time after which it must not be handed out)
+_presigned_urls = OrderedDict()
+_presigned_urls_lock = threading.Lock()
+
 def get_s3_client():
     """
-    Returns a boto3 client object for interacting with Amazon S3.
+    Returns the process-wide boto3 client object for interacting with Amazon S3.
+
+    The client is created on first use and reused afterwards; boto3 clients are thread-safe.
+    A forked worker process gets its own client rather than sharing the parent's sockets.
 
     Parameters:
         None
@@ -15,15 +33,42 @@ def get_s3_client():
     Returns:
         boto3.client: An S3 client object.
     """
-    return boto3.client('s3', region_name=current_app.config['S3_REGION'])
-
-def upload_file_to_s3(file_stream, s3_key):
+    global _s3_client, _s3_client_pid
+    pid = os.getpid()
+    if _s3_client is None or _s3_client_pid != pid:
+        with _s3_client_lock:
+            if _s3_client is None or _s3_client_pid != pid:
+                import boto3
+                from botocore.config import Config as BotoConfig
+
+                config = BotoConfig(max_pool_connections=current_app.config['S3_MAX_POOL_CONNECTIONS'])
+                _s3_client = boto3.client('s3', region_name=current_app.config['S3_REGION'], config=config)
+                _s3_client_pid = pid
+    return _s3_client
+
+def reset_s3_client():
+    """
+    Drops the shared S3 client and the presigned URL cache, e.g. after the configuration changed.
+    """
+    global _s3_client, _s3_client_pid
+    with _s3_client_lock:
+        _s3_client = None
+        _s3_client_pid = None
+    with _presigned_urls_lock:
+        _presigned_urls.clear()
+
+def upload_file_to_s3(file_stream, s3_key, callback=None, extra_args=None):
     """
     Uploads a file to an Amazon S3 bucket.
 
+    The file is read and sent in S3_MULTIPART_CHUNK_SIZE parts, so files larger than one part
+    go up as a multipart upload without ever being held in memory as a whole.
+
     Args:
         file_stream: A file-like object containing the file to be uploaded.
         s3_key (str): The S3 key (path) where the file will be stored.
+        callback (callable): Optional; called with the number of bytes sent as the upload progresses.
+        extra_args (dict): Optional; object settings such as ContentType and CacheControl.
 
     Returns:
         str: The URL of the uploaded file, or None if the upload fails.
@@ -32,6 +77,9 @@ def upload_file_to_s3(file_stream, s3_key):
         ClientError: If an error occurs while uploading the file to S3.
         TypeError: If a type error occurs while uploading the file to S3.
     """
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+
     s3_client = get_s3_client()
     try:
         bucket = current_app.config['S3_BUCKET']
@@ -43,8 +91,12 @@ def upload_file_to_s3(file_stream, s3_key):
             return None
 
         logger.info(f"Attempting to upload file {s3_key} to bucket {bucket}")
-        s3_client.upload_fileobj(file_stream, bucket, s3_key)
-        return f"https://{bucket}.s3.{current_app.config['S3_REGION']}.amazonaws.com/{s3_key}"
+        chunk_size = current_app.config['S3_MULTIPART_CHUNK_SIZE']
+        transfer_config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                                         max_concurrency=current_app.config['S3_MULTIPART_CONCURRENCY'])
+        s3_client.upload_fileobj(file_stream, bucket, s3_key, ExtraArgs=extra_args, Config=transfer_config,
+                                 Callback=callback)
+        return get_s3_object_url(s3_key)
     except ClientError as e:
         logger.error(f"Error uploading file to S3: {e}")
         return None
@@ -52,6 +104,18 @@ def upload_file_to_s3(file_stream, s3_key):
         logger.error(f"TypeError in upload_file_to_s3: {e}")
         return None
     
+def get_s3_object_url(s3_key):
+    """
+    Returns the public URL an object stored under s3_key has, or will have once uploaded.
+
+    Args:
+        s3_key (str): The S3 key (path) of the file.
+
+    Returns:
+        str: The URL of the object.
+    """
+    return f"https://{current_app.config['S3_BUCKET']}.s3.{current_app.config['S3_REGION']}.amazonaws.com/{s3_key}"
+
 def delete_file_from_s3(s3_key):
     """
     Deletes a file from an Amazon S3 bucket.
@@ -65,7 +129,10 @@ def delete_file_from_s3(s3_key):
     Raises:
         ClientError: If an error occurs while deleting the file from S3.
     """
+    from botocore.exceptions import ClientError
+
     s3_client = get_s3_client()
+    invalidate_presigned_url(s3_key)
     try:
         bucket = current_app.config['S3_BUCKET']
         s3_client.delete_object(Bucket=bucket, Key=s3_key)
@@ -74,13 +141,40 @@ def delete_file_from_s3(s3_key):
         logger.error(f"Error deleting file from S3: {e}")
         return False
 
-def generate_presigned_url(s3_key, expiration=3600):
+def delete_files_from_s3(s3_keys):
+    """
+    Deletes up to 1000 objects from the S3 bucket with a single DeleteObjects request.
+
+    Args:
+        s3_keys (list): The S3 keys (paths) of the files to be deleted; at most 1000.
+
+    Returns:
+        dict: Maps each key that could not be deleted to S3's error message; empty if all were deleted.
+
+    Raises:
+        ClientError: If the request as a whole fails.
+    """
+    if not s3_keys:
+        return {}
+    invalidate_presigned_url(*s3_keys)
+    response = get_s3_client().delete_objects(
+        Bucket=current_app.config['S3_BUCKET'],
+        Delete={'Objects': [{'Key': key} for key in s3_keys], 'Quiet': True})
+    return {error['Key']: f"{error.get('Code')}: {error.get('Message')}" for error in response.get('Errors', [])}
+
+def generate_presigned_url(s3_key, expiration=None, download_name=None):
     """
     Generates a presigned URL for an S3 object.
 
+    URLs are cached per s3_key and download_name and handed out again until S3_PRESIGNED_URL_CACHE_MARGIN
+    seconds before their signature expires, so a link is never served with less than that much validity left.
+
     Args:
         s3_key (str): The S3 key (path) of the file.
         expiration (int): The number of seconds until the presigned URL expires.
+            Defaults to S3_PRESIGNED_URL_EXPIRATION.
+        download_name (str): Optional; the file name the browser saves the object as, for
+            objects whose key is not a meaningful name. Must be a secure_filename() result.
 
     Returns:
         str: The presigned URL for the S3 object, or None if generation fails.
@@ -88,14 +182,44 @@ def generate_presigned_url(s3_key, expiration=3600):
     Raises:
         ClientError: If an error occurs while generating the presigned URL.
     """
+    if expiration is None:
+        expiration = current_app.config['S3_PRESIGNED_URL_EXPIRATION']
+    reuse_for = expiration - current_app.config['S3_PRESIGNED_URL_CACHE_MARGIN']
+    now = time.monotonic()
+
+    cache_key = (s3_key, download_name)
+    with _presigned_urls_lock:
+        cached = _presigned_urls.get(cache_key)
+        if cached and cached[1] > now:
+            _presigned_urls.move_to_end(cache_key)
+            return cached[0]
+
+    from botocore.exceptions import ClientError
+
     s3_client = get_s3_client()
     try:
         bucket = current_app.config['S3_BUCKET']
-        response = s3_client.generate_presigned_url('get_object',
-                                                    Params={'Bucket': bucket,
-                                                            'Key': s3_key},
-                                                    ExpiresIn=expiration)
-        return response
+        params = {'Bucket': bucket, 'Key': s3_key}
+        if download_name:
+            params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+        response = s3_client.generate_presigned_url('get_object', Params=params, ExpiresIn=expiration)
     except ClientError as e:
         logger.error(f"Error generating presigned URL: {e}")
-        return None
\ No newline at end of file
+        return None
+
+    if reuse_for > 0:
+        with _presigned_urls_lock:
+            _presigned_urls[cache_key] = (response, now + reuse_for)
+            _presigned_urls.move_to_end(cache_key)
+            while len(_presigned_urls) > current_app.config['S3_PRESIGNED_URL_CACHE_SIZE']:
+                _presigned_urls.popitem(last=False)
+    return response
+
+def invalidate_presigned_url(*s3_keys):
+    """
+    Removes any cached presigned URLs for S3 objects, e.g. because the objects are being deleted.
+    """
+    s3_keys = set(s3_keys)
+    with _presigned_urls_lock:
+        for cache_key in [cache_key for cache_key in _presigned_urls if cache_key[0] in s3_keys]:
+            del _presigned_urls[cache_key]
@@ -0,0 +1,301 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict, namedtuple
+
+from sqlalchemy import DDL, event, or_
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Employee, Message, Ticket
+
+# kind -> (model, searched columns, owner columns used for permission checks)
+SEARCH_SOURCES = {
+    'employee': (Employee, ('full_name', 'role', 'email'), ()),
+    'ticket': (Ticket, ('title', 'description', 'admin_response'), ('employee_id',)),
+    'message': (Message, ('subject', 'body'), ('sender_id', 'recipient_id')),
+}
+
+SearchHit = namedtuple('SearchHit', ['kind', 'item', 'score'])
+SearchPage = namedtuple('SearchPage', ['hits', 'has_next'])
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# On MySQL the searched columns of each source get a FULLTEXT index. It is created with DDL rather
+# than db.Index so that SQLite, which has no FULLTEXT indexes, does not get a plain index instead.
+# Migration 0002 creates the same indexes on migrated databases; this covers db.create_all().
+for _kind, (_model, _columns, _) in SEARCH_SOURCES.items():
+    event.listen(_model.__table__, 'after_create', DDL(
+        f'CREATE FULLTEXT INDEX ft_{_model.__tablename__}_search '
+        f'ON {_model.__tablename__} ({", ".join(_columns)})'
+    ).execute_if(dialect='mysql'))
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase word tokens, dropping single characters.
+    """
+    if not text:
+        return []
+    return [token for token in _TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+def uses_fulltext():
+    return db.engine.dialect.name == 'mysql'
+
+
+def search(kind, query, user, page=1, per_page=20):
+    """
+    Returns one page of ranked results of a kind ('employee', 'ticket' or 'message') for a query.
+
+    Uses MySQL FULLTEXT indexes when the database is MySQL/MariaDB, and the in-process inverted
+    index otherwise. Tickets are limited to the user's own unless they are an admin, and messages
+    to the ones they sent or received.
+    """
+    if not tokenize(query):
+        return SearchPage([], False)
+    offset = (page - 1) * per_page
+    if uses_fulltext():
+        hits = _fulltext_search(kind, query, user, offset, per_page + 1)
+    else:
+        hits = _fallback_index.search(kind, query, _owner_filter(kind, user), offset, per_page + 1)
+    return SearchPage(hits[:per_page], len(hits) > per_page)
+
+
+def _fulltext_search(kind, query, user, offset, limit):
+    model, columns, _ = SEARCH_SOURCES[kind]
+    score = match(*[getattr(model, column) for column in columns], against=query).in_natural_language_mode()
+    rows = db.session.query(model, score.label('score')).filter(score)
+    if kind == 'ticket' and not user.is_admin:
+        rows = rows.filter(Ticket.employee_id == (user.employee.id if user.employee else None))
+    elif kind == 'message':
+        rows = rows.filter(or_(Message.recipient_id == user.id, Message.sender_id == user.id))
+    rows = rows.order_by(score.desc(), model.id.desc()).offset(offset).limit(limit)
+    return [SearchHit(kind, item, score) for item, score in rows]
+
+
+def _owner_filter(kind, user):
+    # Returns a predicate over an indexed row's owner values, or None if every row is visible.
+    if kind == 'ticket' and not user.is_admin:
+        employee_id = user.employee.id if user.employee else None
+        return lambda owners: owners[0] == employee_id
+    if kind == 'message':
+        return lambda owners: user.id in owners
+    return None
+
+
+class InvertedIndex:
+    """
+    An in-process inverted index over SEARCH_SOURCES, for databases without FULLTEXT support.
+
+    The index is built from the database on the first search and then kept current by the
+    after_commit hook below, so it only sees writes committed by this process. Results are ranked
+    by TF-IDF.
+
+    The build reads the tables without holding the lock, so commits are not held up meanwhile.
+    Changes committed while it runs are buffered and replayed on the finished index, and a change
+    that was not queued because the index was not active when it was written marks it stale, so
+    the next search builds it again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Held for the whole build, so concurrent first searches wait for one build
+        self.build_lock = threading.Lock()
+        self.built = False
+        self.building = False
+        self.stale = False
+        # Changes committed during the build, in commit order
+        self.pending = []
+        # kind -> token -> {row id: term frequency}
+        self.postings = defaultdict(lambda: defaultdict(dict))
+        # kind -> row id -> (tokens, owner values)
+        self.documents = defaultdict(dict)
+
+    @property
+    def active(self):
+        """
+        Whether writes must be queued for the index: it is built or being built.
+        """
+        return self.built or self.building
+
+    def build(self):
+        with self.build_lock:
+            with self.lock:
+                if self.built:
+                    return
+                self.building = True
+                self.stale = False
+                self.pending = []
+            fresh = InvertedIndex()
+            try:
+                for kind, (model, columns, owners) in SEARCH_SOURCES.items():
+                    attributes = [model.id] + [getattr(model, c) for c in columns + owners]
+                    for row in db.session.query(*attributes).yield_per(1000):
+                        fresh._add(kind, row[0], row[1:1 + len(columns)], tuple(row[1 + len(columns):]))
+            except Exception:
+                with self.lock:
+                    self.building = False
+                    self.pending = []
+                raise
+            with self.lock:
+                self.postings, self.documents = fresh.postings, fresh.documents
+                self._apply(self.pending)
+                self.pending = []
+                self.building = False
+                self.built = not self.stale
+
+    def _add(self, kind, row_id, texts, owners):
+        self._remove(kind, row_id)
+        counts = Counter(token for text in texts for token in tokenize(text))
+        for token, frequency in counts.items():
+            self.postings[kind][token][row_id] = frequency
+        self.documents[kind][row_id] = (tuple(counts), owners)
+
+    def _remove(self, kind, row_id):
+        previous = self.documents[kind].pop(row_id, None)
+        if previous:
+            for token in previous[0]:
+                rows = self.postings[kind].get(token)
+                if rows is not None:
+                    rows.pop(row_id, None)
+                    if not rows:
+                        del self.postings[kind][token]
+
+    def _apply(self, changes):
+        for kind, row_id, texts, owners in changes:
+            if texts is None:
+                self._remove(kind, row_id)
+            else:
+                self._add(kind, row_id, texts, owners)
+
+    def apply(self, changes):
+        with self.lock:
+            if self.building:
+                self.pending.extend(changes)
+            elif self.built:
+                self._apply(changes)
+
+    def mark_stale(self):
+        """
+        Records that a change was committed without being queued, because the index became active
+        between the write and the commit. The index is built again on the next search.
+        """
+        with self.lock:
+            if self.building:
+                self.stale = True
+            elif self.built:
+                self.built = False
+
+    def reset(self):
+        with self.lock:
+            self.built = False
+            self.stale = self.building
+            self.postings.clear()
+            self.documents.clear()
+
+    def search(self, kind, query, owner_filter, offset, limit):
+        self.build()
+        with self.lock:
+            total = len(self.documents[kind]) or 1
+            scores = defaultdict(float)
+            for token in set(tokenize(query)):
+                rows = self.postings[kind].get(token)
+                if not rows:
+                    continue
+                idf = math.log(1 + total / len(rows))
+                for row_id, frequency in rows.items():
+                    scores[row_id] += (1 + math.log(frequency)) * idf
+            if owner_filter is not None:
+                scores = {row_id: score for row_id, score in scores.items()
+                          if owner_filter(self.documents[kind][row_id][1])}
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[offset:offset + limit]
+        if not ranked:
+            return []
+        model = SEARCH_SOURCES[kind][0]
+        items = {item.id: item for item in model.query.filter(model.id.in_([row_id for row_id, _ in ranked]))}
+        return [SearchHit(kind, items[row_id], score) for row_id, score in ranked if row_id in items]
+
+
+_fallback_index = InvertedIndex()
+
+
+def reset_search_index():
+    """
+    Discards the in-process index so the next search rebuilds it, e.g. after a bulk insert that bypassed the ORM events.
+    """
+    _fallback_index.reset()
+
+
+def queue_search_deletes(session, kind, id_query):
+    """
+    Removes rows deleted by a bulk statement, which bypasses the ORM events, from the in-process
+    index when the session commits. id_query selects the ids of the rows; it is only run if this
+    process has built the index, or is building it.
+    """
+    if not _fallback_index.active:
+        session.info['search_missed'] = True
+        return
+    changes = session.info.setdefault('search_changes', [])
+    changes.extend((kind, row_id, None, ()) for row_id, in id_query)
+
+
+def queue_search_updates(session, kind, ids):
+    """
+    Reindexes rows changed by a bulk UPDATE, which bypasses the ORM events, when the session
+    commits. The rows are read back in the session's transaction, and only if this process has
+    built the in-process index, or is building it.
+    """
+    if not _fallback_index.active:
+        session.info['search_missed'] = True
+        return
+    model, columns, owners = SEARCH_SOURCES[kind]
+    attributes = [model.id] + [getattr(model, c) for c in columns + owners]
+    changes = session.info.setdefault('search_changes', [])
+    ids = list(ids)
+    for start in range(0, len(ids), 1000):
+        for row in session.query(*attributes).filter(model.id.in_(ids[start:start + 1000])):
+            changes.append((kind, row[0], tuple(row[1:1 + len(columns)]), tuple(row[1 + len(columns):])))
+
+
+def _queue_change(session, kind, target, deleted=False):
+    if not _fallback_index.active:
+        # Nothing to update, unless a build starts before the commit; see _apply_search_changes
+        session.info['search_missed'] = True
+        return
+    model, columns, owners = SEARCH_SOURCES[kind]
+    texts = None if deleted else tuple(getattr(target, c) for c in columns)
+    owner_values = tuple(getattr(target, c) for c in owners)
+    session.info.setdefault('search_changes', []).append((kind, target.id, texts, owner_values))
+
+
+def _register(kind, model):
+    @event.listens_for(model, 'after_insert')
+    @event.listens_for(model, 'after_update')
+    def after_write(mapper, connection, target):
+        _queue_change(Session.object_session(target), kind, target)
+
+    @event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        _queue_change(Session.object_session(target), kind, target, deleted=True)
+
+
+for _kind, (_model, _, _) in SEARCH_SOURCES.items():
+    _register(_kind, _model)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_search_changes(session):
+    changes = session.info.pop('search_changes', None)
+    if session.info.pop('search_missed', False) and _fallback_index.active:
+        # A build started after this transaction's writes and may not see them
+        _fallback_index.mark_stale()
+    if changes:
+        _fallback_index.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_search_changes(session):
+    session.info.pop('search_changes', None)
+    session.info.pop('search_missed', None)
@@ -12,3 +12,64 @@ document.addEventListener("DOMContentLoaded", function() {
     openTab('employees');
 });
 
+
+// Show the number of unread messages next to the Messages link, and keep it and any ticket
+// statuses on the page current with the events the server pushes
+var TICKET_BADGES = {"Open": "badge-primary", "In Progress": "badge-warning", "Closed": "badge-success"};
+
+function showUnread(badge, unread) {
+    badge.textContent = unread;
+    badge.hidden = unread === 0;
+}
+
+function handlePushEvent(badge, name, data) {
+    if (name === "unread") {
+        showUnread(badge, data.unread);
+    } else if (name === "ticket") {
+        var labels = document.querySelectorAll('[data-ticket-status="' + data.id + '"]');
+        for (var i = 0; i < labels.length; i++) {
+            labels[i].textContent = data.status;
+            labels[i].className = "badge " + (TICKET_BADGES[data.status] || "badge-secondary");
+        }
+    }
+}
+
+// Long-polling fallback for browsers without EventSource. The server answers 204 when it does
+// not push events, and the page then stops asking.
+function pollEvents(badge, after) {
+    var url = badge.dataset.pollUrl + (after === null ? "" : "?after=" + encodeURIComponent(after));
+    fetch(url)
+        .then(function(response) { return response.status === 204 ? null : response.json(); })
+        .then(function(data) {
+            if (data === null) {
+                return;
+            }
+            data.events.forEach(function(pushed) { handlePushEvent(badge, pushed.event, pushed.data); });
+            pollEvents(badge, data.cursor);
+        })
+        .catch(function(error) {
+            console.error("Error polling events:", error);
+            setTimeout(function() { pollEvents(badge, after); }, 10000);
+        });
+}
+
+document.addEventListener("DOMContentLoaded", function() {
+    var badge = document.getElementById("unread-badge");
+    if (!badge) {
+        return;
+    }
+    fetch(badge.dataset.url)
+        .then(function(response) { return response.json(); })
+        .then(function(data) { showUnread(badge, data.unread); })
+        .catch(function(error) { console.error("Error fetching unread count:", error); });
+
+    if (window.EventSource) {
+        // The browser reconnects by itself, resuming from the cursor it was last sent; a 204 stops it
+        var source = new EventSource(badge.dataset.streamUrl);
+        ["unread", "ticket", "message"].forEach(function(name) {
+            source.addEventListener(name, function(e) { handlePushEvent(badge, name, JSON.parse(e.data)); });
+        });
+    } else {
+        pollEvents(badge, null);
+    }
+});
@@ -0,0 +1,58 @@
+from collections import Counter
+from datetime import datetime
+
+from app import db
+from app.models import Ticket
+from app.notifications import queue_ticket_events, ticket_event_data, write_queued_notifications
+from app.rollups import apply_counter_deltas
+from app.search import queue_search_updates
+
+
+def triage_tickets(status, is_approved, admin_response, ticket_ids=None, filters=None):
+    """
+    Responds to many tickets at once, in one set-based UPDATE and one commit.
+
+    Sets the status, approval and a shared admin response on the given ticket ids, or on every
+    ticket matching filters (the keyword arguments of Ticket.queue_criteria) if ticket_ids is
+    None. updated_at is set and the version bumped as by an edit on the ticket page.
+
+    The UPDATE bypasses the ORM events, so the dashboard counters, the search index and the
+    ticket events pushed to the owners are updated here, in the same transaction.
+
+    Returns:
+        int: The number of tickets updated.
+    """
+    if ticket_ids is not None:
+        ticket_ids = sorted(set(ticket_ids))
+        if not ticket_ids:
+            return 0
+        criteria = [Ticket.id.in_(ticket_ids)]
+    else:
+        criteria = Ticket.queue_criteria(**(filters or {}))
+    try:
+        # The rows are locked, so the statuses the counters are adjusted from stay current
+        matched = db.session.query(Ticket.id, Ticket.employee_id, Ticket.title, Ticket.status, Ticket.is_approved)\
+            .filter(*criteria).with_for_update().all()
+        if not matched:
+            db.session.rollback()
+            return 0
+        count = Ticket.query.filter(*criteria).update({
+            Ticket.status: status,
+            Ticket.is_approved: is_approved,
+            Ticket.admin_response: admin_response,
+            Ticket.updated_at: datetime.utcnow(),
+        }, synchronize_session=False)
+
+        deltas = Counter({status: len(matched)})
+        deltas.subtract(row.status for row in matched)
+        apply_counter_deltas(db.session.connection(), 'ticket_status', deltas)
+        queue_search_updates(db.session, 'ticket', [row.id for row in matched])
+        queue_ticket_events(db.session, [
+            (row.employee_id, dict(ticket_event_data(row), status=status, is_approved=is_approved))
+            for row in matched])
+        write_queued_notifications(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
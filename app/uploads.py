@@ -0,0 +1,184 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from app import db
+from app.models import UPLOAD_FAILED, UPLOAD_READY
+from app.s3_reaper import queue_s3_deletions, wake_s3_reaper
+from app.s3_utils import upload_file_to_s3
+
+logger = logging.getLogger(__name__)
+
+# Chunk size used when spooling an incoming request body to disk
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_pid = None
+_slots = None
+_executor_lock = threading.Lock()
+
+# s3_key -> [bytes sent, total bytes], for uploads running in this process
+_progress = {}
+_progress_lock = threading.Lock()
+
+
+class UploadQueueFull(Exception):
+    """
+    Raised when every upload worker is busy and the upload queue is full.
+    """
+
+
+def _get_executor():
+    global _executor, _executor_pid, _slots
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                workers = current_app.config['UPLOAD_WORKERS']
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='s3-upload')
+                _slots = threading.BoundedSemaphore(workers + current_app.config['UPLOAD_QUEUE_SIZE'])
+                _executor_pid = pid
+    return _executor, _slots
+
+
+def spool_upload(file_storage, digest=None):
+    """
+    Copies an uploaded file to a temporary file on local disk in fixed-size chunks.
+
+    The request's own file object is closed when the request ends, so a background upload
+    needs its own copy; copying in chunks keeps memory flat regardless of the file size.
+    If digest is given (a hashlib object), every chunk is also fed to it, so the file is
+    hashed in the same pass.
+
+    Returns:
+        str: The path of the temporary file. The upload task removes it when it is done.
+    """
+    fd, path = tempfile.mkstemp(prefix='upload-')
+    with os.fdopen(fd, 'wb') as spooled:
+        if digest is None:
+            shutil.copyfileobj(file_storage.stream, spooled, SPOOL_CHUNK_SIZE)
+        else:
+            while True:
+                chunk = file_storage.stream.read(SPOOL_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                spooled.write(chunk)
+    return path
+
+
+def discard_spooled_upload(path):
+    """
+    Removes a spooled file that will not be handed to an upload task, e.g. because its row was not committed.
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class UploadSlot:
+    """
+    Reserves a place in the bounded upload queue for the duration of a with block.
+
+    Raises UploadQueueFull on entry if the queue is full, so a request can be rejected before
+    any rows are written. Calling submit() hands the reservation to the background task; if
+    the block exits without submitting, the reservation is released.
+
+        with UploadSlot() as slot:
+            ...create the pending row and commit...
+            slot.submit(path, s3_key, Document, document.id, 'status')
+    """
+
+    def __enter__(self):
+        self._executor, self._slots = _get_executor()
+        if not self._slots.acquire(blocking=False):
+            raise UploadQueueFull()
+        self._submitted = False
+        return self
+
+    def submit(self, path, s3_key, model, row_id, status_attr, after_upload=None, after_status=None,
+               derived_keys=None):
+        """
+        Uploads the spooled file at path to s3_key in the background, then sets
+        model(row_id).status_attr to ready or failed.
+
+        If given, after_upload(path, s3_key, row_id) runs in the background task once the
+        upload succeeded and before the status is set, while the spooled file still exists.
+        after_status(row, status) runs once the status is set, in the same transaction.
+
+        If the row was deleted while the upload ran, nothing references the uploaded object any
+        more, so it is queued for deletion, together with derived_keys(s3_key) if given (the
+        objects after_upload may have stored next to it).
+        """
+        with _progress_lock:
+            _progress[s3_key] = [0, os.path.getsize(path)]
+        app = current_app._get_current_object()
+        self._executor.submit(_run_upload, app, self._slots, path, s3_key, model, row_id, status_attr,
+                              after_upload, after_status, derived_keys)
+        self._submitted = True
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self._submitted:
+            self._slots.release()
+        return False
+
+
+def _run_upload(app, slots, path, s3_key, model, row_id, status_attr, after_upload, after_status, derived_keys):
+    def on_progress(sent):
+        with _progress_lock:
+            if s3_key in _progress:
+                _progress[s3_key][0] += sent
+
+    try:
+        with app.app_context():
+            try:
+                with open(path, 'rb') as spooled:
+                    url = upload_file_to_s3(spooled, s3_key, callback=on_progress)
+            except Exception:
+                logger.exception(f"Unexpected error uploading {s3_key}")
+                url = None
+            if url and after_upload is not None:
+                try:
+                    after_upload(path, s3_key, row_id)
+                except Exception:
+                    logger.exception(f"Post-processing failed for {s3_key}")
+            status = UPLOAD_READY if url else UPLOAD_FAILED
+            # Updated through the ORM, so model events such as the identity cache's run. The row is
+            # locked so that a concurrent delete either waits for the status or is seen as done.
+            row = db.session.get(model, row_id, with_for_update=True)
+            if row is not None:
+                setattr(row, status_attr, status)
+                if after_status is not None:
+                    after_status(row, status)
+                db.session.commit()
+            elif url:
+                # The row was deleted before the object existed, so its deletion could not remove it
+                queue_s3_deletions([s3_key] + (derived_keys(s3_key) if derived_keys is not None else []))
+                db.session.commit()
+                wake_s3_reaper()
+    except Exception:
+        logger.exception(f"Could not record upload status for {s3_key}")
+    finally:
+        slots.release()
+        with _progress_lock:
+            _progress.pop(s3_key, None)
+        discard_spooled_upload(path)
+
+
+def get_upload_progress(s3_key):
+    """
+    Returns the percentage of an in-flight upload that has been sent, or None if this process
+    is not uploading it (it finished, or another worker process is handling it).
+    """
+    with _progress_lock:
+        progress = _progress.get(s3_key)
+        if not progress:
+            return None
+        sent, total = progress
+    return 100 if not total else min(100, int(sent * 100 / total))
@@ -0,0 +1,277 @@
+"""
+Route-level load and latency benchmark.
+
+Seeds a SQLite database with synthetic data, stubs S3 with moto, then drives the routes of the
+main blueprint with concurrent logged-in clients and reports latency percentiles, throughput and
+SQL queries per request. Runs fully offline:
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.run --employees 5000 --save benchmarks/baseline.json
+    python -m benchmarks.run --employees 5000 --compare benchmarks/baseline.json
+
+With --compare the run exits with status 1 if any route's p95 latency grew by more than
+--tolerance, or it issues more SQL queries per request than the baseline did.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BUCKET = 'benchmark-bucket'
+REGION = 'us-east-1'
+
+
+def _configure_environment(database_path):
+    # Config reads the environment when it is imported, so this must run before the app is imported.
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    os.environ['S3_BUCKET_EMPLOYEE_PHOTOS'] = BUCKET
+    os.environ['S3_REGION'] = REGION
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    os.environ.setdefault('AWS_DEFAULT_REGION', REGION)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class QueryCounter:
+    """
+    Counts SQL statements per thread, so concurrent clients each see only their own queries.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+
+def _scenarios(ids):
+    """
+    Returns (name, role, method, url factory, form data factory) for every benchmarked route.
+    The role selects an admin or a regular user client.
+    """
+    def pick(key):
+        return lambda rng: rng.choice(ids[key])
+
+    def fixed(url):
+        return lambda rng: url
+
+    return [
+        ('index', 'user', 'GET', fixed('/'), None),
+        ('employee_list', 'user', 'GET', fixed('/employee_list'), None),
+        ('employee_list_filtered', 'user', 'GET', fixed('/employee_list?role=Engineer&name=A'), None),
+        ('employee_profile', 'user', 'GET', lambda rng: f'/employee/{pick("employees")(rng)}', None),
+        ('employee_training', 'user', 'GET', lambda rng: f'/employee/{pick("employees")(rng)}/training', None),
+        ('employee_documents', 'user', 'GET', lambda rng: f'/employee/{pick("employees")(rng)}/documents', None),
+        ('download_document', 'user', 'GET', lambda rng: f'/document/{pick("documents")(rng)}/download', None),
+        ('view_tickets_admin', 'admin', 'GET', fixed('/view_tickets'), None),
+        ('view_tickets_admin_filtered', 'admin', 'GET', fixed('/view_tickets?status=Open&ticket_type=Issue'), None),
+        ('view_tickets_user', 'user', 'GET', fixed('/view_tickets'), None),
+        ('ticket_detail', 'admin', 'GET', lambda rng: f'/ticket/{pick("tickets")(rng)}', None),
+        ('messages', 'user', 'GET', fixed('/messages'), None),
+        ('unread_message_count', 'user', 'GET', fixed('/api/messages/unread_count'), None),
+        ('send_message_form', 'user', 'GET', fixed('/send_message'), None),
+        ('search_employees', 'user', 'GET', fixed('/search?q=alex+smith&type=employee'), None),
+        ('search_tickets', 'admin', 'GET', fixed('/search?q=vpn+laptop&type=ticket'), None),
+        ('dashboard', 'admin', 'GET', fixed('/dashboard'), None),
+        ('dashboard_data', 'admin', 'GET', fixed('/api/dashboard_data'), None),
+        ('approve_users', 'admin', 'GET', fixed('/admin/approve_users'), None),
+        ('create_ticket', 'user', 'POST', fixed('/create_ticket'),
+         lambda rng: {'title': 'Benchmark ticket', 'description': 'vpn down', 'ticket_type': 'Issue'}),
+    ]
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='ems-benchmark-')
+    _configure_environment(os.path.join(workdir, 'benchmark.db'))
+
+    from moto import mock_aws
+
+    with mock_aws():
+        from app import create_app, db
+        from app.models import Document, Employee, Ticket, User
+        from app.s3_utils import get_s3_client
+        from benchmarks.seed import PASSWORD, seed
+
+        app = create_app()
+        app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        with app.app_context():
+            db.create_all()
+            get_s3_client().create_bucket(Bucket=BUCKET)
+            started = time.perf_counter()
+            counts = seed(users=args.users, employees=args.employees, tickets=args.tickets,
+                          training_records=args.training_records, messages=args.messages,
+                          documents=args.documents, s3_client=get_s3_client(), bucket=BUCKET)
+            print(f'Seeded {counts} in {time.perf_counter() - started:.1f}s')
+            ids = {
+                'employees': [i for i, in db.session.query(Employee.id)],
+                'tickets': [i for i, in db.session.query(Ticket.id)],
+                'documents': [i for i, in db.session.query(Document.id)],
+                'users': [name for name, in db.session.query(User.username).filter(User.is_admin.is_(False))],
+            }
+            queries = QueryCounter(db.engine)
+
+        def login(username):
+            client = app.test_client()
+            response = client.post('/login', data={'username': username, 'password': PASSWORD})
+            if response.status_code != 302:
+                raise RuntimeError(f'Could not log in as {username}')
+            return client
+
+        # Every client thread gets its own logged-in admin and user sessions.
+        local = threading.local()
+        user_names = ids['users'][:max(1, args.clients)]
+
+        def clients():
+            if not hasattr(local, 'clients'):
+                index = threading.get_ident() % len(user_names)
+                local.clients = {'admin': login('user0'), 'user': login(user_names[index])}
+                local.rng = random.Random(threading.get_ident())
+            return local.clients, local.rng
+
+        def request_once(scenario):
+            name, role, method, url, data = scenario
+            client_by_role, rng = clients()
+            client = client_by_role[role]
+            target = url(rng)
+            queries.reset()
+            started = time.perf_counter()
+            if method == 'GET':
+                response = client.get(target)
+            else:
+                response = client.post(target, data=data(rng))
+            elapsed = time.perf_counter() - started
+            return elapsed, queries.count, response.status_code < 400
+
+        def login_once(_):
+            client = app.test_client()
+            queries.reset()
+            started = time.perf_counter()
+            response = client.post('/login', data={'username': random.choice(user_names), 'password': PASSWORD})
+            return time.perf_counter() - started, queries.count, response.status_code == 302
+
+        scenarios = _scenarios(ids)
+        if args.routes:
+            wanted = set(args.routes.split(','))
+            scenarios = [s for s in scenarios if s[0] in wanted]
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            jobs = [(s[0], request_once, s, args.requests) for s in scenarios]
+            if not args.routes or 'login' in args.routes.split(','):
+                jobs.append(('login', login_once, None, args.login_requests))
+            for name, fn, scenario, total in jobs:
+                list(pool.map(fn, [scenario] * min(args.warmup, total)))
+                started = time.perf_counter()
+                samples = list(pool.map(fn, [scenario] * total))
+                wall = time.perf_counter() - started
+                latencies = sorted(sample[0] * 1000 for sample in samples)
+                results[name] = {
+                    'requests': total,
+                    'p50_ms': round(_percentile(latencies, 0.50), 2),
+                    'p95_ms': round(_percentile(latencies, 0.95), 2),
+                    'p99_ms': round(_percentile(latencies, 0.99), 2),
+                    'throughput_rps': round(total / wall, 1) if wall else 0.0,
+                    'queries_per_request': round(statistics.mean(sample[1] for sample in samples), 2),
+                    'errors': sum(1 for sample in samples if not sample[2]),
+                }
+
+    return {
+        'meta': {
+            'dataset': counts,
+            'clients': args.clients,
+            'requests_per_route': args.requests,
+            'python': sys.version.split()[0],
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'routes': results,
+    }
+
+
+def print_report(report):
+    header = f'{"route":<30}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>10}{"queries":>10}{"errors":>8}'
+    print(header)
+    print('-' * len(header))
+    for name, row in report['routes'].items():
+        print(f'{name:<30}{row["p50_ms"]:>10.2f}{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}'
+              f'{row["throughput_rps"]:>10.1f}{row["queries_per_request"]:>10.2f}{row["errors"]:>8}')
+
+
+def compare(report, baseline, tolerance):
+    """
+    Prints the routes that regressed against a baseline report and returns how many did.
+    """
+    regressions = 0
+    for name, row in report['routes'].items():
+        base = baseline['routes'].get(name)
+        if base is None:
+            continue
+        problems = []
+        if row['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            problems.append(f'p95 {base["p95_ms"]:.2f} -> {row["p95_ms"]:.2f} ms')
+        if row['queries_per_request'] > base['queries_per_request'] + 0.5:
+            problems.append(f'queries {base["queries_per_request"]} -> {row["queries_per_request"]}')
+        if row['errors'] > base['errors']:
+            problems.append(f'errors {base["errors"]} -> {row["errors"]}')
+        if problems:
+            regressions += 1
+            print(f'REGRESSION {name}: {", ".join(problems)}')
+    if baseline['meta'].get('dataset') != report['meta']['dataset']:
+        print('Note: the baseline was recorded with a different dataset size.')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Employee Management routes.')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--tickets', type=int, default=5000)
+    parser.add_argument('--training-records', type=int, default=3000)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--documents', type=int, default=500)
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients.')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route.')
+    parser.add_argument('--login-requests', type=int, default=20, help='Measured logins (each hashes a password).')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per route before measuring.')
+    parser.add_argument('--routes', help='Comma-separated route names to run; defaults to all.')
+    parser.add_argument('--save', metavar='PATH', help='Write the report as a JSON baseline.')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against a JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 growth before a route regresses.')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
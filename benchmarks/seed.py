@@ -0,0 +1,113 @@
+"""
+Synthetic data generator for benchmarks.
+
+Seeds a database through the application's own models, so the dashboard counters, search index
+hooks and every other model event run exactly as they do in production.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import Document, Employee, Message, Ticket, TrainingRecord, User
+
+PASSWORD = 'benchmark'
+
+ROLES = ['Engineer', 'Manager', 'Analyst', 'Designer', 'Support', 'Sales', 'HR', 'Finance']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Cohen', 'Levi', 'Garcia', 'Kim', 'Patel', 'Nguyen', 'Brown', 'Rossi', 'Muller']
+COURSES = ['AWS Fundamentals', 'Security Awareness', 'Leadership 101', 'Kubernetes', 'First Aid',
+           'GDPR Basics', 'Python Advanced', 'Negotiation', 'Excel Mastery', 'Agile Practices']
+TICKET_WORDS = ['vpn', 'laptop', 'password', 'access', 'printer', 'email', 'vacation', 'payroll',
+                'monitor', 'badge', 'network', 'software', 'license', 'phone', 'desk']
+
+
+def _sentence(rng, words, length):
+    return ' '.join(rng.choice(words) for _ in range(length)).capitalize()
+
+
+def _add_in_batches(rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.add_all(rows[start:start + batch_size])
+        db.session.commit()
+
+
+def seed(users=50, employees=1000, tickets=5000, training_records=3000, messages=5000, documents=500,
+         s3_client=None, bucket=None, random_seed=42, batch_size=1000):
+    """
+    Fills an empty database with a reproducible synthetic dataset.
+
+    The first user is an admin; every user can log in with PASSWORD. The first `users` employees
+    each belong to one user, the rest are owned by the admin, as if the admin had added them.
+    If an S3 client and bucket are given, a small object is stored for every document.
+
+    Returns:
+        dict: The number of rows created per model.
+    """
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+    # Hashing is deliberately slow, so every user shares one precomputed hash.
+    password_hash = generate_password_hash(PASSWORD)
+
+    user_rows = [User(username=f'user{i}', email=f'user{i}@bench.example', password_hash=password_hash,
+                      is_admin=(i == 0), is_approved=True) for i in range(users)]
+    _add_in_batches(user_rows, batch_size)
+    user_ids = [user.id for user in user_rows]
+
+    employee_rows = []
+    for i in range(employees):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}'
+        employee_rows.append(Employee(
+            full_name=name, age=rng.randint(20, 65), phone_number=f'+1-555-{i:07d}',
+            email=f'employee{i}@bench.example', role=rng.choice(ROLES),
+            user_id=user_ids[i] if i < users else user_ids[0]))
+    _add_in_batches(employee_rows, batch_size)
+    employee_ids = [employee.id for employee in employee_rows]
+
+    ticket_rows = []
+    for i in range(tickets):
+        status = rng.choice(['Open', 'In Progress', 'Closed'])
+        ticket_rows.append(Ticket(
+            title=_sentence(rng, TICKET_WORDS, 4), description=_sentence(rng, TICKET_WORDS, 25),
+            status=status, ticket_type=rng.choice(['Request', 'Issue']),
+            created_at=now - timedelta(minutes=rng.randint(0, 365 * 24 * 60)),
+            employee_id=rng.choice(employee_ids),
+            admin_response=_sentence(rng, TICKET_WORDS, 10) if status == 'Closed' else None))
+    _add_in_batches(ticket_rows, batch_size)
+
+    training_rows = []
+    for i in range(training_records):
+        start = date.today() - timedelta(days=rng.randint(0, 3 * 365))
+        certified = rng.random() < 0.4
+        training_rows.append(TrainingRecord(
+            employee_id=rng.choice(employee_ids), course_name=rng.choice(COURSES),
+            course_type='Certification' if certified else 'Training', start_date=start,
+            end_date=start + timedelta(days=rng.randint(1, 90)),
+            status=rng.choice(['In Progress', 'Completed', 'Failed']),
+            certification_name=f'{rng.choice(COURSES)} Certificate' if certified else None,
+            certification_expiry=date.today() + timedelta(days=rng.randint(-180, 720)) if certified else None))
+    _add_in_batches(training_rows, batch_size)
+
+    message_rows = []
+    for i in range(messages):
+        sender, recipient = rng.sample(user_ids, 2) if len(user_ids) > 1 else (user_ids[0], user_ids[0])
+        message = Message(sender_id=sender, recipient_id=recipient,
+                          subject=_sentence(rng, TICKET_WORDS, 5), body=_sentence(rng, TICKET_WORDS, 40))
+        message.timestamp = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        message.read = rng.random() < 0.7
+        message_rows.append(message)
+    _add_in_batches(message_rows, batch_size)
+
+    document_rows = []
+    for i in range(documents):
+        employee_id = rng.choice(employee_ids)
+        filename = f'document{i}.pdf'
+        s3_key = f'documents/{employee_id}/{filename}'
+        if s3_client is not None:
+            s3_client.put_object(Bucket=bucket, Key=s3_key, Body=b'%PDF-1.4 benchmark')
+        document_rows.append(Document(filename=filename, file_type='pdf', s3_key=s3_key, employee_id=employee_id))
+    _add_in_batches(document_rows, batch_size)
+
+    return {'users': users, 'employees': employees, 'tickets': tickets, 'training_records': training_records,
+            'messages': messages, 'documents': documents}
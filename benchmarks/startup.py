@@ -0,0 +1,142 @@
+"""
+Cold-start benchmark.
+
+Measures what a freshly started container pays before it can serve: the schema check that
+entrypoint.sh runs on every start (init_db.py against an up-to-date database), and, in a new
+interpreter each time, importing the app, create_app() and the first request. Runs fully offline
+against a throwaway SQLite database:
+
+    python -m benchmarks.startup --save benchmarks/startup-baseline.json
+    python -m benchmarks.startup --compare benchmarks/startup-baseline.json
+
+With --compare the run exits with status 1 if the median of any phase grew by more than
+--tolerance and by more than --min-delta milliseconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a new interpreter and prints the duration of each phase, in milliseconds, as JSON
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+response = application.test_client().get('/login')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'import_to_first_request_ms': (served - started) * 1000,
+}))
+"""
+
+
+def _environment(database_path):
+    environment = dict(os.environ)
+    environment.update(DATABASE_URL=f'sqlite:///{database_path}', S3_BUCKET_EMPLOYEE_PHOTOS='benchmark-bucket',
+                       S3_REGION='us-east-1')
+    # The Flask CLI flag would make create_app() register the migration commands, which web workers never do
+    environment.pop('FLASK_RUN_FROM_CLI', None)
+    return environment
+
+
+def _timed_run(command, environment):
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=PROJECT_DIR, env=environment, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f'{" ".join(command[:2])} failed:\n{result.stderr}')
+    return elapsed, result.stdout
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='ems-startup-')
+    environment = _environment(os.path.join(workdir, 'startup.db'))
+
+    # The first run creates the schema; the measured runs find it current, as a restarted container does
+    _timed_run([sys.executable, 'init_db.py'], environment)
+
+    samples = {}
+    for _ in range(args.runs):
+        elapsed, _ = _timed_run([sys.executable, 'init_db.py'], environment)
+        samples.setdefault('schema_check_ms', []).append(elapsed)
+        elapsed, output = _timed_run([sys.executable, '-c', PROBE], environment)
+        samples.setdefault('process_to_first_request_ms', []).append(elapsed)
+        for phase, value in json.loads(output.strip().splitlines()[-1]).items():
+            samples.setdefault(phase, []).append(value)
+
+    return {
+        'meta': {
+            'runs': args.runs,
+            'python': sys.version.split()[0],
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'phases': {
+            phase: {'median_ms': round(statistics.median(values), 1), 'max_ms': round(max(values), 1)}
+            for phase, values in samples.items()
+        },
+    }
+
+
+def print_report(report):
+    header = f'{"phase":<32}{"median ms":>12}{"max ms":>12}'
+    print(header)
+    print('-' * len(header))
+    for phase, row in report['phases'].items():
+        print(f'{phase:<32}{row["median_ms"]:>12.1f}{row["max_ms"]:>12.1f}')
+
+
+def compare(report, baseline, tolerance, min_delta):
+    """
+    Prints the phases that got slower than in a baseline report and returns how many did.
+    """
+    regressions = 0
+    for phase, row in report['phases'].items():
+        base = baseline['phases'].get(phase)
+        if base is None:
+            continue
+        if row['median_ms'] > base['median_ms'] * (1 + tolerance) and \
+                row['median_ms'] - base['median_ms'] > min_delta:
+            regressions += 1
+            print(f'REGRESSION {phase}: median {base["median_ms"]:.1f} -> {row["median_ms"]:.1f} ms')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the cold start of the Employee Management app.')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh processes started per phase.')
+    parser.add_argument('--save', metavar='PATH', help='Write the report as a JSON baseline.')
+    parser.add_argument('--compare', metavar='PATH', help='Compare against a JSON baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed median growth before a phase regresses.')
+    parser.add_argument('--min-delta', type=float, default=50.0,
+                        help='Growth in milliseconds below which a phase never counts as regressed.')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance, args.min_delta):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,99 @@ class Config:
     # SQLAlchemy track modifications
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLAlchemy engine connection pool
+    # Every worker process has its own pool, so it is sized to the threads of one worker (GUNICORN_THREADS)
+    # plus the background upload threads. MariaDB must allow workers * (pool size + overflow) connections.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', int(os.environ.get('GUNICORN_THREADS', 4)) + 1))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', int(os.environ.get('UPLOAD_WORKERS', 4))))
+    # Connections older than DB_POOL_RECYCLE seconds are replaced, before MariaDB's wait_timeout drops them
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    # DB_POOL_PRE_PING tests each connection as it is checked out and replaces it if it has gone stale
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+    # SQLite does not use a sized connection pool
+    if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+
+    # Optional read replica. Reads in read-only views and the models' get_* query helpers go to it;
+    # writes always go to SQLALCHEMY_DATABASE_URI.
+    SQLALCHEMY_REPLICA_URI = os.environ.get('DATABASE_REPLICA_URL')
+    SQLALCHEMY_BINDS = {'replica': SQLALCHEMY_REPLICA_URI} if SQLALCHEMY_REPLICA_URI else None
+    # For this many seconds after a user's own commit, their reads stay on the primary
+    REPLICA_READ_YOUR_WRITES_SECONDS = float(os.environ.get('REPLICA_READ_YOUR_WRITES_SECONDS', 5))
+
+    # Instrumentation
+    # METRICS_ENABLED turns on per-request SQL statistics, the Server-Timing header and the /metrics endpoint
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # METRICS_TOKEN, if set, must be sent as "Authorization: Bearer <token>" to read /metrics;
+    # without it /metrics is only served to direct requests from the same host
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # A request that runs one statement shape more than this many times is logged as a possible N+1 query
+    SQL_REPEAT_WARNING_THRESHOLD = int(os.environ.get('SQL_REPEAT_WARNING_THRESHOLD', 10))
+    # A statement slower than this many seconds is logged
+    SQL_SLOW_STATEMENT_SECONDS = float(os.environ.get('SQL_SLOW_STATEMENT_SECONDS', 0.5))
+
+    # Logged-in user cache
+    # IDENTITY_CACHE_SIZE is the number of logged-in users cached per process; 0 disables the cache
+    IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', 1024))
+    # IDENTITY_CACHE_TTL bounds, in seconds, how long another process's change to a user can go unseen
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL', 30))
+
+    # Password hashing and login
+    # PASSWORD_HASH_METHOD is passed to werkzeug's generate_password_hash; stored hashes made with other
+    # parameters are rehashed on the user's next successful login. The hash must fit in user.password_hash (255 characters)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+    # PASSWORD_CHECK_WORKERS is the number of password hashes computed at once per process
+    PASSWORD_CHECK_WORKERS = int(os.environ.get('PASSWORD_CHECK_WORKERS', os.cpu_count() or 2))
+    # PASSWORD_CHECK_QUEUE_SIZE logins may wait for a worker before new logins get a 503
+    PASSWORD_CHECK_QUEUE_SIZE = int(os.environ.get('PASSWORD_CHECK_QUEUE_SIZE', 32))
+    # PASSWORD_CHECK_TIMEOUT is how many seconds a login waits for its password check
+    PASSWORD_CHECK_TIMEOUT = float(os.environ.get('PASSWORD_CHECK_TIMEOUT', 10))
+    # A failed username/password pair is rejected without hashing for FAILED_LOGIN_CACHE_TTL seconds
+    FAILED_LOGIN_CACHE_TTL = int(os.environ.get('FAILED_LOGIN_CACHE_TTL', 60))
+    FAILED_LOGIN_CACHE_SIZE = int(os.environ.get('FAILED_LOGIN_CACHE_SIZE', 10000))
+
+    # Certification expiry report
+    # CERTIFICATION_WINDOW_DAYS is the default number of days ahead the expiry report looks
+    CERTIFICATION_WINDOW_DAYS = int(os.environ.get('CERTIFICATION_WINDOW_DAYS', 30))
+    # CERTIFICATION_WINDOW_MAX_DAYS is the longest window the report accepts
+    CERTIFICATION_WINDOW_MAX_DAYS = int(os.environ.get('CERTIFICATION_WINDOW_MAX_DAYS', 365))
+
+    # Employee picture variants
+    # IMAGE_WORKERS is the number of processes per worker process that resize pictures
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    # IMAGE_TIMEOUT is how many seconds resizing one picture may take before it is given up
+    IMAGE_TIMEOUT = float(os.environ.get('IMAGE_TIMEOUT', 60))
+
+    # Template fragment cache ({% cache %} tags)
+    # FRAGMENT_CACHE_BACKEND is 'memory' (per process), 'sqlite' (shared by the processes on a host) or 'none'
+    FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+    # FRAGMENT_CACHE_PATH is the SQLite file of the 'sqlite' backend; defaults to one in the temp directory
+    FRAGMENT_CACHE_PATH = os.environ.get('FRAGMENT_CACHE_PATH')
+    # FRAGMENT_CACHE_SIZE is the maximum number of cached fragments
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))
+    # FRAGMENT_CACHE_TTL is how many seconds a cached fragment is kept
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+
+    # Pagination
+    # EMPLOYEES_PER_PAGE is the number of employee cards shown per directory page
+    EMPLOYEES_PER_PAGE = int(os.environ.get('EMPLOYEES_PER_PAGE', 24))
+    # TICKETS_PER_PAGE is the number of rows shown per ticket queue page
+    TICKETS_PER_PAGE = int(os.environ.get('TICKETS_PER_PAGE', 25))
+    # PENDING_USERS_PER_PAGE is the number of users shown per page of the approval queue
+    PENDING_USERS_PER_PAGE = int(os.environ.get('PENDING_USERS_PER_PAGE', 50))
+    # CERTIFICATIONS_PER_PAGE is the number of certifications shown per page of the expiry report
+    CERTIFICATIONS_PER_PAGE = int(os.environ.get('CERTIFICATIONS_PER_PAGE', 50))
+    # MESSAGES_PER_PAGE is the number of messages shown per inbox page
+    MESSAGES_PER_PAGE = int(os.environ.get('MESSAGES_PER_PAGE', 25))
+    # SEARCH_RESULTS_PER_PAGE is the number of search results shown per page
+    SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE', 20))
+    # MAX_PER_PAGE caps the per_page query argument so a client cannot request an unbounded page
+    MAX_PER_PAGE = int(os.environ.get('MAX_PER_PAGE', 100))
+
     # AWS Credentials for S3
     # S3_BUCKET is the name of the bucket where the employee photos will be stored
     S3_BUCKET = os.environ.get('S3_BUCKET_EMPLOYEE_PHOTOS')
@@ -21,7 +114,65 @@ class Config:
     AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
     # AWS_SECRET_ACCESS_KEY is the secret key for accessing the bucket
     AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
-    
-    print(f"S3_BUCKET_EMPLOYEE_PHOTOS: {S3_BUCKET}")
-    print(f"S3_REGION: {S3_REGION}")
+    # S3_MAX_POOL_CONNECTIONS is the size of the shared S3 client's HTTP connection pool
+    S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 25))
+    # S3_PRESIGNED_URL_EXPIRATION is how long a document download link stays valid, in seconds
+    S3_PRESIGNED_URL_EXPIRATION = int(os.environ.get('S3_PRESIGNED_URL_EXPIRATION', 3600))
+    # A cached download link is reused until this many seconds before it expires
+    S3_PRESIGNED_URL_CACHE_MARGIN = int(os.environ.get('S3_PRESIGNED_URL_CACHE_MARGIN', 300))
+    # S3_PRESIGNED_URL_CACHE_SIZE is the maximum number of download links cached per process
+    S3_PRESIGNED_URL_CACHE_SIZE = int(os.environ.get('S3_PRESIGNED_URL_CACHE_SIZE', 10000))
+    # S3_MULTIPART_CHUNK_SIZE is the part size for streamed uploads; S3 requires at least 5 MB
+    S3_MULTIPART_CHUNK_SIZE = int(os.environ.get('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024))
+    # S3_MULTIPART_CONCURRENCY is the number of parts of one upload sent in parallel
+    S3_MULTIPART_CONCURRENCY = int(os.environ.get('S3_MULTIPART_CONCURRENCY', 4))
+
+    # Bulk import
+    # IMPORT_BATCH_SIZE is the number of employees inserted per transaction by the bulk import
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    # IMPORT_MAX_ERRORS is the number of row errors listed in an import report
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', 1000))
+
+    # Background uploads
+    # UPLOAD_WORKERS is the number of threads per process that send uploads to S3
+    UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 4))
+    # UPLOAD_QUEUE_SIZE is how many more uploads may wait for a worker before new ones are rejected
+    UPLOAD_QUEUE_SIZE = int(os.environ.get('UPLOAD_QUEUE_SIZE', 32))
+
+    # Background S3 deletions
+    # S3_DELETE_BATCH_SIZE is the number of keys per DeleteObjects request (S3 accepts at most 1000)
+    S3_DELETE_BATCH_SIZE = int(os.environ.get('S3_DELETE_BATCH_SIZE', 1000))
+    # S3_DELETE_RETRIES is how often a failed DeleteObjects request is repeated at once, with a short backoff
+    S3_DELETE_RETRIES = int(os.environ.get('S3_DELETE_RETRIES', 3))
+    # S3_DELETE_RETRY_DELAY is the seconds before a key that could not be deleted is tried again; it doubles per attempt
+    S3_DELETE_RETRY_DELAY = int(os.environ.get('S3_DELETE_RETRY_DELAY', 60))
+    # OFFBOARD_CHUNK_SIZE is the number of employee ids per statement when employees are deleted in bulk
+    OFFBOARD_CHUNK_SIZE = int(os.environ.get('OFFBOARD_CHUNK_SIZE', 500))
+
+    # JSON API
+    # API_PER_PAGE is the default number of items per page of /api/v1 list responses
+    API_PER_PAGE = int(os.environ.get('API_PER_PAGE', 100))
+    # API_MAX_PER_PAGE is the upper bound for the per_page query argument of /api/v1 list responses
+    API_MAX_PER_PAGE = int(os.environ.get('API_MAX_PER_PAGE', 1000))
+    # API_MAX_BATCH_SIZE is the most ids one /api/v1 request may fetch, or items it may create or update
+    API_MAX_BATCH_SIZE = int(os.environ.get('API_MAX_BATCH_SIZE', 500))
+
+    # Pushed events. They are only pushed under the gevent worker (GUNICORN_WORKER_CLASS=gevent);
+    # under the default gthread worker the pages show the unread count as of their last load.
+    # PUSH_EVENTS records events for the streams; it defaults to on under the gevent worker, and off nothing is recorded
+    PUSH_EVENTS = os.environ.get('PUSH_EVENTS', str(os.environ.get('GUNICORN_WORKER_CLASS') == 'gevent')).lower() in ('1', 'true', 'yes')
+    # NOTIFICATION_POLL_INTERVAL is the seconds between each process's checks for events committed by other processes
+    NOTIFICATION_POLL_INTERVAL = float(os.environ.get('NOTIFICATION_POLL_INTERVAL', 1))
+    # NOTIFICATION_LATE_SECONDS is how long an event may take to commit after an event with a higher id and still be pushed
+    NOTIFICATION_LATE_SECONDS = int(os.environ.get('NOTIFICATION_LATE_SECONDS', 30))
+    # NOTIFICATION_RETENTION is the seconds events are kept for clients that reconnect
+    NOTIFICATION_RETENTION = int(os.environ.get('NOTIFICATION_RETENTION', 86400))
+    # STREAM_MAX_SECONDS is how long an event stream stays open before the browser is made to reconnect
+    STREAM_MAX_SECONDS = int(os.environ.get('STREAM_MAX_SECONDS', 300))
+    # STREAM_HEARTBEAT_SECONDS is the idle time after which a stream sends a keepalive comment
+    STREAM_HEARTBEAT_SECONDS = int(os.environ.get('STREAM_HEARTBEAT_SECONDS', 15))
+    # STREAM_RETRY_SECONDS is how long the browser waits before reconnecting a dropped event stream
+    STREAM_RETRY_SECONDS = float(os.environ.get('STREAM_RETRY_SECONDS', 10))
+    # LONG_POLL_TIMEOUT is the seconds a long poll waits for an event
+    LONG_POLL_TIMEOUT = int(os.environ.get('LONG_POLL_TIMEOUT', 25))
     
\ No newline at end of file
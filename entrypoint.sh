@@ -8,13 +8,18 @@ echo "S3_BUCKET_EMPLOYEE_PHOTOS: $S3_BUCKET_EMPLOYEE_PHOTOS"
 # Create upload folder if it doesn't exist (redundant with Dockerfile, but kept for safety)
 mkdir -p /app/app/static/uploads
 
-# Initialize the database
-python << END
-from init_db import init_db
-init_db()
-END
+# Apply pending database migrations; when there are none this is a single query
+python init_db.py
 
 # Start the Flask application
-echo "Starting Flask application..."
+# SERVER_MODE=development runs the single-process Flask development server;
+# anything else runs Gunicorn with the settings in gunicorn.conf.py.
+if [ "$SERVER_MODE" = "development" ]; then
+    echo "Starting Flask development server..."
+    exec flask run --host=0.0.0.0
+fi
 
-flask run --host=0.0.0.0
\ No newline at end of file
+echo "Starting Gunicorn..."
+# exec hands the process over to Gunicorn so it receives SIGTERM (graceful shutdown)
+# and SIGHUP (graceful reload of all workers) directly.
+exec gunicorn --config gunicorn.conf.py "app:create_app()"
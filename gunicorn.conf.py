@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+
+# Gunicorn settings for the production serving mode started by entrypoint.sh.
+# Every setting can be overridden with the environment variable next to it.
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Worker processes, each serving GUNICORN_THREADS requests at a time
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# 'gevent' serves requests as greenlets, so the open event streams (/events/stream) of many users
+# cost one worker little. Events are only pushed under 'gevent': under 'gthread' each stream would
+# hold a thread, so the stream endpoints answer 204 and pages are not updated until they are reloaded.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Requests one gevent worker serves at a time, most of them idle event streams
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Load the application once in the master before forking, so workers share its memory and start
+# fast. create_app() opens no database or S3 connections, so nothing is shared across the fork.
+# gevent must patch the standard library before the app creates its locks, so it loads in the workers.
+preload_app = worker_class != 'gevent'
+
+# Graceful restarts: on SIGHUP or a recycled worker, in-flight requests get this long to finish
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle each worker after this many requests (0 disables), staggered by the jitter
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def child_exit(server, worker):
+    # With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to files there; drop a dead worker's live gauges.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,28 +1,105 @@
-from app import create_app, db
-from app.models import User, Employee, Ticket
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine, inspect, text
+
+from config import Config
+
+# Alembic migration scripts; the same directory app.init_migrations() registers with Flask-Migrate
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# The revision whose schema db.create_all() built before the project used migrations
+BASELINE_REVISION = '0001'
+# MySQL lock held while migrating, so that containers starting together migrate one at a time
+MIGRATION_LOCK_NAME = 'employee_management_migrations'
+MIGRATION_LOCK_TIMEOUT = 600
+
+
+def head_revisions():
+    from alembic.script import ScriptDirectory
+    return set(ScriptDirectory(MIGRATIONS_DIR).get_heads())
+
+
+def database_revisions(connection):
+    from alembic.runtime.migration import MigrationContext
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+
+@contextmanager
+def migration_lock(connection):
+    """
+    Holds a MySQL named lock on connection for the duration of the block. Other databases run
+    migrations from one process only, so there it does nothing.
+    """
+    if connection.dialect.name != 'mysql':
+        yield
+        return
+    acquired = connection.execute(text('SELECT GET_LOCK(:name, :timeout)'),
+                                  {'name': MIGRATION_LOCK_NAME, 'timeout': MIGRATION_LOCK_TIMEOUT}).scalar()
+    if acquired != 1:
+        raise RuntimeError(f"Timed out waiting for the '{MIGRATION_LOCK_NAME}' migration lock")
+    try:
+        yield
+    finally:
+        connection.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': MIGRATION_LOCK_NAME})
+
+
+def apply_migrations(stamp_baseline):
+    """
+    Builds the app and upgrades the database to the latest revision, first stamping it with the
+    baseline revision if stamp_baseline is set.
+    """
+    from flask_migrate import stamp, upgrade
+
+    from app import create_app, db, init_migrations
+    from app.rollups import ensure_dashboard_counters
+
+    app = create_app()
+    init_migrations(app)
+    with app.app_context():
+        if stamp_baseline:
+            stamp(revision=BASELINE_REVISION)
+        upgrade()
+        # Populate the dashboard counters the first time they are needed
+        ensure_dashboard_counters()
+        db.session.remove()
+
 
 def init_db():
     """
-    Initializes the database by creating all tables defined in the application's models.
-    
-    This function creates an application context, then uses the SQLAlchemy database instance to create all tables.
-    
+    Brings the database schema up to date by applying the pending migrations, if there are any.
+
+    A database that is already current costs one query, and the app is not built at all, so this
+    is cheap enough to run on every container start. A database created by db.create_all()
+    before the project used migrations is stamped with the baseline revision, so only the later
+    revisions run on it.
+
     Args:
         None
-    
+
     Returns:
-        None
+        bool: True if migrations were applied.
     """
-    # Create an application context
-    app = create_app()
-    # Create all tables
-    with app.app_context():
-        db.create_all()
-        # Print a message to confirm that the tables have been created
-        print("Database tables created.")
+    heads = head_revisions()
+    engine = create_engine(Config.SQLALCHEMY_DATABASE_URI)
+    try:
+        with engine.connect() as connection:
+            if database_revisions(connection) == heads:
+                print("Database schema is up to date.")
+                return False
+        with engine.connect() as lock_connection, migration_lock(lock_connection):
+            # Another container may have migrated the database while this one waited for the lock
+            with engine.connect() as connection:
+                current = database_revisions(connection)
+                if current == heads:
+                    print("Database schema is up to date.")
+                    return False
+                stamp_baseline = not current and inspect(connection).has_table('user')
+            apply_migrations(stamp_baseline)
+    finally:
+        engine.dispose()
+    print("Database migrations applied.")
+    return True
+
 
 if __name__ == '__main__':
-    # Initialize the database if it doesn't exist
     init_db()
-    # Print a message to confirm that the database has been initialized
-    print("Database initialization script loaded. Use init_db() function to initialize the database.")
@@ -0,0 +1,115 @@
+"""Baseline schema
+
+The tables as db.create_all() built them before the project used migrations. init_db.py stamps
+databases created that way with this revision, so that only the later revisions run on them.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=128), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('is_approved', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username'),
+    )
+    op.create_table(
+        'employee',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('full_name', sa.String(length=100), nullable=False),
+        sa.Column('age', sa.Integer(), nullable=False),
+        sa.Column('phone_number', sa.String(length=20), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('role', sa.String(length=50), nullable=False),
+        sa.Column('picture_url', sa.String(length=500), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'message',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('recipient_id', sa.Integer(), nullable=False),
+        sa.Column('subject', sa.String(length=100), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.Column('read', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['recipient_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['sender_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_message_timestamp', 'message', ['timestamp'])
+    op.create_table(
+        'ticket',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('ticket_type', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('employee_id', sa.Integer(), nullable=False),
+        sa.Column('admin_response', sa.Text(), nullable=True),
+        sa.Column('is_approved', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['employee_id'], ['employee.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'training_record',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=False),
+        sa.Column('course_name', sa.String(length=100), nullable=False),
+        sa.Column('course_type', sa.String(length=50), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('certification_name', sa.String(length=100), nullable=True),
+        sa.Column('certification_expiry', sa.Date(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['employee_id'], ['employee.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'document',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('file_type', sa.String(length=50), nullable=False),
+        sa.Column('upload_date', sa.DateTime(), nullable=True),
+        sa.Column('s3_key', sa.String(length=255), nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['employee_id'], ['employee.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('s3_key'),
+    )
+
+
+def downgrade():
+    op.drop_table('document')
+    op.drop_table('training_record')
+    op.drop_table('ticket')
+    op.drop_index('ix_message_timestamp', table_name='message')
+    op.drop_table('message')
+    op.drop_table('employee')
+    op.drop_table('user')
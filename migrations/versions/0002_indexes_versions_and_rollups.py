@@ -0,0 +1,107 @@
+"""Indexes, row versions, upload states, dashboard counters and certification summary
+
+Everything the schema gained after the baseline. Before migrations, db.create_all() created new
+tables but never altered existing ones, so a database may already have some of these objects;
+each one is only created if it is missing.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# table -> searched columns of app.search.SEARCH_SOURCES, indexed with FULLTEXT on MySQL
+FULLTEXT_COLUMNS = {
+    'employee': ('full_name', 'role', 'email'),
+    'ticket': ('title', 'description', 'admin_response'),
+    'message': ('subject', 'body'),
+}
+
+NEW_COLUMNS = [
+    ('document', sa.Column('status', sa.String(length=10), server_default='ready', nullable=False)),
+    ('document', sa.Column('updated_at', sa.DateTime(), nullable=True)),
+    ('document', sa.Column('version', sa.Integer(), server_default='1', nullable=False)),
+    ('employee', sa.Column('picture_status', sa.String(length=10), server_default='ready', nullable=False)),
+    ('employee', sa.Column('picture_variants', sa.Boolean(), server_default='0', nullable=False)),
+    ('employee', sa.Column('updated_at', sa.DateTime(), nullable=True)),
+    ('employee', sa.Column('version', sa.Integer(), server_default='1', nullable=False)),
+    ('ticket', sa.Column('version', sa.Integer(), server_default='1', nullable=False)),
+    ('training_record', sa.Column('version', sa.Integer(), server_default='1', nullable=False)),
+]
+
+NEW_INDEXES = [
+    ('ix_employee_full_name', 'employee', ['full_name']),
+    ('ix_employee_role', 'employee', ['role']),
+    ('ix_message_recipient_id_read_timestamp', 'message', ['recipient_id', 'read', 'timestamp']),
+    ('ix_message_recipient_id_timestamp', 'message', ['recipient_id', 'timestamp']),
+    ('ix_ticket_employee_id_created_at', 'ticket', ['employee_id', 'created_at']),
+    ('ix_ticket_status_created_at', 'ticket', ['status', 'created_at']),
+    ('ix_training_record_certification_expiry_employee_id', 'training_record', ['certification_expiry', 'employee_id']),
+    ('ix_user_is_approved_id', 'user', ['is_approved', 'id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'certification_summary' not in tables:
+        op.create_table(
+            'certification_summary',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('role', sa.String(length=50), nullable=False),
+            sa.Column('expired_30d', sa.Integer(), nullable=False),
+            sa.Column('expiring_30d', sa.Integer(), nullable=False),
+            sa.Column('expiring_60d', sa.Integer(), nullable=False),
+            sa.Column('expiring_90d', sa.Integer(), nullable=False),
+            sa.Column('computed_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('role'),
+        )
+    if 'dashboard_counter' not in tables:
+        op.create_table(
+            'dashboard_counter',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('metric', sa.String(length=32), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('metric', 'name', name='uq_dashboard_counter_metric_name'),
+        )
+        op.create_index('ix_dashboard_counter_metric_count', 'dashboard_counter', ['metric', 'count'])
+
+    for table, column in NEW_COLUMNS:
+        if column.name not in {c['name'] for c in inspector.get_columns(table)}:
+            op.add_column(table, column)
+
+    for name, table, columns in NEW_INDEXES:
+        if name not in {i['name'] for i in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+    if op.get_bind().dialect.name == 'mysql':
+        for table, columns in FULLTEXT_COLUMNS.items():
+            name = f'ft_{table}_search'
+            if name not in {i['name'] for i in inspector.get_indexes(table)}:
+                op.execute(f'CREATE FULLTEXT INDEX {name} ON {table} ({", ".join(columns)})')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        for table in FULLTEXT_COLUMNS:
+            op.drop_index(f'ft_{table}_search', table_name=table)
+    for name, table, _ in reversed(NEW_INDEXES):
+        op.drop_index(name, table_name=table)
+    for table, column in reversed(NEW_COLUMNS):
+        op.drop_column(table, column.name)
+    op.drop_index('ix_dashboard_counter_metric_count', table_name='dashboard_counter')
+    op.drop_table('dashboard_counter')
+    op.drop_table('certification_summary')
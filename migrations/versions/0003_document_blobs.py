@@ -0,0 +1,52 @@
+"""Content-addressed document blobs
+
+Documents now reference a shared, reference-counted blob stored under its SHA-256 digest.
+Existing documents keep their own s3_key, which becomes optional.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'document_blob',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('s3_key', sa.String(length=255), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('s3_key'),
+        sa.UniqueConstraint('sha256'),
+    )
+    # Batch mode, because SQLite can only change a column's nullability or add a foreign key by copying the table
+    with op.batch_alter_table('document') as batch_op:
+        batch_op.add_column(sa.Column('blob_id', sa.Integer(), nullable=True))
+        batch_op.alter_column('s3_key', existing_type=sa.String(length=255), nullable=True)
+        batch_op.create_index('ix_document_blob_id', ['blob_id'])
+        batch_op.create_foreign_key('fk_document_blob_id_document_blob', 'document_blob', ['blob_id'], ['id'])
+
+
+def downgrade():
+    # Documents stored as blobs have no key of their own and cannot be kept
+    op.execute('DELETE FROM document WHERE s3_key IS NULL')
+    with op.batch_alter_table('document') as batch_op:
+        batch_op.drop_constraint('fk_document_blob_id_document_blob', type_='foreignkey')
+        batch_op.drop_index('ix_document_blob_id')
+        batch_op.alter_column('s3_key', existing_type=sa.String(length=255), nullable=False)
+        batch_op.drop_column('blob_id')
+    op.drop_table('document_blob')
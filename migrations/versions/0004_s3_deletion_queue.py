@@ -0,0 +1,35 @@
+"""S3 deletion queue
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        's3_deletion',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('s3_key', sa.String(length=255), nullable=False),
+        sa.Column('blob_id', sa.Integer(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_s3_deletion_next_attempt_at', 's3_deletion', ['next_attempt_at'])
+
+
+def downgrade():
+    op.drop_index('ix_s3_deletion_next_attempt_at', table_name='s3_deletion')
+    op.drop_table('s3_deletion')
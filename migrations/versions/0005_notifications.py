@@ -0,0 +1,36 @@
+"""Notifications for pushed events
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notification',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('event', sa.String(length=20), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_notification_created_at', 'notification', ['created_at'])
+    op.create_index('ix_notification_user_id_id', 'notification', ['user_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_notification_user_id_id', table_name='notification')
+    op.drop_index('ix_notification_created_at', table_name='notification')
+    op.drop_table('notification')
@@ -0,0 +1,24 @@
+"""Index the S3 deletion queue by key
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 19:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_s3_deletion_s3_key', 's3_deletion', ['s3_key'])
+
+
+def downgrade():
+    op.drop_index('ix_s3_deletion_s3_key', table_name='s3_deletion')
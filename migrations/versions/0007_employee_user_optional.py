@@ -0,0 +1,27 @@
+"""Allow employees without a user account
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 09:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Imported employees are not linked to the admin who imported them
+    with op.batch_alter_table('employee') as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('employee') as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
@@ -0,0 +1,67 @@
+"""
+Shared fixtures. Run the tests from the repository root, fully offline:
+
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+import os
+
+import pytest
+
+BUCKET = 'test-bucket'
+REGION = 'us-east-1'
+
+# Config reads the environment when it is imported, so this must run before the app is imported.
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['S3_BUCKET_EMPLOYEE_PHOTOS'] = BUCKET
+os.environ['S3_REGION'] = REGION
+os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+os.environ['AWS_DEFAULT_REGION'] = REGION
+
+
+@pytest.fixture
+def app():
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def s3(app):
+    """
+    A moto-stubbed S3 with the configured bucket, and a fresh shared client and URL cache.
+    """
+    from moto import mock_aws
+
+    from app import s3_utils
+
+    with mock_aws():
+        s3_utils.reset_s3_client()
+        client = s3_utils.get_s3_client()
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+        s3_utils.reset_s3_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    """
+    A test client signed in as an approved admin, with a fresh schema and CSRF checks off.
+    """
+    from app import db
+    from app.models import User
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    db.create_all()
+    admin = User(username='admin', email='admin@example.com', is_admin=True, is_approved=True)
+    admin.set_password('secret')
+    db.session.add(admin)
+    db.session.commit()
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'secret'})
+    yield client
+    db.session.remove()
+    db.drop_all()
@@ -0,0 +1,47 @@
+import io
+
+from app.models import Employee, User
+
+CSV = (
+    'full_name,age,phone_number,email,role\n'
+    'Ada Lovelace,36,555-0100,ada@example.com,Engineer\n'
+    'Grace Hopper,not a number,555-0101,grace@example.com,Engineer\n'
+    'Alan Turing,41,555-0102,alan@example.com,Researcher\n'
+)
+
+
+def post_import(client, content, filename='employees.csv'):
+    return client.post('/admin/import_employees', data={'file': (io.BytesIO(content.encode()), filename)},
+                       content_type='multipart/form-data')
+
+
+def test_admin_import_of_csv_inserts_valid_rows(admin_client):
+    response = post_import(admin_client, CSV)
+
+    assert response.status_code == 200
+    assert b'Imported 2 employees, 1 rows failed.' in response.data
+    assert sorted(e.email for e in Employee.query) == ['ada@example.com', 'alan@example.com']
+
+
+def test_imported_employees_are_not_linked_to_the_admin(admin_client):
+    post_import(admin_client, CSV)
+
+    assert all(employee.user_id is None for employee in Employee.query)
+    assert User.query.filter_by(username='admin').one().employee is None
+
+
+def test_admin_import_of_json_lines(admin_client):
+    content = '{"full_name": "Ada Lovelace", "age": 36, "phone_number": "555-0100", "email": "ada@example.com", "role": "Engineer"}\n'
+    response = post_import(admin_client, content, 'employees.jsonl')
+
+    assert b'Imported 1 employees, 0 rows failed.' in response.data
+
+
+def test_employee_without_user_can_be_added_through_the_orm(admin_client):
+    from app import db
+
+    db.session.add(Employee(full_name='Ada Lovelace', age=36, phone_number='555-0100',
+                            email='ada@example.com', role='Engineer'))
+    db.session.commit()
+
+    assert Employee.query.one().user_id is None
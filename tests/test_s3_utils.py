@@ -0,0 +1,109 @@
+import threading
+
+from app import s3_utils
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+def _set_clock(monkeypatch, now=1000.0):
+    clock = FakeClock(now)
+    monkeypatch.setattr(s3_utils.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+def test_client_is_shared_across_threads(s3):
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(s3_utils.get_s3_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(clients) == 8
+    assert all(client is s3 for client in clients)
+
+
+def test_client_is_recreated_after_fork(s3, monkeypatch):
+    pid = s3_utils.os.getpid()
+    monkeypatch.setattr(s3_utils.os, 'getpid', lambda: pid + 1)
+    child_client = s3_utils.get_s3_client()
+    assert child_client is not s3
+    assert s3_utils.get_s3_client() is child_client
+
+
+def test_client_honours_max_pool_connections(app, s3):
+    assert s3.meta.config.max_pool_connections == app.config['S3_MAX_POOL_CONNECTIONS']
+
+    app.config['S3_MAX_POOL_CONNECTIONS'] = 7
+    s3_utils.reset_s3_client()
+    assert s3_utils.get_s3_client().meta.config.max_pool_connections == 7
+
+
+def test_presigned_url_is_cached_within_ttl(app, s3, monkeypatch):
+    clock = _set_clock(monkeypatch)
+    app.config['S3_PRESIGNED_URL_EXPIRATION'] = 3600
+    app.config['S3_PRESIGNED_URL_CACHE_MARGIN'] = 300
+
+    url = s3_utils.generate_presigned_url('documents/a.pdf')
+    assert url
+
+    clock.now += 3600 - 300 - 1
+    assert s3_utils.generate_presigned_url('documents/a.pdf') == url
+    # Each download name gets its own link
+    assert s3_utils.generate_presigned_url('documents/a.pdf', download_name='a.pdf') != url
+
+
+def test_presigned_url_is_resigned_after_expiration_minus_margin(app, s3, monkeypatch):
+    clock = _set_clock(monkeypatch)
+    app.config['S3_PRESIGNED_URL_EXPIRATION'] = 3600
+    app.config['S3_PRESIGNED_URL_CACHE_MARGIN'] = 300
+    calls = []
+    real_generate = s3.generate_presigned_url
+    monkeypatch.setattr(s3, 'generate_presigned_url', lambda *a, **kw: calls.append(1) or real_generate(*a, **kw))
+
+    s3_utils.generate_presigned_url('documents/a.pdf')
+    clock.now += 3600 - 300
+    s3_utils.generate_presigned_url('documents/a.pdf')
+    assert len(calls) == 2
+
+
+def test_presigned_url_is_not_cached_when_margin_exceeds_expiration(app, s3, monkeypatch):
+    _set_clock(monkeypatch)
+    app.config['S3_PRESIGNED_URL_CACHE_MARGIN'] = 300
+
+    s3_utils.generate_presigned_url('documents/a.pdf', expiration=60)
+    assert not s3_utils._presigned_urls
+
+
+def test_invalidate_presigned_url(s3):
+    s3_utils.generate_presigned_url('documents/a.pdf')
+    s3_utils.generate_presigned_url('documents/a.pdf', download_name='a.pdf')
+    s3_utils.generate_presigned_url('documents/b.pdf')
+
+    s3_utils.invalidate_presigned_url('documents/a.pdf')
+    assert list(s3_utils._presigned_urls) == [('documents/b.pdf', None)]
+
+
+def test_deleting_an_object_invalidates_its_presigned_url(s3):
+    s3.put_object(Bucket='test-bucket', Key='documents/a.pdf', Body=b'a')
+    s3_utils.generate_presigned_url('documents/a.pdf')
+
+    assert s3_utils.delete_file_from_s3('documents/a.pdf')
+    assert not s3_utils._presigned_urls
+
+
+def test_presigned_url_cache_is_bounded(app, s3):
+    app.config['S3_PRESIGNED_URL_CACHE_SIZE'] = 3
+    for name in 'abcd':
+        s3_utils.generate_presigned_url(f'documents/{name}.pdf')
+    assert [key for key, _ in s3_utils._presigned_urls] == ['documents/b.pdf', 'documents/c.pdf', 'documents/d.pdf']
+
+    # A hit makes the entry the most recently used, so the least recently used one goes next
+    s3_utils.generate_presigned_url('documents/b.pdf')
+    s3_utils.generate_presigned_url('documents/e.pdf')
+    assert [key for key, _ in s3_utils._presigned_urls] == ['documents/d.pdf', 'documents/b.pdf', 'documents/e.pdf']